@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2021-2022, Haren Samarasinghe
+#
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+#     * Redistributions of source code must retain the above copyright notice,
+#       this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright notice,
+#       this list of conditions and the following disclaimer in the documentation
+#       and/or other materials provided with the distribution.
+#     * Neither the name of seaport nor the names of its contributors
+#       may be used to endorse or promote products derived from this software
+#       without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Runs the benchmarks from the command line."""
+
+import argparse
+import logging
+import sys
+from typing import Optional, Sequence
+
+from benchmarks.graphs import GENERATORS
+from benchmarks.suite import BENCHMARKS, SIZES, compare, load, run, save
+from depythel._utility_imports import DictType
+
+TOLERANCE = 0.25
+"""float: How much slower (as a fraction) a benchmark can get before it's reported."""
+
+NOISE = 0.001
+"""float: Differences smaller than this (in seconds) are never reported, since
+timings that short are mostly noise."""
+
+
+def main(arguments: Optional[Sequence[str]] = None) -> int:
+    """Runs the benchmarks, printing how long each one took.
+
+    Args:
+        arguments: The command line arguments. Defaults to sys.argv.
+
+    Returns:
+        The exit code, which is 1 if any benchmark got slower than a baseline.
+    """
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks", description=__doc__.strip()
+    )
+    parser.add_argument(
+        "--size",
+        type=int,
+        nargs="+",
+        default=SIZES,
+        help="number of projects in each tree (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--graph",
+        choices=GENERATORS,
+        nargs="+",
+        default=tuple(GENERATORS),
+        help="shapes of tree to generate (default: all)",
+    )
+    parser.add_argument(
+        "--benchmark",
+        choices=BENCHMARKS,
+        nargs="+",
+        default=BENCHMARKS,
+        help="what to time (default: all)",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=3,
+        help="times to run each benchmark (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--latency",
+        type=float,
+        default=0.001,
+        help="seconds each request takes in set_size (default: %(default)s)",
+    )
+    parser.add_argument("--output", help="where to store the results as JSON")
+    parser.add_argument(
+        "--compare", metavar="BASELINE", help="results to compare against"
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=TOLERANCE,
+        help="fraction slower than the baseline that is reported "
+        "(default: %(default)s)",
+    )
+    options = parser.parse_args(arguments)
+    if options.repeat < 1:
+        parser.error("--repeat must be greater or equal to 1")
+
+    # Cycles are logged as warnings, which would drown out the results.
+    logging.getLogger("depythel").setLevel(logging.ERROR)
+    baseline: DictType[str, float] = {}
+    if options.compare:
+        latency, baseline = load(options.compare)
+        if latency != options.latency:
+            print(f"Warning: {options.compare} used a latency of {latency}s")
+
+    results = []
+    for result in run(
+        options.size, options.graph, options.benchmark, options.repeat, options.latency
+    ):
+        results.append(result)
+        print(f"{result.key:<40} {result.best * 1000:>10.2f} ms", flush=True)
+
+    if options.output:
+        save(options.output, results, options.latency)
+
+    regressions = [
+        change
+        for change in compare(baseline, {result.key: result.best for result in results})
+        if change.ratio > 1 + options.tolerance and change.after - change.before > NOISE
+    ]
+    if baseline:
+        print(f"\n{len(regressions)} regressions compared with {options.compare}")
+    for change in regressions:
+        print(
+            f"{change.key:<40} {change.before * 1000:>10.2f} ms -> "
+            f"{change.after * 1000:.2f} ms ({change.ratio:.2f}x)"
+        )
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
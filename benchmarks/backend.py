@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2021-2022, Haren Samarasinghe
+#
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+#     * Redistributions of source code must retain the above copyright notice,
+#       this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright notice,
+#       this list of conditions and the following disclaimer in the documentation
+#       and/or other materials provided with the distribution.
+#     * Neither the name of seaport nor the names of its contributors
+#       may be used to endorse or promote products derived from this software
+#       without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""A repository backend that serves a synthetic tree, as if it were online.
+
+Each request sleeps for LATENCY seconds first, to simulate a round trip to the
+repository. This means Tree.set_size can be benchmarked without a network, while
+still showing how much time is spent waiting on requests.
+"""
+
+import time
+from contextlib import contextmanager
+from typing import Iterable, Iterator
+from unittest import mock
+
+from benchmarks.graphs import CATEGORIES
+from depythel._utility_imports import DescriptiveTree, DictType
+from depythel.registry import Backend, backends
+
+LATENCY = 0.0
+"""float: How long (in seconds) each request takes."""
+
+BATCH_SIZE = 100
+"""int: How many projects the tree generator asks online_many for at once."""
+
+SERIAL = "synthetic"
+"""str: The name of the repository, when projects are looked up one at a time."""
+
+BATCH = "synthetic_batch"
+"""str: The name of the repository, when projects are looked up in batches."""
+
+_tree: DescriptiveTree = {}
+
+
+def online(name: str) -> DictType[str, str]:
+    """Retrieves dependencies for NAME from the synthetic tree.
+
+    Args:
+       name: The name of the project to retrieve the dependencies for.
+
+    Returns: A dictionary of the project's dependencies, which is empty if the
+        project isn't in the tree.
+    """
+    time.sleep(LATENCY)
+    return dict(_tree.get(name, {}))
+
+
+def online_many(names: Iterable[str]) -> DictType[str, DictType[str, str]]:
+    """Retrieves dependencies for several projects in a single request.
+
+    Args:
+       names: The names of the projects to retrieve the dependencies for.
+
+    Returns: A dictionary mapping each project to its dependencies. Projects that
+        aren't in the tree are left out.
+    """
+    time.sleep(LATENCY)
+    return {name: dict(_tree[name]) for name in names if name in _tree}
+
+
+@contextmanager
+def serving(tree: DescriptiveTree, latency: float = 0.0) -> Iterator[None]:
+    """Registers the synthetic repositories, serving a tree until the block exits.
+
+    Args:
+        tree: The adjacency list to serve.
+        latency: How long (in seconds) each request takes. Defaults to 0.
+
+    Examples:
+        >>> from benchmarks.backend import SERIAL, serving
+        >>> from depythel.main import Tree
+        >>> with serving({"a": {"b": "lib"}, "b": {}}, latency=0.01):
+        ...     Tree("a", SERIAL, 2).tree
+        {'a': {'b': 'lib'}, 'b': {}}
+    """
+    global LATENCY, _tree  # pylint: disable=global-statement
+    registered = {
+        SERIAL: Backend(SERIAL, __name__, ("online",), CATEGORIES),
+        BATCH: Backend(BATCH, __name__, ("online", "batch"), CATEGORIES),
+    }
+    previous = LATENCY, _tree
+    LATENCY, _tree = latency, tree
+    try:
+        with mock.patch.dict(backends(), registered):
+            yield
+    finally:
+        LATENCY, _tree = previous
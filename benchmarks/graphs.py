@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2021-2022, Haren Samarasinghe
+#
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+#     * Redistributions of source code must retain the above copyright notice,
+#       this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright notice,
+#       this list of conditions and the following disclaimer in the documentation
+#       and/or other materials provided with the distribution.
+#     * Neither the name of seaport nor the names of its contributors
+#       may be used to endorse or promote products derived from this software
+#       without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Generates synthetic dependency trees of different shapes for benchmarking.
+
+Every generator is deterministic, so the same arguments always give the same tree
+and results can be compared across commits. Projects are named p0, p1, etc., and
+each tree is descriptive, with its categories taken from CATEGORIES.
+"""
+
+import random
+from typing import Callable, NamedTuple
+
+from depythel._utility_imports import DescriptiveTree, DictType, ListType
+
+CATEGORIES = ("lib", "build", "run", "test")
+"""Tuple[str, ...]: The categories that dependencies are randomly put into."""
+
+SEED = 2022
+"""int: The default seed for the random parts of each tree."""
+
+
+class Graph(NamedTuple):
+    """A synthetic dependency tree."""
+
+    name: str
+    """str: The shape of the tree, e.g. chain."""
+
+    tree: DescriptiveTree
+    """DescriptiveTree: An adjacency list, starting with the root."""
+
+    target: str
+    """str: The project most other projects directly depend on."""
+
+    @property
+    def edges(self) -> int:
+        """The number of dependencies in the tree."""
+        return sum(len(dependencies) for dependencies in self.tree.values())
+
+
+def chain(size: int, seed: int = SEED) -> Graph:
+    """Each project depends on the next one, e.g. p0 -> p1 -> p2.
+
+    This is as deep as a tree can get, so it catches anything recursive.
+
+    Examples:
+        >>> from benchmarks.graphs import chain
+        >>> chain(3).tree
+        {'p0': {'p1': 'lib'}, 'p1': {'p2': 'lib'}, 'p2': {}}
+    """
+    tree: DescriptiveTree = {
+        f"p{index}": {f"p{index + 1}": "lib"} for index in range(size - 1)
+    }
+    tree[f"p{size - 1}"] = {}
+    return Graph("chain", tree, f"p{size - 1}" if size > 1 else "p0")
+
+
+def fan_out(size: int, seed: int = SEED) -> Graph:
+    """The root depends on every other project, which don't depend on anything.
+
+    Examples:
+        >>> from benchmarks.graphs import fan_out
+        >>> fan_out(3).tree
+        {'p0': {'p1': 'lib', 'p2': 'build'}, 'p1': {}, 'p2': {}}
+    """
+    tree: DescriptiveTree = {
+        "p0": {
+            f"p{index}": CATEGORIES[index % len(CATEGORIES)] for index in range(1, size)
+        }
+    }
+    tree.update({f"p{index}": {} for index in range(1, size)})
+    return Graph("fan_out", tree, f"p{size - 1}" if size > 1 else "p0")
+
+
+def dense_dag(size: int, seed: int = SEED, degree: int = 10) -> Graph:
+    """Each project depends on up to degree random projects after it.
+
+    Every project also depends on the one straight after it, so that they can all
+    be reached from the root.
+
+    Examples:
+        >>> from benchmarks.graphs import dense_dag
+        >>> graph = dense_dag(100)
+        >>> graph.edges > 900
+        True
+    """
+    rng = random.Random(seed)
+    tree: DescriptiveTree = {}
+    for index in range(size):
+        later = range(index + 1, size)
+        chosen = {index + 1} if later else set()
+        chosen.update(rng.sample(later, min(degree - 1, len(later))))
+        tree[f"p{index}"] = {
+            f"p{child}": rng.choice(CATEGORIES) for child in sorted(chosen)
+        }
+    return Graph("dense_dag", tree, _most_depended_on(tree))
+
+
+def cycles(size: int, seed: int = SEED) -> Graph:
+    """Rings of 2-10 projects, each of which also depends on the next ring.
+
+    Examples:
+        >>> from benchmarks.graphs import cycles
+        >>> from depythel.main import LocalTree
+        >>> LocalTree(cycles(100).tree).cycle_check()
+        True
+    """
+    rng = random.Random(seed)
+    tree: DescriptiveTree = {}
+    start = 0
+    while start < size:
+        end = min(size, start + rng.randint(2, 10))
+        for index in range(start, end):
+            # The last project in each ring goes back to the first.
+            tree[f"p{index}"] = {f"p{index + 1 if index + 1 < end else start}": "lib"}
+        if end < size:
+            tree[f"p{start}"][f"p{end}"] = rng.choice(CATEGORIES)
+        start = end
+    return Graph("cycles", tree, _most_depended_on(tree))
+
+
+def power_law(size: int, seed: int = SEED, links: int = 3) -> Graph:
+    """A repository where a few popular libraries are depended on by most projects.
+
+    Projects are added one at a time, and each depends on up to links earlier
+    projects. Popular projects are more likely to be chosen, so the number of
+    dependents follows a power law, like in real package repositories. The root is
+    the newest project.
+
+    Examples:
+        >>> from benchmarks.graphs import power_law
+        >>> graph = power_law(1000)
+        >>> graph.target in {'p0', 'p1', 'p2', 'p3', 'p4'}
+        True
+    """
+    rng = random.Random(seed)
+    # Each project appears once, plus once for every dependent.
+    # Picking uniformly from this is picking in proportion to popularity.
+    popularity: ListType[int] = []
+    dependencies: ListType[DictType[str, str]] = []
+    for index in range(size):
+        chosen = {rng.choice(popularity) for _ in range(min(links, index))}
+        dependencies.append({f"p{child}": rng.choice(CATEGORIES) for child in chosen})
+        popularity.extend(chosen)
+        popularity.append(index)
+    tree = {
+        f"p{index}": dependencies[index] for index in reversed(range(len(dependencies)))
+    }
+    return Graph("power_law", tree, _most_depended_on(tree))
+
+
+GENERATORS: DictType[str, Callable[[int], Graph]] = {
+    "chain": chain,
+    "fan_out": fan_out,
+    "dense_dag": dense_dag,
+    "cycles": cycles,
+    "power_law": power_law,
+}
+"""DictType[str, Callable[[int], Graph]]: Every shape of tree, keyed by name."""
+
+
+def _most_depended_on(tree: DescriptiveTree) -> str:
+    """The project with the most direct dependents, going for the first if tied."""
+    dependents: DictType[str, int] = dict.fromkeys(tree, 0)
+    for dependencies in tree.values():
+        for dependency in dependencies:
+            dependents[dependency] += 1
+    return max(dependents, key=dependents.__getitem__)
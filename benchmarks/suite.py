@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2021-2022, Haren Samarasinghe
+#
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+#     * Redistributions of source code must retain the above copyright notice,
+#       this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright notice,
+#       this list of conditions and the following disclaimer in the documentation
+#       and/or other materials provided with the distribution.
+#     * Neither the name of seaport nor the names of its contributors
+#       may be used to endorse or promote products derived from this software
+#       without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Times LocalTree and Tree on synthetic trees, and compares the results.
+
+Results are stored as JSON, keyed by benchmark, shape and size (e.g.
+topological_sort/chain/1000), so that a run can be compared with one from an
+earlier commit.
+"""
+
+import gc
+import json
+import platform
+import subprocess
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Iterable, NamedTuple, Optional, Sequence, Tuple
+
+from benchmarks import backend
+from benchmarks.graphs import GENERATORS, Graph
+from depythel._utility_imports import DictType, GeneratorType, ListType
+from depythel.main import LocalTree, Tree
+
+FORMAT = 1
+"""int: The version of the results file, changed whenever its layout changes."""
+
+SIZES = (1_000, 10_000, 100_000)
+"""Tuple[int, ...]: The default number of projects in each synthetic tree."""
+
+FETCH_LIMIT = 1_000
+"""int: The most projects Tree.set_size fetches, since each request sleeps."""
+
+MODES = {
+    "serial": (backend.SERIAL, 1),
+    "threaded": (backend.SERIAL, 8),
+    "batch": (backend.BATCH, 1),
+}
+"""DictType[str, Tuple[str, int]]: Ways of fetching a tree, as (repository, workers)."""
+
+BENCHMARKS = (
+    "all_items",
+    "cycle_check",
+    "depends_on",
+    "topological_sort",
+    *(f"set_size[{mode}]" for mode in MODES),
+)
+"""Tuple[str, ...]: Every benchmark, in the order they run."""
+
+
+class Result(NamedTuple):
+    """How long a benchmark took on a synthetic tree."""
+
+    benchmark: str
+    """str: What was timed, e.g. topological_sort."""
+
+    graph: str
+    """str: The shape of the tree, e.g. chain."""
+
+    size: int
+    """int: The number of projects in the tree."""
+
+    edges: int
+    """int: The number of dependencies in the tree."""
+
+    seconds: ListType[float]
+    """ListType[float]: How long each repeat took."""
+
+    @property
+    def key(self) -> str:
+        """Identifies the benchmark across runs, e.g. topological_sort/chain/1000."""
+        return f"{self.benchmark}/{self.graph}/{self.size}"
+
+    @property
+    def best(self) -> float:
+        """The fastest repeat, which is the least affected by noise."""
+        return min(self.seconds)
+
+
+class Change(NamedTuple):
+    """The difference between two runs of a benchmark."""
+
+    key: str
+    """str: Identifies the benchmark, e.g. topological_sort/chain/1000."""
+
+    before: float
+    """float: The fastest repeat in the earlier run."""
+
+    after: float
+    """float: The fastest repeat in the later run."""
+
+    @property
+    def ratio(self) -> float:
+        """How many times longer the later run took."""
+        return self.after / self.before if self.before else float("inf")
+
+
+def run(
+    sizes: Iterable[int] = SIZES,
+    graphs: Iterable[str] = tuple(GENERATORS),
+    benchmarks: Sequence[str] = BENCHMARKS,
+    repeat: int = 3,
+    latency: float = 0.001,
+) -> GeneratorType[Result, None, None]:
+    """Runs benchmarks on synthetic trees of every shape and size.
+
+    Args:
+        sizes: The number of projects in each tree. Defaults to SIZES.
+        graphs: The shapes of tree to generate. Defaults to all of them.
+        benchmarks: What to time. Defaults to BENCHMARKS.
+        repeat: How many times to time each benchmark. Defaults to 3.
+        latency: How long (in seconds) each request takes in set_size benchmarks.
+            Defaults to 1ms.
+
+    Returns:
+        A generator of results, as each benchmark finishes.
+
+    Raises:
+        ValueError: If a benchmark or graph isn't supported.
+
+    Examples:
+        >>> from benchmarks.suite import run
+        >>> [result.key for result in run([10], ["chain"], ["all_items"], 1)]
+        ['all_items/chain/10']
+    """
+    graphs = tuple(graphs)
+    for name in (*benchmarks, *graphs):
+        if name not in BENCHMARKS and name not in GENERATORS:
+            raise ValueError(f"{name} is not a benchmark or graph")
+    if repeat < 1:
+        raise AttributeError("Repeat must be greater or equal to 1")
+
+    for size in sizes:
+        for name in graphs:
+            graph = GENERATORS[name](size)
+            for benchmark in benchmarks:
+                timer = _timer(benchmark, graph, latency)
+                if timer is not None:
+                    seconds = [timer() for _ in range(repeat)]
+                    yield Result(benchmark, name, size, graph.edges, seconds)
+
+
+def save(path: str, results: Iterable[Result], latency: float) -> None:
+    """Stores results as JSON, along with where they were measured.
+
+    Args:
+        path: Where to write the results.
+        results: The results of a run.
+        latency: The latency used in set_size benchmarks.
+    """
+    document = {
+        "format": FORMAT,
+        "commit": _commit(),
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "latency": latency,
+        "results": {
+            result.key: {
+                "edges": result.edges,
+                "best": result.best,
+                "seconds": result.seconds,
+            }
+            for result in results
+        },
+    }
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(document, file, indent=2)
+        file.write("\n")
+
+
+def load(path: str) -> Tuple[float, DictType[str, float]]:
+    """Reads the fastest repeat of each benchmark from a results file.
+
+    Args:
+        path: The results file, written by save().
+
+    Returns:
+        The latency used in set_size benchmarks, and the fastest repeat (in seconds)
+            of each benchmark, keyed by Result.key.
+
+    Raises:
+        ValueError: If the file is from an incompatible version of the suite.
+    """
+    with open(path, encoding="utf-8") as file:
+        document = json.load(file)
+    if document.get("format") != FORMAT:
+        raise ValueError(f"{path} isn't a version {FORMAT} results file")
+    return document["latency"], {
+        key: result["best"] for key, result in document["results"].items()
+    }
+
+
+def compare(
+    before: DictType[str, float], after: DictType[str, float]
+) -> ListType[Change]:
+    """Pairs up benchmarks that are in both runs.
+
+    Args:
+        before: The fastest repeats of the earlier run, from load().
+        after: The fastest repeats of the later run.
+
+    Returns:
+        The change in each benchmark, in the order of the later run.
+
+    Examples:
+        >>> from benchmarks.suite import compare
+        >>> compare({"a": 1.0, "b": 2.0}, {"b": 3.0, "c": 1.0})
+        [Change(key='b', before=2.0, after=3.0)]
+    """
+    return [Change(key, before[key], after[key]) for key in after if key in before]
+
+
+def _timer(
+    benchmark: str, graph: Graph, latency: float
+) -> Optional[Callable[[], float]]:
+    """Times a single repeat of a benchmark, or None if it doesn't apply to the graph.
+
+    Only the benchmark itself is timed. Each repeat gets a new tree, so that nothing
+    cached by an earlier repeat (e.g. the reverse dependency index) is reused.
+    """
+    operations: DictType[str, Callable[[LocalTree], Any]] = {
+        "all_items": LocalTree.all_items,
+        "cycle_check": lambda tree: tree.cycle_check(first=False),
+        "depends_on": lambda tree: list(tree.depends_on(graph.target)),
+        "topological_sort": LocalTree.topological_sort,
+    }
+    if benchmark in operations:
+        # Trees with cycles can't be sorted.
+        if benchmark == "topological_sort" and LocalTree(graph.tree).cycle_check():
+            return None
+        operation = operations[benchmark]
+        return lambda: _time(LocalTree(graph.tree), operation)
+
+    repository, workers = MODES[benchmark[len("set_size[") : -1]]
+    size = min(len(graph.tree), FETCH_LIMIT)
+
+    def fetch() -> float:
+        with backend.serving(graph.tree, latency):
+            tree = Tree(next(iter(graph.tree)), repository, workers=workers)
+            return _time(tree, lambda tree: tree.set_size(size))
+
+    return fetch
+
+
+def _time(tree: LocalTree, operation: Callable[[Any], Any]) -> float:
+    """How long an operation takes (in seconds), with garbage collection paused."""
+    collecting = gc.isenabled()
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        operation(tree)
+        return time.perf_counter() - start
+    finally:
+        if collecting:
+            gc.enable()
+
+
+def _commit() -> Optional[str]:
+    """The git commit being benchmarked, if there is one."""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
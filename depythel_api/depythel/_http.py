@@ -0,0 +1,551 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2021-2022, Haren Samarasinghe
+#
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+#     * Redistributions of source code must retain the above copyright notice,
+#       this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright notice,
+#       this list of conditions and the following disclaimer in the documentation
+#       and/or other materials provided with the distribution.
+#     * Neither the name of seaport nor the names of its contributors
+#       may be used to endorse or promote products derived from this software
+#       without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Fetches metadata over HTTP on behalf of the repository modules.
+
+Connections are kept alive and reused for every request to the same host, so each
+project only costs a single round trip rather than a new TCP and TLS handshake.
+Each thread keeps its own connections, since a connection can only have one request
+in flight. Responses are compressed where the server supports it, and requests that
+fail with a 429/5xx status (or a dropped connection) are retried with exponential
+backoff.
+
+Each function also has an asyncio version (e.g. fetch_json_async), which keeps a
+pool of idle connections per host and event loop instead.
+
+The timeout (in seconds) and number of retries can be changed with the
+``DEPYTHEL_TIMEOUT`` and ``DEPYTHEL_RETRIES`` environment variables.
+"""
+
+import asyncio
+import http.client
+import io
+import json
+import logging
+import os
+import sqlite3
+import ssl
+import threading
+import time
+import weakref
+import zlib
+from typing import Any, Mapping, NamedTuple, Optional, Tuple
+from urllib.error import HTTPError, URLError
+from urllib.parse import urljoin, urlsplit
+from urllib.request import getproxies, proxy_bypass
+
+from depythel._utility_imports import DictType, ListType
+from depythel.cache import CacheEntry, MetadataCache, default_cache
+
+log = logging.getLogger(__name__)
+
+TIMEOUT = float(os.environ.get("DEPYTHEL_TIMEOUT", 30))
+"""float: How long (in seconds) to wait for a server before giving up."""
+
+RETRIES = int(os.environ.get("DEPYTHEL_RETRIES", 3))
+"""int: How many times a failed request is retried."""
+
+BACKOFF = 0.5
+"""float: How long (in seconds) to wait before the first retry, doubling each time."""
+
+_RETRY_STATUSES = frozenset((429, 500, 502, 503, 504))
+_REDIRECT_STATUSES = frozenset((301, 302, 303, 307, 308))
+_MAX_REDIRECTS = 5
+
+# Each thread's connections, keyed by scheme and host.
+# Connections through a plain HTTP proxy are marked, since they need the full URL.
+_local = threading.local()
+
+_Stream = Tuple[asyncio.StreamReader, asyncio.StreamWriter]
+# Each event loop's idle connections, keyed by scheme and host.
+_async_pools: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, DictType[Tuple[str, str], ListType[_Stream]]]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+class Response(NamedTuple):
+    """A successful (or not modified) response to a request."""
+
+    status: int
+    headers: http.client.HTTPMessage
+    body: bytes
+
+
+def _connection(scheme: str, host: str) -> Tuple[http.client.HTTPConnection, bool]:
+    """Retrieves this thread's connection to a host, opening one if needed."""
+    pool: DictType[Tuple[str, str], Tuple[http.client.HTTPConnection, bool]]
+    pool = _local.__dict__.setdefault("pool", {})
+    if (scheme, host) in pool:
+        return pool[(scheme, host)]
+
+    connection_class = (
+        http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+    )
+    # Follow the same proxy settings as urllib
+    proxy = getproxies().get(scheme)
+    if proxy is not None and not proxy_bypass(host):
+        connection = connection_class(urlsplit(proxy).netloc, timeout=TIMEOUT)
+        if scheme == "https":
+            connection.set_tunnel(host)
+        pool[(scheme, host)] = connection, scheme != "https"
+    else:
+        connection = connection_class(host, timeout=TIMEOUT)
+        pool[(scheme, host)] = connection, False
+    log.debug(f"Opening connection to {host}")
+    return pool[(scheme, host)]
+
+
+def _discard(scheme: str, host: str) -> None:
+    """Closes this thread's connection to a host, if it has one."""
+    pool = _local.__dict__.get("pool", {})
+    if (scheme, host) in pool:
+        pool.pop((scheme, host))[0].close()
+
+
+def _decompress(body: bytes, encoding: Optional[str]) -> bytes:
+    """Decodes a gzip or deflate compressed response body."""
+    if encoding == "gzip":
+        return zlib.decompress(body, 16 + zlib.MAX_WBITS)
+    if encoding == "deflate":
+        try:
+            return zlib.decompress(body)
+        except zlib.error:
+            # Some servers send raw deflate data, without the zlib header
+            return zlib.decompress(body, -zlib.MAX_WBITS)
+    return body
+
+
+def _send(
+    url: str, headers: Mapping[str, str]
+) -> Tuple[int, http.client.HTTPMessage, bytes]:
+    """Sends a single GET request, retrying any temporary failures."""
+    parts = urlsplit(url)
+    for attempt in range(RETRIES + 1):
+        connection, absolute = _connection(parts.scheme, parts.netloc)
+        target = parts.path or "/"
+        if parts.query:
+            target += f"?{parts.query}"
+        try:
+            connection.request("GET", url if absolute else target, headers=headers)
+            response = connection.getresponse()
+            body = response.read()
+        except (http.client.HTTPException, OSError) as error:
+            _discard(parts.scheme, parts.netloc)
+            if attempt == RETRIES:
+                log.error(f"Unable to reach {parts.netloc}: {error}")
+                raise URLError(error) from error
+            log.debug(f"Retrying {url} after {error!r}")
+            # The server closing an idle keep-alive connection isn't worth waiting for
+            if not isinstance(error, http.client.RemoteDisconnected):
+                time.sleep(BACKOFF * 2**attempt)
+            continue
+
+        if response.will_close:
+            _discard(parts.scheme, parts.netloc)
+        if response.status in _RETRY_STATUSES and attempt < RETRIES:
+            retry_after = response.getheader("Retry-After", "")
+            delay = (
+                float(retry_after) if retry_after.isdigit() else BACKOFF * 2**attempt
+            )
+            log.debug(f"Retrying {url} in {delay}s after a {response.status} response")
+            time.sleep(delay)
+            continue
+        return response.status, response.msg, body
+
+    # Every attempt either returns, raises or continues
+    raise AssertionError("unreachable")  # pragma: no cover
+
+
+def _headers(headers: Optional[Mapping[str, str]]) -> DictType[str, str]:
+    """Adds the headers sent with every request."""
+    return {
+        "Accept-Encoding": "gzip, deflate",
+        "User-Agent": "depythel",
+        **(headers or {}),
+    }
+
+
+def _response(
+    url: str, status: int, headers: http.client.HTTPMessage, body: bytes
+) -> Response:
+    """Decodes a final (i.e. not redirected) response, raising any errors."""
+    if status >= 400:
+        raise HTTPError(
+            url, status, http.client.responses.get(status, ""), headers, None
+        )
+    return Response(status, headers, _decompress(body, headers.get("Content-Encoding")))
+
+
+def request(url: str, headers: Optional[Mapping[str, str]] = None) -> Response:
+    """Send a GET request over a persistent connection, following any redirects.
+
+    Args:
+        url: Where to send the request.
+        headers: Any additional request headers.
+
+    Returns:
+        The response, which either succeeded or wasn't modified (i.e. 304).
+
+    Raises:
+        HTTPError: If the server responded with an error, after any retries.
+        URLError: If the server couldn't be reached, after any retries.
+    """
+    request_headers = _headers(headers)
+    for _ in range(_MAX_REDIRECTS + 1):
+        status, response_headers, body = _send(url, request_headers)
+        if status in _REDIRECT_STATUSES and "Location" in response_headers:
+            url = urljoin(url, response_headers["Location"])
+            log.debug(f"Redirected to {url}")
+            continue
+        return _response(url, status, response_headers, body)
+    log.error(f"Too many redirects from {url}")
+    raise URLError(f"Too many redirects from {url}")
+
+
+async def _open(scheme: str, host: str) -> Tuple[_Stream, bool]:
+    """Takes an idle connection to a host, opening one if there aren't any.
+
+    Returns:
+        The connection, and whether it has been used before.
+    """
+    pool = _async_pools.setdefault(asyncio.get_event_loop(), {})
+    idle = pool.setdefault((scheme, host), [])
+    if idle:
+        return idle.pop(), True
+
+    parts = urlsplit(f"{scheme}://{host}")
+    log.debug(f"Opening connection to {host}")
+    stream = await asyncio.wait_for(
+        asyncio.open_connection(
+            parts.hostname,
+            parts.port or (443 if scheme == "https" else 80),
+            ssl=ssl.create_default_context() if scheme == "https" else None,
+        ),
+        TIMEOUT,
+    )
+    return stream, False
+
+
+async def _read_response(
+    reader: asyncio.StreamReader,
+) -> Tuple[int, http.client.HTTPMessage, bytes, bool]:
+    """Reads a HTTP/1.1 response, and whether the connection can be reused."""
+    status_line = await reader.readline()
+    if not status_line:
+        raise http.client.RemoteDisconnected("Remote end closed connection")
+    try:
+        version, status, *_ = status_line.decode("iso-8859-1").split(None, 2)
+        status_code = int(status)
+    except ValueError:
+        raise http.client.BadStatusLine(repr(status_line)) from None
+
+    header_lines = []
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        header_lines.append(line)
+    headers = http.client.parse_headers(io.BytesIO(b"".join(header_lines) + b"\r\n"))
+    keep_alive = (
+        version == "HTTP/1.1" and headers.get("Connection", "").lower() != "close"
+    )
+
+    if status_code in (204, 304) or status_code < 200:
+        body = b""
+    elif headers.get("Transfer-Encoding", "").lower() == "chunked":
+        chunks = []
+        while True:
+            size = int((await reader.readline()).split(b";")[0], 16)
+            if not size:
+                break
+            chunks.append(await reader.readexactly(size))
+            await reader.readline()
+        # Skip any trailers
+        while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+            pass
+        body = b"".join(chunks)
+    elif "Content-Length" in headers:
+        body = await reader.readexactly(int(headers["Content-Length"]))
+    else:
+        # The end of the response is marked by the server closing the connection
+        body = await reader.read()
+        keep_alive = False
+    return status_code, headers, body, keep_alive
+
+
+async def _send_async(
+    url: str, headers: Mapping[str, str]
+) -> Tuple[int, http.client.HTTPMessage, bytes]:
+    """Sends a single GET request, retrying any temporary failures."""
+    parts = urlsplit(url)
+    target = parts.path or "/"
+    if parts.query:
+        target += f"?{parts.query}"
+    message = "".join(
+        [f"GET {target} HTTP/1.1\r\nHost: {parts.netloc}\r\n"]
+        + [f"{header}: {value}\r\n" for header, value in headers.items()]
+        + ["\r\n"]
+    ).encode("iso-8859-1")
+
+    for attempt in range(RETRIES + 1):
+        writer: Optional[asyncio.StreamWriter] = None
+        reused = False
+        try:
+            (reader, writer), reused = await _open(parts.scheme, parts.netloc)
+            writer.write(message)
+            await writer.drain()
+            status, response_headers, body, keep_alive = await asyncio.wait_for(
+                _read_response(reader), TIMEOUT
+            )
+        except (
+            asyncio.TimeoutError,
+            asyncio.IncompleteReadError,
+            http.client.HTTPException,
+            OSError,
+            ValueError,
+        ) as error:
+            if writer is not None:
+                writer.close()
+            if attempt == RETRIES:
+                log.error(f"Unable to reach {parts.netloc}: {error!r}")
+                raise URLError(error) from error
+            log.debug(f"Retrying {url} after {error!r}")
+            # The server closing an idle keep-alive connection isn't worth waiting for
+            if not reused:
+                await asyncio.sleep(BACKOFF * 2**attempt)
+            continue
+
+        if keep_alive:
+            _async_pools[asyncio.get_event_loop()][(parts.scheme, parts.netloc)].append(
+                (reader, writer)
+            )
+        else:
+            writer.close()
+        if status in _RETRY_STATUSES and attempt < RETRIES:
+            retry_after = response_headers.get("Retry-After", "")
+            delay = (
+                float(retry_after) if retry_after.isdigit() else BACKOFF * 2**attempt
+            )
+            log.debug(f"Retrying {url} in {delay}s after a {status} response")
+            await asyncio.sleep(delay)
+            continue
+        return status, response_headers, body
+
+    # Every attempt either returns, raises or continues
+    raise AssertionError("unreachable")  # pragma: no cover
+
+
+async def request_async(
+    url: str, headers: Optional[Mapping[str, str]] = None
+) -> Response:
+    """Send a GET request from an event loop, like request().
+
+    Requests that need to go through a proxy are sent using request() in a thread.
+
+    Args:
+        url: Where to send the request.
+        headers: Any additional request headers.
+
+    Returns:
+        The response, which either succeeded or wasn't modified (i.e. 304).
+
+    Raises:
+        HTTPError: If the server responded with an error, after any retries.
+        URLError: If the server couldn't be reached, after any retries.
+    """
+    parts = urlsplit(url)
+    if parts.scheme in getproxies() and not proxy_bypass(parts.netloc):
+        return await asyncio.get_event_loop().run_in_executor(
+            None, request, url, headers
+        )
+
+    request_headers = _headers(headers)
+    for _ in range(_MAX_REDIRECTS + 1):
+        status, response_headers, body = await _send_async(url, request_headers)
+        if status in _REDIRECT_STATUSES and "Location" in response_headers:
+            url = urljoin(url, response_headers["Location"])
+            log.debug(f"Redirected to {url}")
+            continue
+        return _response(url, status, response_headers, body)
+    log.error(f"Too many redirects from {url}")
+    raise URLError(f"Too many redirects from {url}")
+
+
+def get_json(url: str) -> Any:
+    """Retrieve a JSON document without going through the persistent cache.
+
+    This is useful for documents describing several projects at once, which are
+    cached per project by the caller instead.
+
+    Args:
+        url: Where to fetch the document from.
+
+    Returns:
+        The parsed JSON document.
+    """
+    return json.loads(request(url).body)
+
+
+def cache_get(
+    cache: Optional[MetadataCache], repository: str, name: str
+) -> Optional[CacheEntry]:
+    """Looks up a project in the cache, treating any database errors as a miss.
+
+    Args:
+        cache: The cache to look in, or None if caching is turned off.
+        repository: The repository the project belongs to.
+        name: The project to look up.
+
+    Returns:
+        The cached response, or None if there isn't one that can be read.
+    """
+    if cache is None:
+        return None
+    try:
+        return cache.get(repository, name)
+    except sqlite3.Error as error:
+        log.warning(f"Unable to read {name} from the metadata cache: {error}")
+        return None
+
+
+def cache_set(
+    cache: Optional[MetadataCache],
+    repository: str,
+    name: str,
+    body: bytes,
+    etag: Optional[str] = None,
+    last_modified: Optional[str] = None,
+) -> None:
+    """Stores a response in the cache, unless the database can't be written to.
+
+    Another process may be holding the database's write lock, in which case the
+    response is still used, but isn't cached.
+
+    Args:
+        cache: The cache to store the response in, or None if caching is turned off.
+        repository: The repository the project belongs to.
+        name: The project the response describes.
+        body: The body of the response.
+        etag: The ETag header of the response.
+        last_modified: The Last-Modified header of the response.
+    """
+    if cache is None:
+        return
+    try:
+        cache.set(repository, name, body, etag, last_modified)
+    except sqlite3.Error as error:
+        log.warning(f"Unable to store {name} in the metadata cache: {error}")
+
+
+def _cached(
+    repository: str, name: str
+) -> Tuple[Optional[MetadataCache], Optional[CacheEntry], DictType[str, str]]:
+    """Looks up a project in the cache, and the headers needed to revalidate it."""
+    cache = default_cache()
+    entry = cache_get(cache, repository, name)
+    headers: DictType[str, str] = {}
+    if entry is not None:
+        if entry.etag is not None:
+            headers["If-None-Match"] = entry.etag
+        if entry.last_modified is not None:
+            headers["If-Modified-Since"] = entry.last_modified
+    return cache, entry, headers
+
+
+def _store(
+    cache: Optional[MetadataCache],
+    entry: Optional[CacheEntry],
+    repository: str,
+    name: str,
+    api_response: Response,
+) -> Any:
+    """Parses a response, storing it in the cache (or refreshing the cached one)."""
+    if api_response.status == 304 and cache is not None and entry is not None:
+        log.debug(f"Cached response for {name} from {repository} still valid")
+        try:
+            cache.refresh(repository, name)
+        except sqlite3.Error as error:
+            log.warning(f"Unable to refresh {name} in the metadata cache: {error}")
+        return json.loads(entry.body)
+
+    cache_set(
+        cache,
+        repository,
+        name,
+        api_response.body,
+        api_response.headers.get("ETag"),
+        api_response.headers.get("Last-Modified"),
+    )
+    return json.loads(api_response.body)
+
+
+def fetch_json(repository: str, name: str, url: str) -> Any:
+    """Retrieve a JSON document describing NAME, preferring the persistent cache.
+
+    Fresh entries are returned without any network access. Stale entries are
+    revalidated using their ETag/Last-Modified headers, so unchanged projects only
+    cost a 304 response.
+
+    Args:
+        repository: The repository the project belongs to.
+        name: The project the document describes.
+        url: Where to fetch the document from.
+
+    Returns:
+        The parsed JSON document.
+    """
+    cache, entry, headers = _cached(repository, name)
+    if entry is not None and entry.fresh:
+        log.debug(f"Using cached response for {name} from {repository}")
+        return json.loads(entry.body)
+    return _store(cache, entry, repository, name, request(url, headers))
+
+
+async def fetch_json_async(repository: str, name: str, url: str) -> Any:
+    """Retrieve a JSON document describing NAME from an event loop, like fetch_json().
+
+    Args:
+        repository: The repository the project belongs to.
+        name: The project the document describes.
+        url: Where to fetch the document from.
+
+    Returns:
+        The parsed JSON document.
+    """
+    # The cache uses SQLite, which blocks, so it is kept off the event loop.
+    loop = asyncio.get_event_loop()
+    cache, entry, headers = await loop.run_in_executor(None, _cached, repository, name)
+    if entry is not None and entry.fresh:
+        log.debug(f"Using cached response for {name} from {repository}")
+        return json.loads(entry.body)
+    api_response = await request_async(url, headers)
+    return await loop.run_in_executor(
+        None, _store, cache, entry, repository, name, api_response
+    )
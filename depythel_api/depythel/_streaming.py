@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2021-2022, Haren Samarasinghe
+#
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+#     * Redistributions of source code must retain the above copyright notice,
+#       this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright notice,
+#       this list of conditions and the following disclaimer in the documentation
+#       and/or other materials provided with the distribution.
+#     * Neither the name of seaport nor the names of its contributors
+#       may be used to endorse or promote products derived from this software
+#       without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Parses large JSON documents incrementally, without reading them into memory."""
+
+import codecs
+import json
+from typing import IO, Any, Tuple
+
+from depythel._utility_imports import GeneratorType
+
+# How many bytes to read from the file at a time
+CHUNK_SIZE = 65536
+
+# Characters that can follow the start of a JSON number
+_NUMBER_CHARACTERS = "0123456789.eE+-"
+
+
+def iter_array(
+    stream: IO[bytes], chunk_size: int = CHUNK_SIZE
+) -> GeneratorType[Any, None, None]:
+    """Yields each item of a top-level JSON array, one at a time.
+
+    Only the item currently being decoded (and at most one chunk after it) is kept
+    in memory, so the peak memory usage doesn't depend on the size of the document.
+
+    Args:
+        stream: The JSON document, opened in binary mode.
+        chunk_size: How many bytes to read at a time.
+
+    Returns:
+        A generator for each item in the array.
+
+    Raises:
+        json.JSONDecodeError: If the document isn't a valid JSON array.
+
+    Examples:
+        >>> import io
+        >>> from depythel._streaming import iter_array
+        >>> list(iter_array(io.BytesIO(b'[{"name": "gping"}, 2, "three"]')))
+        [{'name': 'gping'}, 2, 'three']
+    """
+    return _iter_values(stream, chunk_size, mapping=False)
+
+
+def iter_object(
+    stream: IO[bytes], chunk_size: int = CHUNK_SIZE
+) -> GeneratorType[Tuple[str, Any], None, None]:
+    """Yields each key and value of a top-level JSON object, one at a time.
+
+    Like iter_array, the whole document is never read into memory at once.
+
+    Args:
+        stream: The JSON document, opened in binary mode.
+        chunk_size: How many bytes to read at a time.
+
+    Returns:
+        A generator for each (key, value) pair in the object.
+
+    Raises:
+        json.JSONDecodeError: If the document isn't a valid JSON object.
+
+    Examples:
+        >>> import io
+        >>> from depythel._streaming import iter_object
+        >>> dict(iter_object(io.BytesIO(b'{"gping": {"rust": "build"}, "rust": {}}')))
+        {'gping': {'rust': 'build'}, 'rust': {}}
+    """
+    values = _iter_values(stream, chunk_size, mapping=True)
+    # Values always follow their key, otherwise an error is raised
+    for key in values:
+        yield key, next(values)
+
+
+def _iter_values(
+    stream: IO[bytes], chunk_size: int, mapping: bool
+) -> GeneratorType[Any, None, None]:
+    """Yields each item of an array, or each key followed by its value in an object."""
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder("utf-8")()
+    buffer, position = "", 0
+    exhausted = False
+    opening, closing = "{}" if mapping else "[]"
+    # What's expected next: the opening bracket, the first item, a comma, an item,
+    # or in an object, the colon after a key and then its value
+    expecting = opening
+
+    while True:
+        while position < len(buffer) and buffer[position].isspace():
+            position += 1
+
+        if position == len(buffer):
+            if exhausted:
+                raise json.JSONDecodeError("Unterminated document", buffer, position)
+            chunk = stream.read(chunk_size)
+            exhausted = not chunk
+            # Discard everything that's already been decoded
+            buffer, position = (
+                buffer[position:] + text_decoder.decode(chunk, exhausted),
+                0,
+            )
+            continue
+
+        character = buffer[position]
+        if expecting == opening:
+            if character != opening:
+                raise json.JSONDecodeError(f"Expecting '{opening}'", buffer, position)
+            position += 1
+            expecting = "first"
+        elif expecting in ("first", ",") and character == closing:
+            return
+        elif expecting in (",", ":"):
+            if character != expecting:
+                raise json.JSONDecodeError(
+                    f"Expecting '{expecting}' delimiter", buffer, position
+                )
+            position += 1
+            expecting = "value" if expecting == ":" else "item"
+        else:
+            try:
+                item, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if exhausted:
+                    raise
+                end = len(buffer)
+            # The item may continue into the next chunk. Numbers can be cut off
+            # anywhere (e.g. 1.5 read as 1 and .5), so they're only complete once
+            # something other than a number follows them.
+            continues = end == len(buffer) or (
+                isinstance(item, (int, float))
+                and not buffer[end:].lstrip(_NUMBER_CHARACTERS)
+            )
+            if continues and not exhausted:
+                chunk = stream.read(chunk_size)
+                exhausted = not chunk
+                buffer = buffer[position:] + text_decoder.decode(chunk, exhausted)
+                position = 0
+                continue
+            is_key = mapping and expecting != "value"
+            if is_key and not isinstance(item, str):
+                raise json.JSONDecodeError(
+                    "Expecting property name enclosed in double quotes",
+                    buffer,
+                    position,
+                )
+            yield item
+            position = end
+            expecting = ":" if is_key else ","
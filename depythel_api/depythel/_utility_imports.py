@@ -46,7 +46,7 @@ from typing import Union
 # won't run different parts of code
 if sys.version_info >= (3, 9):  # pragma: no cover
     from collections import deque
-    from collections.abc import Generator
+    from collections.abc import Generator, Mapping
     from functools import cache
 
     CacheType = cache
@@ -54,16 +54,18 @@ if sys.version_info >= (3, 9):  # pragma: no cover
     DictType = dict
     GeneratorType = Generator
     ListType = list
+    MappingType = Mapping
     SetType = set
 else:  # pragma: no cover
     from functools import lru_cache
-    from typing import Deque, Dict, Generator, List, Set
+    from typing import Deque, Dict, Generator, List, Mapping, Set
 
     CacheType = lru_cache(maxsize=None)
     DequeType = Deque
     DictType = Dict
     GeneratorType = Generator
     ListType = List
+    MappingType = Mapping
     SetType = Set
 
 # Standard tree e.g. {'a': 'b', 'b': 'a'}
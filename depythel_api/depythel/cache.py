@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2021-2022, Haren Samarasinghe
+#
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+#     * Redistributions of source code must retain the above copyright notice,
+#       this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright notice,
+#       this list of conditions and the following disclaimer in the documentation
+#       and/or other materials provided with the distribution.
+#     * Neither the name of seaport nor the names of its contributors
+#       may be used to endorse or promote products derived from this software
+#       without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Persistent on-disk cache for metadata fetched from repositories.
+
+Responses are stored in an SQLite database keyed by repository and project name, so
+that separate depythel processes can reuse each other's requests.
+
+The cache is stored in ``$XDG_CACHE_HOME/depythel`` (``~/.cache/depythel`` by
+default). This can be changed with the ``DEPYTHEL_CACHE_DIR`` environment variable,
+and the cache can be turned off entirely by setting ``DEPYTHEL_NO_CACHE``.
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import NamedTuple, Optional, Tuple
+
+# Re-exported, since it was originally defined here
+from depythel._directories import cache_directory as cache_directory
+from depythel._utility_imports import DictType
+
+log = logging.getLogger(__name__)
+
+DEFAULT_TTL = 24 * 60 * 60
+"""float: How long (in seconds) an entry is used before it's revalidated."""
+
+DEFAULT_MAX_SIZE = 64 * 1024 * 1024
+"""int: The maximum size (in bytes) of the stored responses."""
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS metadata (
+    repository TEXT NOT NULL,
+    name TEXT NOT NULL,
+    body BLOB NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    fetched REAL NOT NULL,
+    accessed REAL NOT NULL,
+    size INTEGER NOT NULL,
+    PRIMARY KEY (repository, name)
+);
+CREATE INDEX IF NOT EXISTS metadata_accessed ON metadata (accessed);
+"""
+
+
+class CacheEntry(NamedTuple):
+    """A response stored in the cache."""
+
+    body: bytes
+    """bytes: The body of the response."""
+
+    etag: Optional[str]
+    """Optional[str]: The ETag header of the response, used for revalidation."""
+
+    last_modified: Optional[str]
+    """Optional[str]: The Last-Modified header of the response, used for revalidation."""
+
+    fresh: bool
+    """bool: Whether the entry can be used without revalidating it."""
+
+
+class MetadataCache:
+    """An SQLite backed cache of repository responses with LRU eviction."""
+
+    def __init__(
+        self, path: str, ttl: float = DEFAULT_TTL, max_size: int = DEFAULT_MAX_SIZE
+    ) -> None:
+        """An SQLite backed cache of repository responses with LRU eviction.
+
+        Args:
+            path: The location of the SQLite database.
+            ttl: How long (in seconds) an entry is used before it's revalidated.
+            max_size: The maximum size (in bytes) of the stored responses. The least
+                recently used entries are removed once this is exceeded.
+
+        Examples:
+            >>> from depythel.cache import MetadataCache
+            >>> cache = MetadataCache(":memory:")
+            >>> cache.set("macports", "gping", b'{"dependencies": []}')
+            >>> cache.get("macports", "gping").body
+            b'{"dependencies": []}'
+        """
+        self.path = path
+        """str: The location of the SQLite database."""
+
+        self.ttl = ttl
+        """float: How long (in seconds) an entry is used before it's revalidated."""
+
+        self.max_size = max_size
+        """int: The maximum size (in bytes) of the stored responses."""
+
+        # The repository modules may be called from several threads at once.
+        self._lock = threading.Lock()
+        # When entries were last read, which is written along with the next change.
+        # This keeps reads from needing a write lock on the database.
+        self._accessed: DictType[Tuple[str, str], float] = {}
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript(_SCHEMA)
+
+    def get(self, repository: str, name: str) -> Optional[CacheEntry]:
+        """Retrieve a stored response, marking it as recently used.
+
+        This only reads from the database, so it works while another process is
+        writing to it. The time it was used is stored with the next change.
+
+        Args:
+            repository: The repository the response was fetched from.
+            name: The project the response describes.
+
+        Returns:
+            The stored response, or None if nothing has been stored.
+        """
+        now = time.time()
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT body, etag, last_modified, fetched FROM metadata "
+                "WHERE repository = ? AND name = ?",
+                (repository, name),
+            ).fetchone()
+            if row is None:
+                return None
+            self._accessed[(repository, name)] = now
+        body, etag, last_modified, fetched = row
+        return CacheEntry(
+            zlib.decompress(body), etag, last_modified, now - fetched < self.ttl
+        )
+
+    def set(
+        self,
+        repository: str,
+        name: str,
+        body: bytes,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+    ) -> None:
+        """Store a response, evicting the least recently used entries if required.
+
+        Args:
+            repository: The repository the response was fetched from.
+            name: The project the response describes.
+            body: The body of the response.
+            etag: The ETag header of the response.
+            last_modified: The Last-Modified header of the response.
+        """
+        now = time.time()
+        compressed = zlib.compress(body)
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO metadata VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    repository,
+                    name,
+                    compressed,
+                    etag,
+                    last_modified,
+                    now,
+                    now,
+                    len(compressed),
+                ),
+            )
+            self._accessed.pop((repository, name), None)
+            self._write_accessed()
+            self._evict()
+
+    def refresh(self, repository: str, name: str) -> None:
+        """Mark a stored response as fresh, e.g. after a 304 Not Modified response.
+
+        Args:
+            repository: The repository the response was fetched from.
+            name: The project the response describes.
+        """
+        now = time.time()
+        with self._lock, self._connection:
+            self._connection.execute(
+                "UPDATE metadata SET fetched = ?, accessed = ? "
+                "WHERE repository = ? AND name = ?",
+                (now, now, repository, name),
+            )
+            self._accessed.pop((repository, name), None)
+            self._write_accessed()
+
+    def size(self) -> int:
+        """Calculates how many bytes the stored responses take up."""
+        with self._lock:
+            return self._size()
+
+    def clear(self) -> None:
+        """Remove every stored response."""
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM metadata")
+            self._accessed.clear()
+
+    def _size(self) -> int:
+        total: Optional[int] = self._connection.execute(
+            "SELECT SUM(size) FROM metadata"
+        ).fetchone()[0]
+        return total or 0
+
+    def _write_accessed(self) -> None:
+        """Store when entries were last read, as part of the current transaction."""
+        if self._accessed:
+            self._connection.executemany(
+                "UPDATE metadata SET accessed = ? WHERE repository = ? AND name = ?",
+                [(accessed, *key) for key, accessed in self._accessed.items()],
+            )
+            self._accessed.clear()
+
+    def _evict(self) -> None:
+        """Remove the least recently used entries until the cache fits in max_size."""
+        excess = self._size() - self.max_size
+        if excess <= 0:
+            return
+        rows = self._connection.execute(
+            "SELECT repository, name, size FROM metadata ORDER BY accessed"
+        )
+        evicted = []
+        for repository, name, size in rows:
+            if excess <= 0:
+                break
+            evicted.append((repository, name))
+            excess -= size
+        log.debug(f"Evicting {len(evicted)} entries from the metadata cache")
+        self._connection.executemany(
+            "DELETE FROM metadata WHERE repository = ? AND name = ?", evicted
+        )
+
+
+_default_cache: Optional[MetadataCache] = None
+_default_cache_loaded = False
+_default_cache_lock = threading.Lock()
+
+
+def default_cache() -> Optional[MetadataCache]:
+    """The cache shared by all the repository modules.
+
+    Returns:
+        The shared cache, or None if caching is turned off or the cache directory
+        can't be written to.
+    """
+    global _default_cache, _default_cache_loaded  # pylint: disable=global-statement
+    with _default_cache_lock:
+        if not _default_cache_loaded:
+            _default_cache_loaded = True
+            if os.environ.get("DEPYTHEL_NO_CACHE"):
+                log.debug("DEPYTHEL_NO_CACHE set - not using the metadata cache")
+            else:
+                directory = cache_directory()
+                try:
+                    os.makedirs(directory, exist_ok=True)
+                    _default_cache = MetadataCache(
+                        os.path.join(directory, "metadata.sqlite3")
+                    )
+                except (OSError, sqlite3.Error):
+                    log.warning(f"Unable to use {directory} for caching", exc_info=True)
+        return _default_cache
+
+
+def set_default_cache(cache: Optional[MetadataCache]) -> None:
+    """Replace the cache shared by all the repository modules.
+
+    Args:
+        cache: The cache to use, or None to turn caching off.
+
+    Examples:
+        >>> from depythel.cache import MetadataCache, set_default_cache
+        >>> # Only keep responses for an hour
+        >>> set_default_cache(MetadataCache("/tmp/depythel.sqlite3", ttl=3600))
+    """
+    global _default_cache, _default_cache_loaded  # pylint: disable=global-statement
+    with _default_cache_lock:
+        _default_cache = cache
+        _default_cache_loaded = True
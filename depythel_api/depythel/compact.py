@@ -0,0 +1,378 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2021-2022, Haren Samarasinghe
+#
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+#     * Redistributions of source code must retain the above copyright notice,
+#       this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright notice,
+#       this list of conditions and the following disclaimer in the documentation
+#       and/or other materials provided with the distribution.
+#     * Neither the name of seaport nor the names of its contributors
+#       may be used to endorse or promote products derived from this software
+#       without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""A compact, read-only representation of large dependency trees.
+
+Project names are interned and replaced by integer IDs, and each project's
+dependencies are stored in compressed sparse row (CSR) form using the array module.
+Dependency categories (e.g. build/lib) are stored as small integer codes into a table
+of category names.
+
+Trees can be saved to and loaded from a binary file, which stores the name tables
+followed by the raw CSR arrays. Loaded trees can be memory mapped, so the arrays are
+read from disk on demand rather than parsed up front.
+"""
+
+import mmap
+import struct
+import sys
+from array import array
+from typing import Any, Iterable, Iterator, Optional, Union, cast
+
+from depythel._utility_imports import AnyTree, DictType, ListType, MappingType
+
+# The array typecode of category codes, widened if there are more than 256 categories.
+_CATEGORY_CODE = "B"
+
+MAGIC = b"DEPYTHEL"
+"""bytes: The first bytes of every binary tree file."""
+
+_VERSION = 1
+# magic, version, flags, then the number of names, categories, keys and targets
+# and the length in bytes of the encoded name and category tables, padded to 40 bytes.
+_HEADER = struct.Struct("<8sBBxxIIIIIIxxxx")
+_DESCRIPTIVE = 1
+_WIDE_CATEGORIES = 2
+# Every section starts on a multiple of this many bytes.
+_ALIGNMENT = 8
+
+
+class CompactTree(MappingType[str, Union[str, DictType[str, str]]]):
+    """A read-only adjacency list that uses a fraction of the memory of a dictionary."""
+
+    def __init__(self, tree: MappingType[str, Union[str, DictType[str, str]]]) -> None:
+        """A read-only adjacency list that uses a fraction of the memory of a dictionary.
+
+        It behaves like the dictionary it was built from, so can be passed anywhere
+        an adjacency list is expected, such as LocalTree.
+
+        Args:
+            tree: An adjacency list representing a dependency tree.
+
+        Examples:
+            >>> from depythel.compact import CompactTree
+            >>> example = CompactTree({"A": {"B": "lib", "C": "build"}, "B": {"C": "build"}})
+            >>> example["A"]
+            {'B': 'lib', 'C': 'build'}
+            >>> example.successors("A")
+            ['B', 'C']
+            >>> example.names
+            ['A', 'B', 'C']
+        """
+        self.names: ListType[str] = []
+        """ListType[str]: The name of every project, indexed by its ID."""
+
+        self.categories: ListType[str] = []
+        """ListType[str]: The name of every dependency category, indexed by its code."""
+
+        self._ids: DictType[str, int] = {}
+        self._category_codes: DictType[str, int] = {}
+
+        # The ID of each project with an entry in the tree, in insertion order.
+        self._keys = array("i")
+        # The row of each project in the CSR arrays, or -1 if it isn't in the tree.
+        self._rows = array("i")
+        # The dependencies of the project in row i are in targets[offsets[i]:offsets[i+1]]
+        self._offsets = array("i", [0])
+        self._targets = array("i")
+        self._kinds = array(_CATEGORY_CODE)
+
+        values = iter(tree.values())
+        self.descriptive = not isinstance(next(values, {}), str)
+        """bool: Whether dependencies have categories, as in a descriptive tree."""
+
+        for name, dependencies in tree.items():
+            self._keys.append(self._intern(name))
+            if self.descriptive:
+                for dependency, category in cast(
+                    DictType[str, str], dependencies
+                ).items():
+                    self._targets.append(self._intern(dependency))
+                    # The category array might be widened, so look up the code first
+                    code = self._category(category)
+                    self._kinds.append(code)
+            else:
+                self._targets.append(self._intern(cast(str, dependencies)))
+            self._offsets.append(len(self._targets))
+
+        self._rows = array("i", [-1]) * len(self.names)
+        for row, project in enumerate(self._keys):
+            self._rows[project] = row
+
+    def _intern(self, name: str) -> int:
+        """Returns the ID of a project, assigning a new one if required."""
+        project = self._ids.get(name)
+        if project is None:
+            project = self._ids[name] = len(self.names)
+            self.names.append(sys.intern(name))
+        return project
+
+    def _category(self, category: str) -> int:
+        """Returns the code of a category, assigning a new one if required."""
+        code = self._category_codes.get(category)
+        if code is None:
+            if len(self.categories) == 2 ** (8 * self._kinds.itemsize):
+                self._kinds = array("H", self._kinds)
+            code = self._category_codes[category] = len(self.categories)
+            self.categories.append(sys.intern(category))
+        return code
+
+    def _row(self, name: str) -> int:
+        """Returns the row of a project in the CSR arrays, raising KeyError if absent."""
+        project = self._ids.get(name)
+        row = -1 if project is None else self._rows[project]
+        if row == -1:
+            raise KeyError(name)
+        return row
+
+    def successors(
+        self, name: str, categories: Optional[Iterable[str]] = None
+    ) -> ListType[str]:
+        """The direct dependencies of a project, without building a dictionary.
+
+        Args:
+            name: A project in the tree.
+            categories: Only include dependencies in these categories. Defaults to
+                None, which includes every dependency.
+
+        Returns:
+            The names of the project's dependencies, or an empty list if the project
+            doesn't have an entry in the tree.
+        """
+        project = self._ids.get(name)
+        row = -1 if project is None else self._rows[project]
+        if row == -1:
+            return []
+        names = self.names
+        start, end = self._offsets[row], self._offsets[row + 1]
+        if categories is None or not self.descriptive:
+            return [names[target] for target in self._targets[start:end]]
+        codes = {
+            self._category_codes[category]
+            for category in categories
+            if category in self._category_codes
+        }
+        return [
+            names[target]
+            for target, code in zip(self._targets[start:end], self._kinds[start:end])
+            if code in codes
+        ]
+
+    def to_dict(self) -> AnyTree:
+        """Converts the tree back into a standard or descriptive tree.
+
+        Returns:
+            An adjacency list equal to the one the tree was built from.
+        """
+        if self.descriptive:
+            return {name: cast(DictType[str, str], self[name]) for name in self}
+        return {name: cast(str, self[name]) for name in self}
+
+    def to_bytes(self) -> bytes:
+        """Serialises the tree into its binary file format.
+
+        Returns:
+            The encoded tree, which can be passed to CompactTree.from_bytes.
+
+        Examples:
+            >>> from depythel.compact import CompactTree
+            >>> data = CompactTree({"A": "B"}).to_bytes()
+            >>> CompactTree.from_bytes(data)["A"]
+            'B'
+        """
+        names = "\0".join(self.names).encode()
+        categories = "\0".join(self.categories).encode()
+        flags = (_DESCRIPTIVE if self.descriptive else 0) | (
+            _WIDE_CATEGORIES if self._kinds.itemsize > 1 else 0
+        )
+        sections = [
+            _HEADER.pack(
+                MAGIC,
+                _VERSION,
+                flags,
+                len(self.names),
+                len(self.categories),
+                len(self._keys),
+                len(self._targets),
+                len(names),
+                len(categories),
+            ),
+            names,
+            categories,
+        ]
+        for section in (self._keys, self._offsets, self._targets, self._kinds):
+            if sys.byteorder != "little":
+                section = array(section.typecode, section)
+                section.byteswap()
+            sections.append(section.tobytes())
+        return b"".join(
+            section + bytes(-len(section) % _ALIGNMENT) for section in sections
+        )
+
+    def save(self, path: str) -> None:
+        """Writes the tree to a binary file.
+
+        Args:
+            path: Where to write the file.
+        """
+        with open(path, "wb") as file:
+            file.write(self.to_bytes())
+
+    @classmethod
+    def from_bytes(cls, data: Union[bytes, memoryview, mmap.mmap]) -> "CompactTree":
+        """Loads a tree from its binary file format without copying the arrays.
+
+        Args:
+            data: A tree encoded by CompactTree.to_bytes.
+
+        Returns:
+            The decoded tree.
+
+        Raises:
+            ValueError: The data isn't a binary tree, or is from a newer version.
+        """
+        view = memoryview(data)
+        if len(view) < _HEADER.size or bytes(view[: len(MAGIC)]) != MAGIC:
+            raise ValueError("Not a binary dependency tree.")
+        (
+            _,
+            version,
+            flags,
+            name_count,
+            category_count,
+            key_count,
+            target_count,
+            names_length,
+            categories_length,
+        ) = _HEADER.unpack_from(view)
+        if version != _VERSION:
+            raise ValueError(f"Unsupported binary tree version {version}.")
+
+        offset = _HEADER.size
+
+        def section(length: int) -> memoryview:
+            nonlocal offset
+            start = offset
+            offset += length + (-length % _ALIGNMENT)
+            if offset > len(view):
+                raise ValueError("Truncated binary dependency tree.")
+            return view[start : start + length]
+
+        def table(length: int, count: int) -> ListType[str]:
+            if not count:
+                section(length)
+                return []
+            return [
+                sys.intern(name) for name in str(section(length), "utf-8").split("\0")
+            ]
+
+        def numbers(typecode: str, count: int) -> "array[int]":
+            item = array(typecode).itemsize
+            raw = section(count * item)
+            if sys.byteorder == "little":
+                # Memoryviews support the same indexing and slicing as arrays.
+                return cast("array[int]", cast(Any, raw).cast(typecode))
+            swapped = array(typecode, bytes(raw))
+            swapped.byteswap()
+            return swapped
+
+        tree = cls.__new__(cls)
+        tree.names = table(names_length, name_count)
+        tree.categories = table(categories_length, category_count)
+        tree._ids = {name: project for project, name in enumerate(tree.names)}
+        tree._category_codes = {
+            category: code for code, category in enumerate(tree.categories)
+        }
+        tree.descriptive = bool(flags & _DESCRIPTIVE)
+        tree._keys = numbers("i", key_count)
+        tree._offsets = numbers("i", key_count + 1)
+        tree._targets = numbers("i", target_count)
+        tree._kinds = numbers(
+            "H" if flags & _WIDE_CATEGORIES else _CATEGORY_CODE,
+            target_count if tree.descriptive else 0,
+        )
+        tree._rows = array("i", [-1]) * len(tree.names)
+        for row, project in enumerate(tree._keys):
+            tree._rows[project] = row
+        return tree
+
+    @classmethod
+    def load(cls, path: str, memory_map: bool = True) -> "CompactTree":
+        """Loads a tree from a binary file.
+
+        Args:
+            path: A file written by CompactTree.save.
+            memory_map: Whether to map the file into memory, so the arrays are only
+                read from disk as they're used. Defaults to True.
+
+        Returns:
+            The decoded tree.
+
+        Raises:
+            ValueError: The file isn't a binary tree, or is from a newer version.
+        """
+        with open(path, "rb") as file:
+            if not memory_map:
+                return cls.from_bytes(file.read())
+            try:
+                data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # Empty files can't be mapped
+                raise ValueError("Not a binary dependency tree.") from None
+        return cls.from_bytes(data)
+
+    def __getitem__(self, name: str) -> Union[str, DictType[str, str]]:
+        """The dependencies of a project, in the same form the tree was built from."""
+        row = self._row(name)
+        start, end = self._offsets[row], self._offsets[row + 1]
+        if not self.descriptive:
+            return self.names[self._targets[start]]
+        return {
+            self.names[self._targets[index]]: self.categories[self._kinds[index]]
+            for index in range(start, end)
+        }
+
+    def __contains__(self, name: object) -> bool:
+        """Whether a project has an entry in the tree."""
+        project = self._ids.get(name) if isinstance(name, str) else None
+        return project is not None and self._rows[project] != -1
+
+    def __iter__(self) -> Iterator[str]:
+        """Iterates over the projects with an entry in the tree, in insertion order."""
+        names = self.names
+        return (names[project] for project in self._keys)
+
+    def __len__(self) -> int:
+        """The number of projects with an entry in the tree."""
+        return len(self._keys)
+
+    def __repr__(self) -> str:
+        """Shows the tree in the same form as the dictionary it was built from."""
+        return f"CompactTree({self.to_dict()!r})"
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2021-2022, Haren Samarasinghe
+#
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+#     * Redistributions of source code must retain the above copyright notice,
+#       this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright notice,
+#       this list of conditions and the following disclaimer in the documentation
+#       and/or other materials provided with the distribution.
+#     * Neither the name of seaport nor the names of its contributors
+#       may be used to endorse or promote products derived from this software
+#       without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Exports dependency trees for graph renderers, without building a graph object.
+
+Nodes and edges are generated straight from the tree's adjacency list, and each
+project is coloured by how far it is from the root.
+"""
+
+from html import escape
+from typing import IO, Any, Optional, Tuple
+
+from depythel._utility_imports import DictType, GeneratorType
+from depythel.main import LocalTree
+
+DEPTH_COLOURS = ("#00ff1e", "#2b7ce9", "#ffa807", "#e129f0", "#7be141", "#eb7df4")
+"""Tuple[str, ...]: The colour of projects at each depth, starting with the root.
+Deeper projects use the last colour."""
+
+UNREACHABLE_COLOUR = "#cccccc"
+"""str: The colour of projects that the root doesn't depend on."""
+
+
+def colour(depth: Optional[int]) -> str:
+    """The colour of a project a given number of dependencies from the root.
+
+    Args:
+        depth: The distance from the root, or None if it can't be reached.
+
+    Returns:
+        A hex colour code.
+
+    Examples:
+        >>> from depythel.export import colour
+        >>> colour(0)
+        '#00ff1e'
+    """
+    if depth is None:
+        return UNREACHABLE_COLOUR
+    return DEPTH_COLOURS[min(depth, len(DEPTH_COLOURS) - 1)]
+
+
+def nodes(tree: LocalTree) -> GeneratorType[Tuple[str, Optional[int]], None, None]:
+    """Generates every project in the tree once, with its depth.
+
+    Args:
+        tree: The tree to export.
+
+    Returns:
+        A generator of (project, depth) tuples. The depth is None for projects that
+        the root doesn't depend on, including those only reached through filtered
+        dependencies.
+
+    Examples:
+        >>> from depythel.export import nodes
+        >>> from depythel.main import LocalTree
+        >>> list(nodes(LocalTree({'A': 'B', 'C': 'B'})))
+        [('A', 0), ('B', 1), ('C', None)]
+    """
+    depths = tree.depths()
+    seen = set()
+    for project, dependency, _ in tree.edges():
+        for name in (project, dependency):
+            if name not in seen:
+                seen.add(name)
+                yield name, depths.get(name)
+    # Projects without any (remaining) dependencies
+    for project in tree.tree:
+        if project not in seen:
+            seen.add(project)
+            yield project, depths.get(project)
+
+
+def pyvis_nodes(tree: LocalTree) -> GeneratorType[DictType[str, Any], None, None]:
+    """Generates the options of each node, in the form pyvis stores them.
+
+    Args:
+        tree: The tree to export.
+
+    Returns:
+        A generator of node options, which can be used as pyvis.network.Network.nodes.
+    """
+    for project, depth in nodes(tree):
+        yield {
+            "id": project,
+            "label": project,
+            "shape": "dot",
+            "color": colour(depth),
+            "size": 20 if project == tree.root else 10,
+            "title": project if depth is None else f"{project} (depth {depth})",
+        }
+
+
+def pyvis_edges(tree: LocalTree) -> GeneratorType[DictType[str, Any], None, None]:
+    """Generates the options of each directed edge, in the form pyvis stores them.
+
+    Args:
+        tree: The tree to export.
+
+    Returns:
+        A generator of edge options, which can be used as pyvis.network.Network.edges.
+    """
+    for project, dependency, category in tree.edges():
+        edge = {"from": project, "to": dependency, "arrows": "to"}
+        if category is not None:
+            edge["title"] = category
+        yield edge
+
+
+def write_dot(tree: LocalTree, file: IO[str]) -> None:
+    """Writes the tree in the DOT language, as used by Graphviz.
+
+    Args:
+        tree: The tree to export.
+        file: Where to write the graph.
+
+    Examples:
+        >>> import io
+        >>> from depythel.export import write_dot
+        >>> from depythel.main import LocalTree
+        >>> output = io.StringIO()
+        >>> write_dot(LocalTree({'A': {'B': 'lib'}, 'B': {}}), output)
+        >>> print(output.getvalue())
+        digraph "A" {
+          "A" [style=filled, fillcolor="#00ff1e"];
+          "B" [style=filled, fillcolor="#2b7ce9"];
+          "A" -> "B" [label="lib"];
+        }
+        <BLANKLINE>
+    """
+    file.write(f"digraph {_dot_id(tree.root)} {{\n")
+    for project, depth in nodes(tree):
+        file.write(
+            f'  {_dot_id(project)} [style=filled, fillcolor="{colour(depth)}"];\n'
+        )
+    for project, dependency, category in tree.edges():
+        label = "" if category is None else f" [label={_dot_id(category)}]"
+        file.write(f"  {_dot_id(project)} -> {_dot_id(dependency)}{label};\n")
+    file.write("}\n")
+
+
+def write_graphml(tree: LocalTree, file: IO[str]) -> None:
+    """Writes the tree in GraphML, as used by Gephi, yEd and Cytoscape.
+
+    Each node has its depth and colour, and each edge has its category.
+
+    Args:
+        tree: The tree to export.
+        file: Where to write the graph.
+    """
+    file.write(
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<graphml xmlns="http://graphml.graphdrawing.org/xmlns">\n'
+        '  <key id="depth" for="node" attr.name="depth" attr.type="int"/>\n'
+        '  <key id="colour" for="node" attr.name="colour" attr.type="string"/>\n'
+        '  <key id="category" for="edge" attr.name="category" attr.type="string"/>\n'
+        f'  <graph id={_quote_attribute(tree.root)} edgedefault="directed">\n'
+    )
+    for project, depth in nodes(tree):
+        file.write(f"    <node id={_quote_attribute(project)}>")
+        if depth is not None:
+            file.write(f'<data key="depth">{depth}</data>')
+        file.write(f'<data key="colour">{colour(depth)}</data></node>\n')
+    for project, dependency, category in tree.edges():
+        file.write(
+            f"    <edge source={_quote_attribute(project)} target={_quote_attribute(dependency)}"
+        )
+        if category is None:
+            file.write("/>\n")
+        else:
+            file.write(f'><data key="category">{escape(category)}</data></edge>\n')
+    file.write("  </graph>\n</graphml>\n")
+
+
+def _quote_attribute(value: str) -> str:
+    """Escapes and quotes a value for use as an XML attribute."""
+    # xml.sax.saxutils.quoteattr is avoided, since it imports urllib
+    return f'"{escape(value)}"'
+
+
+def _dot_id(name: str) -> str:
+    """Quotes a name for use as an ID in the DOT language."""
+    return '"' + name.replace("\\", "\\\\").replace('"', '\\"') + '"'
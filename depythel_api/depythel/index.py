@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2021-2022, Haren Samarasinghe
+#
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+#     * Redistributions of source code must retain the above copyright notice,
+#       this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright notice,
+#       this list of conditions and the following disclaimer in the documentation
+#       and/or other materials provided with the distribution.
+#     * Neither the name of seaport nor the names of its contributors
+#       may be used to endorse or promote products derived from this software
+#       without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Answers dependency lookups from a local copy of a repository's full index.
+
+Some repositories publish their whole catalogue in a single file (e.g. Homebrew's
+formula.json or MacPorts' PortIndex). Each repository module that supports this
+provides a parse_index function, which is used to ingest the file into an SQLite
+database. Trees can then be generated without any network access.
+"""
+
+import json
+import logging
+import sqlite3
+import threading
+from typing import Iterable, Tuple
+
+from depythel._utility_imports import DictType
+from depythel.registry import backend
+
+log = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS projects (
+    repository TEXT NOT NULL,
+    name TEXT NOT NULL,
+    dependencies TEXT NOT NULL,
+    PRIMARY KEY (repository, name)
+);
+"""
+
+
+class OfflineIndex:
+    """An SQLite store of the dependencies of every project in a repository."""
+
+    def __init__(self, path: str) -> None:
+        """An SQLite store of the dependencies of every project in a repository.
+
+        Args:
+            path: The location of the SQLite database.
+
+        Examples:
+            >>> from depythel.index import OfflineIndex
+            >>> from depythel.main import Tree
+            >>> index = OfflineIndex("ports.sqlite3")
+            >>> # Downloaded from https://formulae.brew.sh/api/formula.json
+            >>> stored = index.ingest_file("homebrew", "formula.json")
+            >>> index.lookup("homebrew", "gping")
+            {'rust': 'build_dependencies'}
+            >>> example = Tree("gping", "homebrew", 10, index=index)
+        """
+        self.path = path
+        """str: The location of the SQLite database."""
+
+        # The tree generator may look up projects from several threads at once.
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        # Read through a memory map, rather than copying pages into SQLite's cache.
+        self._connection.execute("PRAGMA mmap_size=268435456")
+        self._connection.executescript(_SCHEMA)
+
+    def ingest(
+        self, repository: str, projects: Iterable[Tuple[str, DictType[str, str]]]
+    ) -> int:
+        """Replace the stored projects of a repository.
+
+        Args:
+            repository: The repository the projects belong to.
+            projects: Pairs of project names and their dependencies.
+
+        Returns:
+            The number of projects stored.
+        """
+        with self._lock, self._connection:
+            self._connection.execute(
+                "DELETE FROM projects WHERE repository = ?", (repository,)
+            )
+            cursor = self._connection.executemany(
+                "INSERT OR REPLACE INTO projects VALUES (?, ?, ?)",
+                (
+                    (repository, name, json.dumps(dependencies))
+                    for name, dependencies in projects
+                ),
+            )
+        log.info(f"Stored {cursor.rowcount} projects from {repository}")
+        return cursor.rowcount
+
+    def ingest_file(self, repository: str, path: str) -> int:
+        """Replace the stored projects of a repository with those in an index file.
+
+        Args:
+            repository: The repository the index file is from.
+            path: The location of the index file.
+
+        Returns:
+            The number of projects stored.
+        """
+        registered = backend(repository)
+        if not registered.supports("index"):
+            log.error(f"{repository} does not support offline indexes")
+            raise AttributeError(f"{repository} does not support offline indexes")
+        with open(path, "rb") as index_file:
+            return self.ingest(repository, registered.load().parse_index(index_file))
+
+    def lookup(self, repository: str, name: str) -> DictType[str, str]:
+        """Retrieves the dependencies of a project, like the repository's online().
+
+        Args:
+            repository: The repository the project belongs to.
+            name: The name of the project.
+
+        Returns:
+            A dictionary of build/run/etc. dependencies.
+
+        Raises:
+            KeyError: If the project isn't in the index.
+        """
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT dependencies FROM projects WHERE repository = ? AND name = ?",
+                (repository, name),
+            ).fetchone()
+        if row is None:
+            raise KeyError(f"{name} is not in the {repository} index")
+        dependencies: DictType[str, str] = json.loads(row[0])
+        return dependencies
+
+    def __len__(self) -> int:
+        """The number of projects stored, across all repositories."""
+        with self._lock:
+            count: int = self._connection.execute(
+                "SELECT COUNT(*) FROM projects"
+            ).fetchone()[0]
+        return count
@@ -0,0 +1,358 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2021-2022, Haren Samarasinghe
+#
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+#     * Redistributions of source code must retain the above copyright notice,
+#       this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright notice,
+#       this list of conditions and the following disclaimer in the documentation
+#       and/or other materials provided with the distribution.
+#     * Neither the name of seaport nor the names of its contributors
+#       may be used to endorse or promote products derived from this software
+#       without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Lays out large dependency graphs ahead of time, so they can be drawn quickly.
+
+Rather than simulating physics in the browser, projects are placed in layers by their
+distance from the root, and each layer is ordered to keep edges short. To keep the
+number of nodes manageable, cycles and deep subtrees can be collapsed into clusters.
+"""
+
+import json
+from collections import deque
+from html import escape
+from typing import Callable, Iterable, NamedTuple, Optional, Tuple
+
+from depythel._utility_imports import DictType, ListType, SetType
+
+# The distance between neighbouring projects in a layer, and between layers.
+SPACING = 100
+
+
+class Cluster(NamedTuple):
+    """A node in a laid out graph, standing for one or more projects."""
+
+    label: str
+    """str: The name shown for the node."""
+
+    projects: Tuple[str, ...]
+    """Tuple[str, ...]: The projects the node stands for."""
+
+    depth: int
+    """int: How many dependencies away the node is from the root."""
+
+    x: int
+    """int: The horizontal position of the node."""
+
+    y: int
+    """int: The vertical position of the node."""
+
+
+class Layout(NamedTuple):
+    """The position of every project in a dependency graph."""
+
+    clusters: ListType[Cluster]
+    """ListType[Cluster]: Every node in the graph."""
+
+    edges: ListType[Tuple[int, int]]
+    """ListType[Tuple[int, int]]: Each dependency, as indexes into the clusters."""
+
+    def to_html(self, title: str = "depythel") -> str:
+        """Renders the layout as a standalone page, drawn with an HTML canvas.
+
+        The graph is embedded as flat arrays rather than one object per node and
+        edge, and labels are only drawn once zoomed in, so pages stay responsive
+        with tens of thousands of nodes.
+
+        Args:
+            title: The title of the page.
+
+        Returns:
+            The HTML of the page.
+        """
+        data = {
+            "labels": [cluster.label for cluster in self.clusters],
+            "projects": [
+                "\n".join(cluster.projects) if len(cluster.projects) > 1 else ""
+                for cluster in self.clusters
+            ],
+            "depths": [cluster.depth for cluster in self.clusters],
+            "x": [cluster.x for cluster in self.clusters],
+            "y": [cluster.y for cluster in self.clusters],
+            "edges": [index for edge in self.edges for index in edge],
+        }
+        # Stop the data from closing the script tag early
+        embedded = json.dumps(data, separators=(",", ":")).replace("</", "<\\/")
+        return _TEMPLATE.replace("{{title}}", escape(title)).replace(
+            "{{data}}", embedded
+        )
+
+
+def layered(
+    components: Iterable[ListType[str]],
+    children: Callable[[str], Iterable[str]],
+    roots: Iterable[str],
+    max_depth: Optional[int] = None,
+) -> Layout:
+    """Lays out a graph in layers, collapsing each component into a single node.
+
+    Args:
+        components: Groups of projects to show as one node, e.g. strongly connected
+            components. Every project must be in exactly one of them.
+        children: Returns the direct dependencies of a project.
+        roots: The projects placed in the top layer.
+        max_depth: Projects more than this many layers down are collapsed into their
+            ancestor at this depth. Defaults to None, which collapses nothing.
+
+    Returns:
+        The position of each node, and the dependencies between them.
+
+    Examples:
+        >>> from depythel.layout import layered
+        >>> tree = {"A": ["B", "C"], "B": ["C"], "C": []}
+        >>> layout = layered([["C"], ["B"], ["A"]], tree.__getitem__, ["A"], 0)
+        >>> [cluster.label for cluster in layout.clusters]
+        ['A (+2 more)']
+    """
+    groups = list(components)
+    group_of = {
+        project: index for index, group in enumerate(groups) for project in group
+    }
+
+    # The dependencies between components, without duplicates or loops
+    successors: ListType[ListType[int]] = [[] for _ in groups]
+    for index, group in enumerate(groups):
+        seen: SetType[int] = {index}
+        for project in group:
+            for child in children(project):
+                target = group_of[child]
+                if target not in seen:
+                    seen.add(target)
+                    successors[index].append(target)
+
+    # Breadth first search from the roots. Components that can't be reached from
+    # them start their own trees, dependents first.
+    depths = [-1] * len(groups)
+    parents = list(range(len(groups)))
+    starts = [group_of[root] for root in roots if root in group_of]
+    starts.extend(reversed(range(len(groups))))
+    queue: "deque[int]" = deque()
+    for start in starts:
+        if depths[start] != -1:
+            continue
+        depths[start] = 0
+        queue.append(start)
+        while queue:
+            current = queue.popleft()
+            for target in successors[current]:
+                if depths[target] == -1:
+                    depths[target] = depths[current] + 1
+                    parents[target] = current
+                    queue.append(target)
+
+    # Components too deep are merged into their ancestor at the maximum depth,
+    # which is always found first, since parents are shallower than their children.
+    heads = list(range(len(groups)))
+    if max_depth is not None:
+        for index in sorted(range(len(groups)), key=depths.__getitem__):
+            if depths[index] > max_depth:
+                heads[index] = heads[parents[index]]
+
+    members: DictType[int, ListType[str]] = {}
+    for index in sorted(range(len(groups)), key=depths.__getitem__):
+        members.setdefault(heads[index], []).extend(groups[index])
+    order = list(members)
+    node_of = {head: node for node, head in enumerate(order)}
+
+    edges: ListType[Tuple[int, int]] = []
+    edge_set: SetType[Tuple[int, int]] = set()
+    for index, targets in enumerate(successors):
+        for target in targets:
+            edge = (node_of[heads[index]], node_of[heads[target]])
+            if edge[0] != edge[1] and edge not in edge_set:
+                edge_set.add(edge)
+                edges.append(edge)
+
+    positions = _order_layers([depths[head] for head in order], edges)
+    clusters = []
+    for node, head in enumerate(order):
+        projects = members[head]
+        label = (
+            projects[0]
+            if len(projects) == 1
+            else f"{projects[0]} (+{len(projects) - 1} more)"
+        )
+        clusters.append(
+            Cluster(
+                label,
+                tuple(projects),
+                depths[head],
+                positions[node] * SPACING,
+                depths[head] * SPACING,
+            )
+        )
+    return Layout(clusters, edges)
+
+
+def _order_layers(
+    depths: ListType[int], edges: ListType[Tuple[int, int]]
+) -> ListType[int]:
+    """Orders each layer by the average position of each node's dependents.
+
+    This is a single downwards sweep of the barycenter heuristic, which keeps most
+    edges short in linear time (apart from sorting each layer).
+
+    Returns:
+        The horizontal position of each node, with each layer centred on zero.
+    """
+    dependents: ListType[ListType[int]] = [[] for _ in depths]
+    for source, target in edges:
+        if depths[source] < depths[target]:
+            dependents[target].append(source)
+
+    layers: DictType[int, ListType[int]] = {}
+    for node, depth in enumerate(depths):
+        layers.setdefault(depth, []).append(node)
+
+    positions = [0] * len(depths)
+    for depth in sorted(layers):
+        layer = layers[depth]
+        layer.sort(
+            key=lambda node: sum(positions[dependent] for dependent in dependents[node])
+            / len(dependents[node])
+            if dependents[node]
+            else 0
+        )
+        offset = len(layer) // 2
+        for index, node in enumerate(layer):
+            positions[node] = index - offset
+    return positions
+
+
+_TEMPLATE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>{{title}}</title>
+<style>
+html, body { margin: 0; height: 100%; overflow: hidden; font: 12px sans-serif; }
+canvas { display: block; cursor: grab; }
+#tip { position: fixed; pointer-events: none; background: #fff; padding: 4px;
+       border: 1px solid #999; white-space: pre; display: none; }
+</style>
+</head>
+<body>
+<canvas id="graph"></canvas>
+<div id="tip"></div>
+<script>
+const data = {{data}};
+const canvas = document.getElementById("graph");
+const tip = document.getElementById("tip");
+const context = canvas.getContext("2d");
+const count = data.labels.length;
+const colours = ["#00ff1e", "#2b7ce9", "#ffa807", "#e129f0", "#7be141", "#eb7df4"];
+let scale = 1, panX = 0, panY = 0, dragging = null;
+
+function fit() {
+  canvas.width = window.innerWidth;
+  canvas.height = window.innerHeight;
+  let minX = 0, maxX = 0, maxY = 0;
+  for (let i = 0; i < count; i++) {
+    minX = Math.min(minX, data.x[i]);
+    maxX = Math.max(maxX, data.x[i]);
+    maxY = Math.max(maxY, data.y[i]);
+  }
+  scale = Math.min(canvas.width / (maxX - minX + 200), canvas.height / (maxY + 200), 1);
+  panX = canvas.width / 2 - (minX + maxX) / 2 * scale;
+  panY = 50;
+  draw();
+}
+
+function draw() {
+  context.setTransform(1, 0, 0, 1, 0, 0);
+  context.clearRect(0, 0, canvas.width, canvas.height);
+  context.setTransform(scale, 0, 0, scale, panX, panY);
+  // Every edge is drawn as part of one path, which is much faster than one each
+  context.beginPath();
+  for (let i = 0; i < data.edges.length; i += 2) {
+    const a = data.edges[i], b = data.edges[i + 1];
+    context.moveTo(data.x[a], data.y[a]);
+    context.lineTo(data.x[b], data.y[b]);
+  }
+  context.strokeStyle = "rgba(120, 120, 120, 0.4)";
+  context.lineWidth = 1 / scale;
+  context.stroke();
+  for (let i = 0; i < count; i++) {
+    context.beginPath();
+    context.arc(data.x[i], data.y[i], data.projects[i] ? 14 : 8, 0, 2 * Math.PI);
+    context.fillStyle = colours[Math.min(data.depths[i], colours.length - 1)];
+    context.fill();
+  }
+  // Labels are only readable (and worth drawing) once zoomed in
+  if (scale > 0.4) {
+    context.fillStyle = "#000";
+    context.textAlign = "center";
+    for (let i = 0; i < count; i++) {
+      context.fillText(data.labels[i], data.x[i], data.y[i] - 18);
+    }
+  }
+}
+
+function nodeAt(clientX, clientY) {
+  const x = (clientX - panX) / scale, y = (clientY - panY) / scale;
+  for (let i = 0; i < count; i++) {
+    const dx = data.x[i] - x, dy = data.y[i] - y;
+    if (dx * dx + dy * dy < 196) return i;
+  }
+  return -1;
+}
+
+canvas.addEventListener("mousedown", (e) => { dragging = [e.clientX, e.clientY]; });
+window.addEventListener("mouseup", () => { dragging = null; });
+canvas.addEventListener("mousemove", (e) => {
+  if (dragging) {
+    panX += e.clientX - dragging[0];
+    panY += e.clientY - dragging[1];
+    dragging = [e.clientX, e.clientY];
+    draw();
+    return;
+  }
+  const node = nodeAt(e.clientX, e.clientY);
+  tip.style.display = node === -1 ? "none" : "block";
+  if (node !== -1) {
+    tip.textContent = data.projects[node] || data.labels[node];
+    tip.style.left = e.clientX + 12 + "px";
+    tip.style.top = e.clientY + 12 + "px";
+  }
+});
+canvas.addEventListener("wheel", (e) => {
+  e.preventDefault();
+  const factor = e.deltaY < 0 ? 1.2 : 1 / 1.2;
+  panX = e.clientX - (e.clientX - panX) * factor;
+  panY = e.clientY - (e.clientY - panY) * factor;
+  scale *= factor;
+  draw();
+}, { passive: false });
+window.addEventListener("resize", fit);
+fit();
+</script>
+</body>
+</html>
+"""
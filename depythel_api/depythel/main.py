@@ -33,40 +33,94 @@
 # TODO: Sort out if online, if offline
 # TODO: Test docstrings
 # TODO: At some point, refactor off the module checking
-# TODO: When retrieving from stack, make sure the variable isn't one with the same name
-# set by the user
 # TODO: Remove print statements - This is meant to be an api
 
-import importlib
-import inspect
+import heapq
 import logging
+import sys
+import time
+import weakref
 from collections import deque
-from typing import Any, Callable, Optional, cast
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from functools import partial
+from itertools import islice
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Awaitable,
+    Callable,
+    Iterable,
+    Iterator,
+    Optional,
+    Tuple,
+    Union,
+    cast,
+)
 
 from depythel._utility_imports import (
     AnyTree,
     DequeType,
-    DescriptiveTree,
     DictType,
     GeneratorType,
+    ListType,
+    MappingType,
     SetType,
-    StandardTree,
 )
+from depythel.compact import CompactTree
+from depythel.layout import Layout, layered
+from depythel.registry import backend
+
+if TYPE_CHECKING:  # pragma: no cover
+    # Only used in annotations. Importing these (asyncio in particular) takes a
+    # while, which slows down every command of the CLT.
+    import asyncio
+
+    from depythel.index import OfflineIndex
 
 log = logging.getLogger(__name__)
 # logging.basicConfig(level=logging.DEBUG)
 
+TRAVERSALS = ("bfs", "dfs", "depth")
+"""Tuple[str, ...]: The orders in which a Tree can fetch projects."""
+
+
+class CycleError(ValueError):
+    """Raised when a cycle prevents a dependency tree from being ordered."""
+
+    def __init__(self, message: str, projects: ListType[str]) -> None:
+        """Raised when a cycle prevents a dependency tree from being ordered.
+
+        Args:
+            message: A description of the error.
+            projects: The projects that are part of a cycle.
+        """
+        super().__init__(message)
+        self.projects = projects
+        """ListType[str]: The projects that are part of a cycle."""
+
 
 # TODO: Implement defensive programming
 # TODO: Deal with None in standard tree
 class LocalTree:
     """A tree class to manage a dependency tree for a specified adjacency list."""
 
-    def __init__(self, tree: AnyTree) -> None:
+    def __init__(
+        self,
+        tree: Union[AnyTree, CompactTree],
+        include: Optional[Iterable[str]] = None,
+        exclude: Iterable[str] = (),
+    ) -> None:
         """A tree class to manage a dependency tree for a specified adjacency list.
 
         Args:
-            tree: An adjacency list representing a dependency tree.
+            tree: An adjacency list representing a dependency tree. For large trees,
+                a CompactTree can be used instead to save memory.
+            include: The only categories of dependencies to follow in a descriptive
+                tree, e.g. runtime dependencies. Defaults to None, which follows
+                every category.
+            exclude: Categories of dependencies to ignore in a descriptive tree, e.g.
+                build dependencies. Defaults to ignoring none of them.
 
         Examples:
             >>> from depythel.main import LocalTree
@@ -75,23 +129,36 @@ class LocalTree:
             >>> # A depends on B (library dependency) and C (build dependency)
             >>> # B requires C to build, and C doesn't require anything.
             >>> example2 = LocalTree({"A": {"B": "lib", "C": "build"}, "B": {"C": "build"}, "C": {}})
+            >>> # The same tree, stored compactly
+            >>> from depythel.compact import CompactTree
+            >>> example3 = LocalTree(CompactTree(example2.tree))
+            >>> # Ignore build dependencies, so A only depends on B
+            >>> example4 = LocalTree(example2.tree, exclude=["build"])
         """
         self.tree = tree
-        """AnyTree: An adjacency list representing a dependency tree."""
+        """Union[AnyTree, CompactTree]: An adjacency list representing a dependency tree."""
+
+        self.include = None if include is None else frozenset(include)
+        """Optional[FrozenSet[str]]: The only categories of dependencies followed."""
 
-        self.root = tuple(self.tree)[0]
+        self.exclude = frozenset(exclude)
+        """FrozenSet[str]: Categories of dependencies that are ignored."""
+
+        self.root = next(iter(self.tree))
         """str: The root of the dependency tree."""
 
         self._standard_tree: bool = False
         """bool: Whether the tree inputted is a standard tree or a descriptive tree."""
 
+        self._index: Optional[Tuple[ListType[str], DictType[str, ListType[str]]]] = None
+        """Optional[Tuple]: Reverse dependency index, built the first time it's needed."""
+
         # Assumes the graph is connected, which it should be since it's a tree
         # Checks the first item to determine the tree type
-        if isinstance(tuple(self.tree.values())[0], str):
-            self.tree = cast(StandardTree, self.tree)
+        if isinstance(self.tree, CompactTree):
+            self._standard_tree = not self.tree.descriptive
+        elif isinstance(next(iter(self.tree.values())), str):
             self._standard_tree = True
-        else:
-            self.tree = cast(DescriptiveTree, self.tree)
 
     def all_items(self) -> SetType[str]:
         """Generates all the projects in a dependency tree.
@@ -106,22 +173,58 @@ class LocalTree:
             >>> example.all_items()
             {'A', 'B', 'C'}
         """
-        all_items_list: DequeType[str] = deque()
-
-        # Mypy doesn't seem to like the casting, whilst pycharm does like it
-        # pycharm says all is good, so ignore the mypy errors
-        if self._standard_tree:
-            # Add all keys and values from dictionary
-            all_items_list.extend(self.tree.values())  # type:ignore[arg-type]
-        else:  # If it's a descriptive tree
-            for dep in self.tree.values():
-                all_items_list.extend(tuple(dep.keys()))  # type:ignore[union-attr]
-
-        # If cycle with root project present, it will already be in the list
-        if self.root not in all_items_list:
-            all_items_list.append(self.root)
         # Use set to remove duplicates
-        return set(all_items_list)
+        # Filters only remove dependencies, so every project in the tree is kept.
+        all_items_set = set(self.tree)
+        all_items_set.update(
+            child for item in self.tree for child in self._children(item)
+        )
+        return all_items_set
+
+    def edges(self) -> GeneratorType[Tuple[str, str, Optional[str]], None, None]:
+        """Generates every dependency in the tree, straight from the adjacency list.
+
+        Returns:
+            A generator of (project, dependency, category) tuples. The category is
+            None in standard trees.
+
+        Examples:
+            >>> from depythel.main import LocalTree
+            >>> example = LocalTree({'A': {'B': 'lib', 'C': 'build'}, 'B': {}})
+            >>> list(example.edges())
+            [('A', 'B', 'lib'), ('A', 'C', 'build')]
+        """
+        for project in self.tree:
+            if self._standard_tree:
+                yield project, cast(str, self.tree[project]), None
+                continue
+            dependencies = cast(DictType[str, str], self.tree[project])
+            for dependency, category in dependencies.items():
+                if self._followed(category):
+                    yield project, dependency, category
+
+    def depths(self) -> DictType[str, int]:
+        """How many dependencies away each project is from the root.
+
+        Forests measure the distance from the nearest of their roots.
+
+        Returns:
+            The shortest distance from the root to each project it depends on.
+
+        Examples:
+            >>> from depythel.main import LocalTree
+            >>> LocalTree({'A': 'B', 'B': 'C', 'C': 'A'}).depths()
+            {'A': 0, 'B': 1, 'C': 2}
+        """
+        depths = dict.fromkeys(self._roots(), 0)
+        queue = deque(depths)
+        while queue:
+            project = queue.popleft()
+            for child in self._children(project):
+                if child not in depths:
+                    depths[child] = depths[project] + 1
+                    queue.append(child)
+        return depths
 
     def depends_on(self, project: str) -> GeneratorType[str, None, None]:
         """Determines items in a tree that depend on a given project.
@@ -139,16 +242,175 @@ class LocalTree:
             >>> list(example.depends_on('B'))
             ['A']
         """
-        return (item for item in self.tree if project in self.tree[item])
+        return (item for item in self._dependents()[1].get(project, ()))
+
+    def all_dependents(self, project: str) -> SetType[str]:
+        """Determines every item that directly or indirectly depends on a project.
+
+        Args:
+            project: A string representing a project in the tree
+
+        Returns:
+            A set of all the items that would be affected by a change to the project.
+                This only includes the project itself if it's part of a cycle.
+
+        Examples:
+            >>> from depythel.main import LocalTree
+            >>> # A depends on B, which depends on C
+            >>> example = LocalTree({'A': 'B', 'B': 'C'})
+            >>> sorted(example.all_dependents('C'))
+            ['A', 'B']
+        """
+        dependents = self._dependents()[1]
+        return _reachable(project, lambda item: dependents.get(item, ()))
+
+    def all_dependencies(self, project: str) -> SetType[str]:
+        """Determines every item that a project directly or indirectly depends on.
+
+        Args:
+            project: A string representing a project in the tree
+
+        Returns:
+            A set of all the items required by the project. This only includes the
+                project itself if it's part of a cycle.
+
+        Examples:
+            >>> from depythel.main import LocalTree
+            >>> # A depends on B, which depends on C
+            >>> example = LocalTree({'A': 'B', 'B': 'C'})
+            >>> sorted(example.all_dependencies('A'))
+            ['B', 'C']
+        """
+        return _reachable(project, self._children)
+
+    def compact(self) -> "LocalTree":
+        """Converts the tree into a form that uses a fraction of the memory.
+
+        Returns:
+            A new LocalTree backed by a CompactTree.
+
+        Examples:
+            >>> from depythel.main import LocalTree
+            >>> example = LocalTree({'A': 'B', 'B': 'C'}).compact()
+            >>> example.tree
+            CompactTree({'A': 'B', 'B': 'C'})
+            >>> example.topological_sort()
+            deque(['C', 'B', 'A'])
+        """
+        return LocalTree(CompactTree(self.tree), self.include, self.exclude)
+
+    def save(self, path: str) -> None:
+        """Writes the tree to a compact binary file, which is much faster to load.
+
+        The category filters aren't saved, since they're applied when reading.
+
+        Args:
+            path: Where to write the file.
+        """
+        tree = self.tree
+        if not isinstance(tree, CompactTree):
+            tree = CompactTree(tree)
+        tree.save(path)
+
+    @staticmethod
+    def load(
+        path: str,
+        include: Optional[Iterable[str]] = None,
+        exclude: Iterable[str] = (),
+    ) -> "LocalTree":
+        """Loads a tree written by LocalTree.save, mapping it into memory.
+
+        Args:
+            path: A binary tree file.
+            include: The only categories of dependencies to follow. Defaults to None,
+                which follows every category.
+            exclude: Categories of dependencies to ignore. Defaults to none of them.
+
+        Returns:
+            A LocalTree backed by a CompactTree.
+
+        Raises:
+            ValueError: The file isn't a binary tree.
+        """
+        return LocalTree(CompactTree.load(path), include, exclude)
+
+    def _children(self, project: str) -> Iterable[str]:
+        """The direct dependencies of a project, or nothing if it isn't in the tree.
+
+        Dependencies in categories that are filtered out are left out, so every
+        algorithm only follows the remaining ones.
+        """
+        filtered = self.include is not None or self.exclude
+        if isinstance(self.tree, CompactTree):
+            if filtered:
+                return self.tree.successors(
+                    project, filter(self._followed, self.tree.categories)
+                )
+            return self.tree.successors(project)
+        dependencies = self.tree.get(project)
+        if dependencies is None:
+            return ()
+        if self._standard_tree:
+            # Standard trees don't have categories to filter by
+            return (cast(str, dependencies),)
+        if filtered:
+            return [
+                child
+                for child, category in cast(DictType[str, str], dependencies).items()
+                if self._followed(category)
+            ]
+        return cast(DictType[str, str], dependencies)
+
+    def _roots(self) -> ListType[str]:
+        """Private method returning the projects that generation starts from."""
+        return [self.root]
+
+    def _followed(self, category: str) -> bool:
+        """Whether dependencies in a category pass the include/exclude filters."""
+        return (
+            self.include is None or category in self.include
+        ) and category not in self.exclude
+
+    def _dependents(self) -> Tuple[ListType[str], DictType[str, ListType[str]]]:
+        """Builds an index of which projects depend on each project.
+
+        The index is only built once, until the tree is changed.
+
+        Returns:
+            Every project in the order it first appears in the tree, along with a
+            dictionary mapping each project to the projects that depend on it.
+        """
+        if self._index is None:
+            log.debug("Building reverse dependency index")
+            dependents: DictType[str, ListType[str]] = {}
+            for item in self.tree:
+                dependents.setdefault(item, [])
+                for child in self._children(item):
+                    dependents.setdefault(child, []).append(item)
+            self._index = list(dependents), dependents
+        return self._index
+
+    def _invalidate(self) -> None:
+        """Discards anything cached about the tree, since it has been changed."""
+        self._index = None
 
     # See https://courses.cs.washington.edu/courses/cse326/03wi/lectures/RaoLect20.pdf page 7
-    # in degree is the number of times it appears in tuple(tuple(i.keys()) for i in tree.values())
-    def topological_sort(self) -> DequeType[str]:
+    def topological_sort(self, tie_break: Optional[str] = None) -> DequeType[str]:
         """Determines an order in which dependencies can be installed.
 
+        This uses Kahn's algorithm, which runs in linear time.
+
+        Args:
+            tie_break: How to choose between projects that can be installed at the
+                same time. "insertion" prefers projects that appear earlier in the
+                tree, and "lexicographic" prefers projects in alphabetical order.
+                Defaults to None, which takes them in the order they become ready.
+
         Returns:
-            A deque representing a possible topological sorting of the tree. Raises
-                StopIteration if no ordering is possible.
+            A deque representing a possible topological sorting of the tree.
+
+        Raises:
+            CycleError: If a cycle is present, so no ordering is possible.
 
         Examples:
             >>> from depythel.main import LocalTree
@@ -156,45 +418,194 @@ class LocalTree:
             >>> example = LocalTree({'A': 'B', 'B': 'C'})
             >>> example.topological_sort()
             deque(['C', 'B', 'A'])
+            >>> example = LocalTree({"A": {"C": "lib", "B": "lib"}, "B": {}, "C": {}})
+            >>> example.topological_sort(tie_break="lexicographic")
+            deque(['B', 'C', 'A'])
         """
-        all_projects = self.all_items()
+        projects, dependents = self._dependents()
+
+        # The priority of each project when breaking ties.
+        priority: DictType[str, Any]
+        if tie_break == "insertion":
+            priority = {project: index for index, project in enumerate(projects)}
+        elif tie_break == "lexicographic":
+            priority = {project: project for project in projects}
+        elif tie_break is not None:
+            log.error(f"{tie_break} is not a supported tie break")
+            raise ValueError(f"{tie_break} is not a supported tie break")
 
         # Dictionary storing projects and how many dependencies they have.
         dep_count: DictType[str, int] = {}
+        for item in projects:
+            dep_count[item] = sum(1 for _ in self._children(item))
+            log.debug(f"{item} dependency count set to {dep_count[item]}")
+
+        # Projects with no remaining dependencies, which can be installed next.
+        ready = [item for item in projects if dep_count[item] == 0]
+        pop: Callable[[], str]
+        push: Callable[[str], None]
+        if tie_break is None:
+            queue = deque(ready)
+            pop, push = queue.popleft, queue.append
+        else:
+            heap = [(priority[item], item) for item in ready]
+            heapq.heapify(heap)
 
-        for item in all_projects:
-            try:
-                dep_count[item] = len(self.tree[item])
-                log.debug(f"{item} dependency count set to {len(self.tree[item])}")
-            except KeyError:
-                log.warning(f"{item} dependency count set to 0 - not present in tree")
-                dep_count[item] = 0
+            def heap_pop() -> str:
+                return heapq.heappop(heap)[1]
+
+            def heap_push(item: str) -> None:
+                heapq.heappush(heap, (priority[item], item))
+
+            pop, push = heap_pop, heap_push
 
         final_ordering: DequeType[str] = deque()
-        while dep_count:
+        while len(final_ordering) < len(projects):
             try:
-                # Choose item if it has no dependencies
-                to_remove = next(item[0] for item in dep_count.items() if item[1] == 0)
-                log.debug(f"{to_remove} next item in ordering")
-            except StopIteration:
+                to_remove = pop()
+            except IndexError:
+                remaining = sorted(
+                    item
+                    for component in self.strongly_connected_components()
+                    if self._is_cycle(component)
+                    for item in component
+                )
                 log.error(
-                    "Cycle present - No topological ordering present", exc_info=True
+                    f"Cycle present - No topological ordering present. "
+                    f"Projects in cycles: {', '.join(remaining)}"
                 )
-                raise
+                raise CycleError(
+                    f"Cycle present between {', '.join(remaining)}", remaining
+                ) from None
+            log.debug(f"{to_remove} next item in ordering")
             final_ordering.append(to_remove)
             # Decrement dep count of dependents of to_remove
-            for item in self.depends_on(to_remove):
+            for item in dependents[to_remove]:
                 dep_count[item] -= 1
                 log.debug(f"Decrementing {item} dep count to {dep_count[item]}")
-            log.debug(f"Finished with {to_remove}")
-            del dep_count[to_remove]  # Remove item from count
+                if dep_count[item] == 0:
+                    push(item)
 
         return final_ordering
 
-    # TODO: Why does this detect more cycles than the original method?
-    # TODO: This can hit the recursion limit!!!
+    def strongly_connected_components(
+        self,
+    ) -> GeneratorType[ListType[str], None, None]:
+        """Splits the tree into groups of projects that all depend on each other.
+
+        This uses an iterative version of Tarjan's algorithm, so it runs in linear time
+        without hitting the recursion limit. Components are generated in reverse
+        topological order, such that a component's dependencies come before it.
+
+        Returns:
+            A generator for every strongly connected component in the tree.
+
+        Examples:
+            >>> from depythel.main import LocalTree
+            >>> # A depends on B, which depends on C, which depends on B
+            >>> example = LocalTree({'A': 'B', 'B': 'C', 'C': 'B'})
+            >>> list(example.strongly_connected_components())
+            [['C', 'B'], ['A']]
+        """
+        return _strongly_connected(self.tree, self._children)
+
+    def layout(
+        self, max_depth: Optional[int] = None, collapse_cycles: bool = True
+    ) -> Layout:
+        """Positions every project, so that large trees can be drawn without physics.
+
+        Projects are placed in layers by how far they are from the root.
+
+        Args:
+            max_depth: Collapse each project more than this many dependencies from the
+                root into its ancestor at this depth. Defaults to None, which
+                collapses nothing.
+            collapse_cycles: Whether to show each group of projects that depend on
+                each other (see strongly_connected_components) as a single node.
+                Defaults to True.
+
+        Returns:
+            The position of each project or cluster of projects.
+
+        Examples:
+            >>> from depythel.main import LocalTree
+            >>> example = LocalTree({'A': 'B', 'B': 'C', 'C': 'B'}).layout()
+            >>> [(cluster.label, cluster.depth) for cluster in example.clusters]
+            [('A', 0), ('C (+1 more)', 1)]
+            >>> example.edges
+            [(0, 1)]
+        """
+        components = list(self.strongly_connected_components())
+        if not collapse_cycles:
+            components = [[project] for group in components for project in group]
+        return layered(components, self._children, self._roots(), max_depth)
+
+    def cycles(self) -> GeneratorType[ListType[str], None, None]:
+        """Lazily enumerates every elementary cycle in the tree.
+
+        This uses an iterative version of Johnson's algorithm. There can be
+        exponentially many cycles, so they are only found as they are requested.
+
+        Returns:
+            A generator for each cycle, as a list of projects in which each project
+            depends on the next and the last depends on the first.
+
+        Examples:
+            >>> from depythel.main import LocalTree
+            >>> example = LocalTree({"A": {"B": "lib"}, "B": {"A": "lib", "C": "lib"}, "C": {"B": "lib"}})
+            >>> list(example.cycles())
+            [['C', 'B'], ['A', 'B']]
+        """
+        # A copy of the tree that nodes are removed from once all their cycles are found
+        # Dictionaries are used as ordered sets to keep the output reproducible.
+        graph: DictType[str, DictType[str, None]] = {
+            item: dict.fromkeys(
+                child for child in self._children(item) if child in self.tree
+            )
+            for item in self.tree
+        }
+
+        for item, children in graph.items():
+            if item in children:
+                yield [item]
+                del children[item]
+
+        components = [
+            component
+            for component in _strongly_connected(graph, graph.__getitem__)
+            if len(component) > 1
+        ]
+        while components:
+            component = components.pop()
+            start = component[0]
+            members = set(component)
+            subgraph = {
+                item: [child for child in graph[item] if child in members]
+                for item in component
+            }
+            yield from _circuits(start, subgraph)
+
+            # All the cycles through start have been found, so search without it.
+            members.remove(start)
+            remaining = {
+                item: [child for child in subgraph[item] if child in members]
+                for item in component[1:]
+            }
+            components.extend(
+                smaller
+                for smaller in _strongly_connected(remaining, remaining.__getitem__)
+                if len(smaller) > 1
+            )
+
+    def _is_cycle(self, component: ListType[str]) -> bool:
+        """Whether a strongly connected component contains a cycle."""
+        return len(component) > 1 or component[0] in self._children(component[0])
+
     def cycle_check(self, first: bool = True) -> bool:
-        """Perform a level-order traversal of an adjacency list looking for any cycles.
+        """Checks an adjacency list for any cycles.
+
+        Every cycle is part of a strongly connected component, so this runs in
+        linear time. Use cycles() to list each individual cycle.
 
         Args:
             first: If true, the function halts as soon as the first cycle is found.
@@ -211,88 +622,98 @@ class LocalTree:
             True
         """
         return_value = False
-        start_call = False
-
-        exploring = _retrieve_from_stack("exploring")
-        unfinished = _retrieve_from_stack("unfinished")
-        current_project = _retrieve_from_stack("current_project")
-
-        # TODO: Refactor of this type checking
-        if not isinstance(unfinished, set):
-            # If the variables are undefined, we are starting for the first time.
-            log.debug("Assuming first recursive call of cycle_check")
-            start_call = True
-            unfinished = set()
-            log.debug("Initialised unfinished set")  # TODO: What is the unfinished set?
-
-        current_project = (
-            current_project if isinstance(current_project, str) else self.root
-        )
-        backup_current_project = current_project  # Backup of the current project in case it's modified below.
-        log.debug(f"Current project is {current_project}")
-
-        # If the exploring list isn't defined, add the current_project node
-        # Else, add the current child to the exploring list
-        if isinstance(exploring, deque):
-            # TODO: Maybe check that the deque is specifically a string?
-            # Could take the beartype approach of checking a random/first element
-            exploring.append(current_project)
-        else:
-            log.debug("Initialising exploring stack")
-            exploring = deque([current_project])
-        log.debug(f"Added {current_project} to exploring stack")
-
-        children = (child for child in self.tree[current_project])
-
-        for child in children:
-            if child in exploring:
+        for component in self.strongly_connected_components():
+            if self._is_cycle(component):
                 # TODO: Provide some opinionated way of determining which cycles are worse.
-                # TODO: Highlight dependency that is circular
                 # Since this is the api, maybe don't use arrows
-                log.warning(" → ".join(exploring + deque([child])))
+                log.warning(f"Cycle between {', '.join(component)}")
                 if first:
                     return True
                 return_value = True
-            elif child not in self.tree:
-                # Maybe give some confidence interval based on no./type of cycles
-                # and completeness of graph
-                unfinished.add(child)
-            else:
-                current_project = child
-                if self.cycle_check(first):
-                    if first:
-                        return True
-                    return_value = True
-
-        # For some reason, this remove is necessary. TODO: Find out why
-        # e.g. traversing 2 level first of py-beartype
-        exploring.remove(backup_current_project)
-        log.debug(f"Removing {backup_current_project} from exploring stack.")
-
-        # Only return unfinished children in the first recursive call
-        if start_call and len(unfinished) > 0:
-            # TODO: Printing in an API is generally not great
-            # Maybe return it or add it to warning log?
+
+        # Maybe give some confidence interval based on no./type of cycles
+        # and completeness of graph
+        unfinished = {
+            child
+            for item in self.tree
+            for child in self._children(item)
+            if child not in self.tree
+        }
+        if unfinished:
             # Sorted for reproducibility of tests
-            # See https://github.com/PyCQA/pylint/issues/1788#issuecomment-410381475
-            log.info(
-                f"Unfinished children in tree: {', '.join(sorted(unfinished))}"
-            )  # pylint: disable=logging-fstring-interpolation
+            log.info(f"Unfinished children in tree: {', '.join(sorted(unfinished))}")
         return return_value
 
 
 class Tree(LocalTree):
     """Manages a dependency tree from an online repository."""
 
-    def __init__(self, root: str, repository: str, size: int = 1):
+    def __init__(
+        self,
+        root: str,
+        repository: str,
+        size: int = 1,
+        workers: int = 1,
+        index: Optional["OfflineIndex"] = None,
+        traversal: str = "bfs",
+        max_depth: Optional[int] = None,
+        max_requests: Optional[int] = None,
+        timeout: Optional[float] = None,
+        include: Optional[Iterable[str]] = None,
+        exclude: Iterable[str] = (),
+    ) -> None:
         """Manages a dependency tree from an online repository.
 
+        Once a budget (max_requests or timeout) runs out, the tree stops growing
+        and Tree.exhausted is set, even if there are projects left to fetch. The root
+        is always fetched, however small the budget.
+
         Args:
             root: The project whose dependency tree should be fetched.
             repository: Where to fetch information about a project from.
             size: The number of projects that should be in the tree. Defaults to
                 1 during initialisation.
+            workers: The maximum number of requests to the repository in flight at
+                once. Defaults to 1, which fetches each project one at a time.
+            index: An offline index of the repository to look up projects in, rather
+                than making any requests. Defaults to None, which uses the
+                repository's online API.
+            traversal: The order to fetch projects in. "bfs" fetches them level by
+                level, "dfs" follows each dependency as deep as it goes before moving
+                on to the next, and "depth" fetches them level by level with each
+                level in alphabetical order. Defaults to "bfs".
+            max_depth: How many levels below the root to fetch. The dependencies of
+                projects at the deepest level are listed, but not fetched. Defaults
+                to None, which fetches every level.
+            max_requests: The maximum number of requests to make to the repository
+                (or lookups in the offline index). Defaults to None, for no limit.
+            timeout: How long (in seconds) to keep fetching projects for, counting
+                from when the tree is created. Defaults to None, for no limit.
+            include: The only categories of dependencies to include in the tree, e.g.
+                runtime dependencies. Defaults to None, which includes every category.
+            exclude: Categories of dependencies to leave out of the tree, e.g. build
+                dependencies. Neither these nor the projects only they lead to are
+                fetched. The categories of each repository are listed in its
+                CATEGORIES constant.
+
+        Raises:
+            ValueError: If the traversal isn't supported.
+
+        Examples:
+            >>> from depythel.main import Tree
+            >>> # Fetch up to 8 projects from the front of the queue at once
+            >>> example = Tree("gping", "macports", 50, workers=8)
+            >>> # Only runtime dependencies, at most 2 levels deep, within 5 seconds
+            >>> example = Tree("gping", "macports", 50, max_depth=2, timeout=5,
+            ...                exclude=["build", "fetch", "extract", "patch", "test"])
         """
+        if workers < 1:
+            raise AttributeError("Workers must be greater or equal to 1")
+        if max_depth is not None and max_depth < 0:
+            raise AttributeError("Max depth must be greater or equal to 0")
+        if max_requests is not None and max_requests < 1:
+            raise AttributeError("Max requests must be greater or equal to 1")
+
         self.root = root
         """str: The root of the dependency tree"""
 
@@ -302,16 +723,50 @@ class Tree(LocalTree):
         self.size = size
         """int: The number of projects in the tree. Defaults to 1 during initialisation"""
 
+        self.workers = workers
+        """int: The maximum number of requests to the repository in flight at once."""
+
+        self.index = index
+        """Optional[OfflineIndex]: Where to look up projects offline, if anywhere."""
+
+        self.traversal = traversal
+        """str: The order projects are fetched in."""
+
+        self.max_depth = max_depth
+        """Optional[int]: How many levels below the root to fetch, if limited."""
+
+        self.max_requests = max_requests
+        """Optional[int]: The maximum number of requests to make, if limited."""
+
+        self.timeout = timeout
+        """Optional[float]: How long (in seconds) to keep fetching for, if limited."""
+
+        # Needed by the generator before LocalTree is initialised.
+        self.include = None if include is None else frozenset(include)
+        self.exclude = frozenset(exclude)
+
+        self.requests = 0
+        """int: The number of requests made to the repository so far."""
+
         # For some reason, mypy doesn't like the type alias
         # However, the dictionary always remains a dictionary
         self.tree: AnyTree = {}  # type: ignore[assignment]
         """AnyTree: An adjacency list representing a dependency tree."""
 
+        self.exhausted = False
+        """bool: Whether the tree can't grow, since every project has been fetched or
+        a budget has run out."""
+
+        # Every project fetched so far, in the order they were fetched.
+        # The tree is always a prefix of this, so it can grow again after shrinking.
+        self._generated: AnyTree = {}
+        self._order: ListType[str] = []
+
         self.generator = self._tree_generator()
         """Callable[[], AnyTree]: Generates dependencies for a project from the specified repository."""
         self.set_size(self.size)
 
-        super(Tree, self).__init__(self.tree)
+        super(Tree, self).__init__(self.tree, include, exclude)
 
     def set_size(self, new_size: int) -> None:
         """Set the number of dependencies that should be present in the tree.
@@ -334,28 +789,84 @@ class Tree(LocalTree):
             raise AttributeError("Size must be greater or equal to 1")
 
         # If new items need to be added or the tree hasn't been initiated yet.
-        while len(self.tree) < new_size:
-            # Pass the tree by value, such that del below doesn't affect if.
-            new_tree = self.generator().copy()
-            if new_tree == self.tree:
-                # If there are no more children in the fetched tree from the repo, break.
-                break
-            self.tree = new_tree
-            log.debug(f"Increasing - Tree items: {tuple(self.tree)}")
+        while len(self.tree) < new_size and self._add_next() is not None:
+            pass
         log.debug("Finished increasing tree")
-        # Shrink the tree if required.
-        # After the first while loop, the tree might be bigger than expected.
-        # e.g. if grow followed by shrink then grow, the generator is larger than expected.
+
+        # Shrink the tree if required, removing the most recently added projects.
         while len(self.tree) > new_size:
-            log.debug(f"Removing {tuple(self.tree)[-1]}")
-            del self.tree[tuple(self.tree)[-1]]
+            log.debug(f"Removing {self.tree.popitem()[0]}")
         self.size = new_size
+        self._invalidate()
+
+    def grow(self) -> Optional[str]:
+        """Adds the next project to the tree, so it can be used as soon as it's fetched.
+
+        Returns:
+            The project that was added, or None if the tree can't grow any further.
+
+        Examples:
+            >>> from depythel.main import Tree
+            >>> example = Tree('gping', 'macports')
+            >>> example.grow()
+            'cargo'
+            >>> len(example.tree)
+            2
+        """
+        project = self._add_next()
+        if project is not None:
+            self.size = max(self.size, len(self.tree))
+            self._invalidate()
+        return project
+
+    def __iter__(self) -> Iterator[Tuple[str, Union[str, DictType[str, str]]]]:
+        """Yields each project and its dependencies, fetching more as they're needed.
+
+        Projects already in the tree are yielded first. After that, each project is
+        fetched just before it's yielded, until the tree is exhausted. Stopping early
+        (e.g. with break) stops the tree growing, so it can be used for pipelines
+        that don't know how many projects they need up front.
+
+        Examples:
+            >>> from depythel.main import Tree
+            >>> for project, dependencies in Tree('gping', 'macports'):
+            ...     if "curl" in dependencies:
+            ...         break
+            >>> project
+            'cargo'
+        """
+        index = 0
+        while index < len(self.tree) or self.grow() is not None:
+            project = self._order[index]
+            yield project, self.tree[project]
+            index += 1
+
+    def _add_next(self) -> Optional[str]:
+        """Private method adding the next project to the tree, if there is one."""
+        # Projects that were removed by an earlier shrink don't need fetching again.
+        if len(self._order) == len(self.tree):
+            if self.exhausted:
+                return None
+            self.generator()
+            if len(self._order) == len(self.tree):
+                return None
+        project = self._order[len(self.tree)]
+        log.debug(f"Increasing - Adding {project}")
+        self.tree[project] = self._generated[project]  # type: ignore[assignment]
+        return project
 
     # Use https://www.diffchecker.com/diff for checking doctests
     def _tree_generator(self) -> Callable[[], AnyTree]:
-        """Generate a dependency tree via level-order traversal.
+        """Generate a dependency tree, traversing it in the order set by Tree.traversal.
 
-        Each call of the generator builds the next child in the tree.
+        Each call of the generator builds the next child in the tree. Once there are
+        no children left, the generator sets Tree.exhausted rather than adding one.
+
+        If the repository can look up several projects at once (online_many), the
+        front of the queue is fetched in batches. Otherwise, if more than one worker is
+        available, the next few projects in the queue are fetched concurrently in the
+        background. Projects are still added to the tree in the order they are popped
+        from the queue, so the result is the same as fetching them one at a time.
 
         Returns:
             An adjacency list representing the generated part of a dependency tree.
@@ -371,83 +882,677 @@ class Tree(LocalTree):
         """
         # For some reason, mypy doesn't like the type alias
         # However, the dictionary always remains a dictionary
-        generated_tree: AnyTree = {}  # type: ignore[assignment]
-        stack = deque([self.root])
+        generated_tree = self._generated
+        frontier = _Frontier(self._roots(), self.traversal, self.max_depth)
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
 
-        try:
-            module = importlib.import_module(f"depythel.repository.{self.repo}")
-            log.debug(f"Using functions from depythel.repository.{self.repo}")
-        except ModuleNotFoundError:
-            log.error(f"{self.repo} is not a supported repository", exc_info=True)
-            raise
+        registered = backend(self.repo)
+        module = registered.load()
+        log.debug(f"Using functions from {registered.module}")
 
         # Recommends not to use hasattr: https://hynek.me/articles/hasattr/
         # Instead, set a default attribute as none, and check whether it exists
-        module_attribute = getattr(module, "online", None)
+        lookup: Callable[[str], Any]
+        batch_lookup: Optional[Callable[[ListType[str]], Any]] = None
+        batch_size = 1
+        if self.index is not None:
+            log.debug(f"Using offline index {self.index.path}")
+            lookup = partial(self.index.lookup, self.repo)
+        else:
+            module_attribute = getattr(module, "online", None)
 
-        # This hopefully shouldn't happen, but just in case the online module doesn't exist
-        if module_attribute is None:
-            # TODO: Maybe make this error messaging better
-            log.error(
-                f"{self.repo} does not support retrieving dependencies from online"
-            )
-            raise AttributeError(
-                f"{self.repo} does not support retrieving dependencies from online"
-            )
+            # This hopefully shouldn't happen, but just in case the online module doesn't exist
+            if module_attribute is None:
+                # TODO: Maybe make this error messaging better
+                log.error(
+                    f"{self.repo} does not support retrieving dependencies from online"
+                )
+                raise AttributeError(
+                    f"{self.repo} does not support retrieving dependencies from online"
+                )
+            lookup = module_attribute
+
+            # Some repositories can look up several projects in a single request.
+            if registered.supports("batch"):
+                batch_lookup = getattr(module, "online_many", None)
+                batch_size = getattr(module, "BATCH_SIZE", 1)
+
+        # Projects that have been included in a batch, and the results of the batch.
+        batched: SetType[str] = set()
+        batch_results: DictType[str, Any] = {}
+
+        # Requests that have been sent off ahead of time, keyed by project name.
+        executor: Optional[ThreadPoolExecutor] = None
+        # Shuts the executor down, which also happens if the tree is discarded.
+        stop_executor: Callable[[], Any] = lambda: None
+        pending: DictType[str, "Future[Any]"] = {}
+
+        # The root is always fetched, so that the tree is never empty.
+        def can_request() -> bool:
+            if not generated_tree:
+                return True
+            if self.max_requests is not None and self.requests >= self.max_requests:
+                return False
+            return deadline is None or time.monotonic() < deadline
+
+        def shutdown() -> None:
+            nonlocal executor
+            if executor is not None:
+                stop_executor()
+                executor = None
+
+        def finish(reason: str) -> AnyTree:
+            log.debug(reason)
+            self.exhausted = True
+            shutdown()
+            return generated_tree
 
         def get_next_child() -> AnyTree:
-            nonlocal stack, generated_tree
-            # pop turns this into depth first (via a stack)
-            # popleft turns it info breadth first (via a queue)
-            if not stack:
-                log.debug("No more children left in stack - finished")
-                return generated_tree
-            next_child = stack.popleft()
-            log.info(f"Retrieving dependencies for {next_child} - popped from stack")
+            # The tree might never grow again after an error, so don't leave the
+            # executor's threads behind.
+            try:
+                return add_next_child()
+            except BaseException:
+                shutdown()
+                raise
+
+        def add_next_child() -> AnyTree:
+            nonlocal executor, stop_executor
+            if not frontier:
+                return finish("No more children left in frontier - finished")
+
+            upcoming_child = frontier.peek(1)[0]
+            fetched = upcoming_child in batch_results or upcoming_child in pending
+            if not fetched and not can_request():
+                return finish("Generation budget used up - stopping early")
+
+            if batch_lookup is not None:
+                if upcoming_child not in batched and can_request():
+                    # Look up the front of the queue in as few requests as possible.
+                    batch = frontier.peek(batch_size)
+                    log.debug(f"Retrieving dependencies for {len(batch)} projects")
+                    batched.update(batch)
+                    self.requests += 1
+                    batch_results.update(batch_lookup(batch))
+            elif self.workers > 1:
+                if executor is None:
+                    executor = ThreadPoolExecutor(max_workers=self.workers)
+                    stop_executor = weakref.finalize(self, executor.shutdown, False)
+                # Keep the front of the queue in flight, so that the next few calls
+                # only have to wait for the slowest response rather than all of them.
+                for upcoming in frontier.peek(self.workers):
+                    if upcoming not in pending and can_request():
+                        log.debug(f"Prefetching dependencies for {upcoming}")
+                        self.requests += 1
+                        pending[upcoming] = executor.submit(lookup, upcoming)
+
             # We've checked to make sure that the attribute is defined
-            children = module.online(next_child)
+            # Any errors from a prefetched request are only raised once it's needed.
+            # Projects missing from a batch are fetched individually, so that they
+            # raise the same errors as they would have otherwise.
+            if upcoming_child in batch_results:
+                children = batch_results.pop(upcoming_child)
+            elif upcoming_child in pending:
+                try:
+                    children = pending[upcoming_child].result(
+                        None
+                        if deadline is None or not generated_tree
+                        else max(0.0, deadline - time.monotonic())
+                    )
+                except FutureTimeoutError:
+                    return finish("Ran out of time waiting for a response - stopping")
+                del pending[upcoming_child]
+            else:
+                self.requests += 1
+                children = lookup(upcoming_child)
+
+            next_child = frontier.pop()
+            log.info(f"Retrieved dependencies for {next_child} - popped from frontier")
+            batched.discard(next_child)
+            if self.include is not None or self.exclude:
+                children = {
+                    child: category
+                    for child, category in children.items()
+                    if self._followed(category)
+                }
             log.debug(f"{next_child}'s dependencies: {tuple(children)}")
             generated_tree[next_child] = children
-            stack.extend(
-                (
-                    child
-                    for child in children
-                    if child not in deque(generated_tree) + stack
-                )
-            )
-            log.debug(f"Adding {next_child}'s dependencies to the stack")
+            self._order.append(next_child)
+            frontier.push(next_child, children)
+            log.debug(f"Adding {next_child}'s dependencies to the frontier")
             return generated_tree
 
         return get_next_child
 
 
-def _retrieve_from_stack(variable: str) -> Optional[Any]:
-    """Private function to retrieve a local variable from the recursion stack.
+class Forest(Tree):
+    """Manages the dependency trees of several projects from the same repository."""
+
+    def __init__(
+        self,
+        roots: Iterable[str],
+        repository: str,
+        size: Optional[int] = None,
+        workers: int = 1,
+        index: Optional["OfflineIndex"] = None,
+        traversal: str = "bfs",
+        max_depth: Optional[int] = None,
+        max_requests: Optional[int] = None,
+        timeout: Optional[float] = None,
+        include: Optional[Iterable[str]] = None,
+        exclude: Iterable[str] = (),
+    ) -> None:
+        """Manages the dependency trees of several projects from the same repository.
+
+        The trees are generated together as one graph, so a project that several
+        roots depend on (e.g. openssl) is only fetched once. The work done is
+        proportional to the number of projects across all the trees, rather than the
+        sum of their sizes.
+
+        Args:
+            roots: The projects whose dependency trees should be fetched.
+            repository: Where to fetch information about a project from.
+            size: The number of projects that should be in the combined tree.
+                Defaults to None, which fetches every dependency of every root.
+            workers: The maximum number of requests to the repository in flight at
+                once. Defaults to 1.
+            index: An offline index of the repository to look up projects in. Defaults
+                to None, which uses the repository's online API.
+            traversal: The order to fetch projects in (see Tree). Defaults to "bfs".
+            max_depth: How many levels below the roots to fetch (see Tree).
+            max_requests: The maximum number of requests to make (see Tree).
+            timeout: How long (in seconds) to keep fetching projects for (see Tree).
+            include: The only categories of dependencies to include (see Tree).
+            exclude: Categories of dependencies to leave out (see Tree).
+
+        Examples:
+            >>> from depythel.main import Forest
+            >>> example = Forest(["gping", "bat"], "macports", workers=8)
+            >>> example.subtree("gping").root
+            'gping'
+        """
+        self.roots = list(dict.fromkeys(roots))  # Remove duplicates, keeping the order
+        """ListType[str]: The projects whose dependency trees are fetched."""
+
+        if not self.roots:
+            raise AttributeError("At least one root is required")
+
+        # Tree stops growing once every project has been fetched
+        super(Forest, self).__init__(
+            self.roots[0],
+            repository,
+            sys.maxsize if size is None else size,
+            workers,
+            index,
+            traversal,
+            max_depth,
+            max_requests,
+            timeout,
+            include,
+            exclude,
+        )
+        self.size = len(self.tree) if size is None else size
+
+    def _roots(self) -> ListType[str]:
+        """Private method returning the projects that generation starts from."""
+        return self.roots
+
+    def subtree(self, root: str) -> LocalTree:
+        """The dependency tree of a single project, taken from the combined tree.
+
+        The result is a view of the combined tree, so nothing is copied or fetched
+        again, and projects fetched later appear in it once they are reachable.
+
+        Args:
+            root: The project whose dependency tree should be returned. This doesn't
+                have to be one of the roots, as long as it has been fetched.
+
+        Returns:
+            The dependency tree of the project.
 
-    This means that it doesn't have to be passed as an argument.
-    Based on https://stackoverflow.com/a/58598665
+        Raises:
+            KeyError: If the project hasn't been fetched.
+
+        Examples:
+            >>> from depythel.main import Forest
+            >>> example = Forest(["A", "B"], "macports")
+            >>> # Assuming A depends on C, and B depends on C and D.
+            >>> example.subtree("B").tree
+            {'B': {'C': 'lib', 'D': 'lib'}, 'C': {}, 'D': {}}
+        """
+        if root not in self.tree:
+            log.error(f"{root} is not in the tree")
+            raise KeyError(f"{root} is not in the tree")
+        # For some reason, mypy doesn't like the type alias
+        return LocalTree(
+            _Subtree(self.tree, root, self._children),  # type: ignore[arg-type]
+            self.include,
+            self.exclude,
+        )
+
+
+class AsyncTree(LocalTree):
+    """Manages a dependency tree from an online repository, using asyncio."""
+
+    def __init__(
+        self,
+        root: str,
+        repository: str,
+        concurrency: int = 8,
+        traversal: str = "bfs",
+        semaphore: Optional["asyncio.Semaphore"] = None,
+        include: Optional[Iterable[str]] = None,
+        exclude: Iterable[str] = (),
+    ) -> None:
+        """Manages a dependency tree from an online repository, using asyncio.
+
+        Unlike Tree, nothing is fetched until set_size is awaited, which fetches the
+        next few projects in the queue concurrently without blocking the event loop.
+
+        Args:
+            root: The project whose dependency tree should be fetched.
+            repository: Where to fetch information about a project from.
+            concurrency: The maximum number of requests to the repository in flight
+                at once. Defaults to 8.
+            traversal: The order to fetch projects in (see Tree). Defaults to "bfs".
+            semaphore: Limits the requests in flight across several trees, e.g. when
+                generating many trees at once. Defaults to None, which only limits
+                the requests from this tree.
+            include: The only categories of dependencies to include (see Tree).
+            exclude: Categories of dependencies to leave out (see Tree).
+
+        Raises:
+            ValueError: If the traversal isn't supported.
+
+        Examples:
+            >>> import asyncio
+            >>> from depythel.main import AsyncTree
+            >>> async def main():
+            ...     example = AsyncTree("gping", "macports")
+            ...     await example.set_size(2)
+            ...     return example.tree
+            >>> asyncio.run(main())
+            {'gping': {'cargo': 'build', 'clang-12': 'build'}, \
+    'cargo': {'cargo-bootstrap': 'build', 'cmake': 'build', 'pkgconfig': 'build', \
+    'clang-12': 'build', 'curl': 'lib', 'zlib': 'lib', 'openssl11': 'lib', \
+    'libgit2': 'lib', 'libssh2': 'lib', 'rust': 'lib'}}
+        """
+        if concurrency < 1:
+            raise AttributeError("Concurrency must be greater or equal to 1")
+
+        registered = backend(repository)
+        if not registered.supports("async"):
+            log.error(f"{repository} does not support retrieving dependencies async")
+            raise AttributeError(
+                f"{repository} does not support retrieving dependencies async"
+            )
+        self._online: Callable[[str], Awaitable[Any]] = registered.load().online_async
+
+        self.root = root
+        """str: The root of the dependency tree"""
+
+        self.repo = repository
+        """str: Where information about the repository is being fetched from."""
+
+        self.size = 0
+        """int: The number of projects in the tree. This is 0 until set_size is awaited"""
+
+        self.concurrency = concurrency
+        """int: The maximum number of requests to the repository in flight at once."""
+
+        self.traversal = traversal
+        """str: The order projects are fetched in."""
+
+        self.exhausted = False
+        """bool: Whether every project in the dependency tree has been fetched."""
+
+        self.tree: AnyTree = {}
+        """AnyTree: An adjacency list representing a dependency tree."""
+
+        # Created once there's an event loop, since older Pythons bind it on creation.
+        self._semaphore = semaphore
+        self._frontier = _Frontier([root], traversal)
+        self._generated: AnyTree = {}
+        self._order: ListType[str] = []
+        self._pending: DictType[str, "asyncio.Future[Any]"] = {}
+
+        self.include = None if include is None else frozenset(include)
+        """Optional[FrozenSet[str]]: The only categories of dependencies followed."""
+
+        self.exclude = frozenset(exclude)
+        """FrozenSet[str]: Categories of dependencies that are left out."""
+
+        self._standard_tree = False
+        self._index = None
+
+    async def _lookup(self, name: str) -> Any:
+        """Private method to fetch a project, once the semaphore allows it."""
+        import asyncio  # pylint: disable=import-outside-toplevel
+
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        async with self._semaphore:
+            log.info(f"Retrieving dependencies for {name}")
+            return await self._online(name)
+
+    async def set_size(self, new_size: int) -> None:
+        """Set the number of dependencies that should be present in the tree.
+
+        Args:
+            new_size: How many projects there should be in the dependency tree.
+        """
+        import asyncio  # pylint: disable=import-outside-toplevel
+
+        if new_size < 1:
+            raise AttributeError("Size must be greater or equal to 1")
+
+        # Projects that were removed by an earlier shrink don't need fetching again.
+        while len(self.tree) < min(new_size, len(self._order)):
+            project = self._order[len(self.tree)]
+            self.tree[project] = self._generated[project]  # type: ignore[assignment]
+
+        try:
+            while len(self.tree) < new_size and self._frontier:
+                # Keep the front of the queue in flight, but don't fetch more
+                # projects than are needed to reach the new size.
+                wanted = min(new_size - len(self.tree), self.concurrency)
+                for upcoming in self._frontier.peek(wanted):
+                    if upcoming not in self._pending:
+                        self._pending[upcoming] = asyncio.ensure_future(
+                            self._lookup(upcoming)
+                        )
+                # Only popped once it has been fetched, so that it's retried if the
+                # lookup fails.
+                project = self._frontier.peek(1)[0]
+                children = await self._pending[project]
+                del self._pending[project]
+                self._frontier.pop()
+                if self.include is not None or self.exclude:
+                    children = {
+                        child: category
+                        for child, category in children.items()
+                        if self._followed(category)
+                    }
+                log.debug(f"{project}'s dependencies: {tuple(children)}")
+                self._generated[project] = children
+                self._order.append(project)
+                self.tree[project] = children
+                self._frontier.push(project, children)
+        except BaseException:
+            # e.g. the project doesn't exist or the task was cancelled
+            for task in self._pending.values():
+                task.cancel()
+            self._pending.clear()
+            raise
+        self.exhausted = not self._frontier
+
+        # Shrink the tree if required, removing the most recently added projects.
+        while len(self.tree) > new_size:
+            log.debug(f"Removing {self.tree.popitem()[0]}")
+        self.size = new_size
+        self._invalidate()
+
+
+def _reachable(
+    project: str, neighbours: Callable[[str], Iterable[str]]
+) -> SetType[str]:
+    """Private function to find everything reachable from a project.
+
+    Args:
+        project: Where to start the search from.
+        neighbours: Returns the items adjacent to an item.
+
+    Returns:
+        Every item that can be reached from the project in one or more steps.
+    """
+    found: SetType[str] = set()
+    queue = deque(neighbours(project))
+    while queue:
+        item = queue.popleft()
+        if item not in found:
+            found.add(item)
+            queue.extend(neighbours(item))
+    return found
+
+
+def _strongly_connected(
+    projects: Iterable[str], children: Callable[[str], Iterable[str]]
+) -> GeneratorType[ListType[str], None, None]:
+    """Private function implementing an iterative version of Tarjan's algorithm.
+
+    Args:
+        projects: Every project in the graph.
+        children: Returns the dependencies of a project.
+
+    Returns:
+        A generator for every strongly connected component, in reverse topological
+        order.
+    """
+    index: DictType[str, int] = {}
+    lowlink: DictType[str, int] = {}
+    stack: ListType[str] = []
+    on_stack: SetType[str] = set()
+
+    for start in projects:
+        if start in index:
+            continue
+        index[start] = lowlink[start] = len(index)
+        stack.append(start)
+        on_stack.add(start)
+        # Each item is a project and the children that are still to be explored.
+        # This replaces the call stack of the usual recursive implementation.
+        work: ListType[Tuple[str, Iterator[str]]] = [(start, iter(children(start)))]
+
+        while work:
+            project, remaining = work[-1]
+            for child in remaining:
+                if child not in index:
+                    index[child] = lowlink[child] = len(index)
+                    stack.append(child)
+                    on_stack.add(child)
+                    work.append((child, iter(children(child))))
+                    break
+                if child in on_stack:
+                    lowlink[project] = min(lowlink[project], index[child])
+            else:
+                # All children explored, so return to the parent.
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[project])
+                if lowlink[project] == index[project]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.remove(member)
+                        component.append(member)
+                        if member == project:
+                            break
+                    yield component
+
+
+def _circuits(
+    start: str, graph: DictType[str, ListType[str]]
+) -> GeneratorType[ListType[str], None, None]:
+    """Private function to find every cycle through start in a strongly connected graph.
+
+    This is the circuit finding part of Johnson's algorithm, without recursion.
 
     Args:
-        variable: The variable whose value should be achieved.
+        start: The project that every cycle should pass through.
+        graph: An adjacency list of a strongly connected component.
 
     Returns:
-        The value of the variable.
-
-    Examples:
-        >>> from depythel.main import _retrieve_from_stack
-        >>> a = 2
-        >>> def demo():
-        ...     a = 1
-        ...     return _retrieve_from_stack('a')
-        >>> demo()
-        1
-        >>> _retrieve_from_stack('a')
-        2
+        A generator for each cycle through start.
     """
-    frame = inspect.currentframe()
-    while frame:
-        if variable in frame.f_locals:
-            return frame.f_locals[variable]
-        frame = frame.f_back
+    path = [start]
+    blocked = {start}
+    # Projects to unblock once the key is unblocked.
+    blocked_by: DictType[str, SetType[str]] = {item: set() for item in graph}
+    # Projects on the current path that lead to a cycle.
+    closed: SetType[str] = set()
+    work = [(start, list(graph[start]))]
+
+    while work:
+        project, remaining = work[-1]
+        if remaining:
+            child = remaining.pop()
+            if child == start:
+                yield path[:]
+                closed.update(path)
+            elif child not in blocked:
+                path.append(child)
+                work.append((child, list(graph[child])))
+                closed.discard(child)
+                blocked.add(child)
+                continue
+        if not remaining:
+            if project in closed:
+                to_unblock = {project}
+                while to_unblock:
+                    item = to_unblock.pop()
+                    if item in blocked:
+                        blocked.remove(item)
+                        to_unblock.update(blocked_by[item])
+                        blocked_by[item].clear()
+            else:
+                for child in graph[project]:
+                    blocked_by[child].add(project)
+            work.pop()
+            path.pop()
+
+
+class _Frontier:
+    """Private class for the projects that are still to be fetched, in order.
+
+    Every project that has ever been queued is remembered, so checking whether a
+    child needs queueing takes constant time.
+    """
+
+    def __init__(
+        self, roots: Iterable[str], traversal: str, max_depth: Optional[int] = None
+    ) -> None:
+        """Private class for the projects that are still to be fetched, in order.
 
-    return None
+        Args:
+            roots: The first projects to fetch.
+            traversal: The order to fetch projects in (see Tree).
+            max_depth: How many levels below the roots to queue, if limited.
+        """
+        if traversal not in TRAVERSALS:
+            log.error(f"{traversal} is not a supported traversal")
+            raise ValueError(f"{traversal} is not a supported traversal")
+        self.traversal = traversal
+        self.max_depth = max_depth
+        roots = list(dict.fromkeys(roots))  # Remove duplicates, keeping the order
+        self.seen = set(roots)
+        self._depth = dict.fromkeys(roots, 0)
+        # Reversed for depth first, so that the first root is fetched first
+        self._queue = deque(reversed(roots) if traversal == "dfs" else roots)
+        # Used instead of the queue when prioritising by depth
+        self._heap = [(0, root) for root in roots]
+        heapq.heapify(self._heap)
+
+    def __len__(self) -> int:
+        """The number of projects still to be fetched."""
+        return len(self._heap if self.traversal == "depth" else self._queue)
+
+    def push(self, parent: str, children: Iterable[str]) -> None:
+        """Queues the children of a project that haven't been seen before."""
+        depth = self._depth[parent] + 1
+        if self.max_depth is not None and depth > self.max_depth:
+            return
+        new = [child for child in children if child not in self.seen]
+        self.seen.update(new)
+        self._depth.update(dict.fromkeys(new, depth))
+        if self.traversal == "bfs":
+            self._queue.extend(new)
+        elif self.traversal == "dfs":
+            # Reversed, so that the first child is fetched first
+            self._queue.extend(reversed(new))
+        else:
+            for child in new:
+                heapq.heappush(self._heap, (depth, child))
+
+    def pop(self) -> str:
+        """Removes the next project to be fetched."""
+        if self.traversal == "bfs":
+            return self._queue.popleft()
+        if self.traversal == "dfs":
+            return self._queue.pop()
+        return heapq.heappop(self._heap)[1]
+
+    def peek(self, count: int) -> ListType[str]:
+        """The next few projects to be fetched, without removing them."""
+        if self.traversal == "bfs":
+            return list(islice(self._queue, count))
+        if self.traversal == "dfs":
+            return list(islice(reversed(self._queue), count))
+        if count == 1:
+            # Avoid searching the whole heap for the common case
+            return [project for _, project in self._heap[:1]]
+        return [project for _, project in heapq.nsmallest(count, self._heap)]
+
+
+class _Subtree(MappingType[str, Union[str, DictType[str, str]]]):
+    """Private class for the part of a tree that a project depends on.
+
+    This is a view, so nothing is copied. The projects the root depends on are
+    found when the view is first used, and found again only if the size of the
+    underlying tree changes.
+    """
+
+    def __init__(
+        self,
+        tree: Union[AnyTree, CompactTree],
+        root: str,
+        children: Callable[[str], Iterable[str]],
+    ) -> None:
+        """Private class for the part of a tree that a project depends on.
+
+        Args:
+            tree: The tree to take the projects from.
+            root: The project whose dependencies are shown.
+            children: Returns the children of a project in the tree.
+        """
+        self._tree = tree
+        self._root = root
+        self._children = children
+        self._projects: DictType[str, None] = {}
+        self._size = -1
+
+    def _reachable(self) -> DictType[str, None]:
+        """The projects in the view, with the root first."""
+        if self._size != len(self._tree):
+            # Unfetched projects are left as children, in the same way as Tree.
+            projects = {self._root: None}
+            queue = deque([self._root])
+            while queue:
+                for child in self._children(queue.popleft()):
+                    if child in self._tree and child not in projects:
+                        projects[child] = None
+                        queue.append(child)
+            self._projects, self._size = projects, len(self._tree)
+        return self._projects
+
+    def __getitem__(self, project: str) -> Union[str, DictType[str, str]]:
+        """The dependencies of a project in the view."""
+        if project not in self._reachable():
+            raise KeyError(project)
+        return self._tree[project]
+
+    def __contains__(self, project: object) -> bool:
+        """Whether a project is in the view."""
+        return project in self._reachable()
+
+    def __iter__(self) -> Iterator[str]:
+        """Iterates over the projects in the view, starting with the root."""
+        return iter(self._reachable())
+
+    def __len__(self) -> int:
+        """The number of projects in the view."""
+        return len(self._reachable())
+
+    def __repr__(self) -> str:
+        """Shows the view as a dictionary."""
+        return repr(dict(self))
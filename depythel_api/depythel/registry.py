@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2021-2022, Haren Samarasinghe
+#
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+#     * Redistributions of source code must retain the above copyright notice,
+#       this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright notice,
+#       this list of conditions and the following disclaimer in the documentation
+#       and/or other materials provided with the distribution.
+#     * Neither the name of seaport nor the names of its contributors
+#       may be used to endorse or promote products derived from this software
+#       without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Finds the repositories that depythel can fetch dependencies from.
+
+Repositories are provided by backend modules. The built-in backends are in
+depythel.repository, and other packages can register their own under the
+``depythel.repositories`` entry point group, e.g. in a pyproject.toml::
+
+    [project.entry-points."depythel.repositories"]
+    nixpkgs = "depythel_nix.backend"
+
+A backend module provides some of these functions, which determine its capabilities:
+
+- ``online(name)``: Fetches the dependencies of a project (online).
+- ``online_many(names)``: Fetches several projects in one request (batch).
+- ``online_async(name)``: Fetches a project with asyncio (async).
+- ``parse_index(file)``: Reads a full copy of the repository (index).
+
+Finding backends means importing each of them and scanning installed packages for
+entry points, so the results are stored in a manifest in the cache directory. The
+manifest is rebuilt when depythel or the installed packages change, or when any file
+a backend was found from is edited.
+"""
+
+import importlib
+import json
+import logging
+import os
+import pkgutil
+import sys
+import threading
+from types import ModuleType
+from typing import Any, NamedTuple, Optional, Tuple
+
+from depythel import __version__
+from depythel._directories import cache_directory
+from depythel._utility_imports import DictType, ListType
+
+log = logging.getLogger(__name__)
+
+ENTRY_POINT_GROUP = "depythel.repositories"
+"""str: The entry point group that other packages register backends under."""
+
+CAPABILITIES = {
+    "online": "online",
+    "batch": "online_many",
+    "async": "online_async",
+    "index": "parse_index",
+}
+"""DictType[str, str]: Each capability, and the function a backend needs for it."""
+
+_MANIFEST_VERSION = 2
+
+# Where the built-in backends are, found without importing depythel.repository
+_BUILT_IN = os.path.join(os.path.dirname(__file__), "repository")
+
+
+class Backend(NamedTuple):
+    """A module that fetches dependencies from a repository."""
+
+    name: str
+    """str: The name of the repository, e.g. homebrew."""
+
+    module: str
+    """str: The import path of the backend module."""
+
+    capabilities: Tuple[str, ...]
+    """Tuple[str, ...]: What the backend can do, out of CAPABILITIES."""
+
+    categories: Tuple[str, ...]
+    """Tuple[str, ...]: The categories that dependencies are grouped into."""
+
+    def supports(self, capability: str) -> bool:
+        """Whether the backend has a capability, e.g. batch.
+
+        Examples:
+            >>> from depythel.registry import backend
+            >>> backend("aur").supports("batch")
+            True
+        """
+        return capability in self.capabilities
+
+    def load(self) -> ModuleType:
+        """Imports the backend module."""
+        return importlib.import_module(self.module)
+
+
+_backends: Optional[DictType[str, Backend]] = None
+_backends_lock = threading.Lock()
+
+
+def backends(refresh: bool = False) -> DictType[str, Backend]:
+    """Every available backend, keyed by the name of its repository.
+
+    Args:
+        refresh: Find the backends again, rather than using the manifest. Defaults
+            to False.
+
+    Returns:
+        The available backends.
+
+    Examples:
+        >>> from depythel.registry import backends
+        >>> sorted(backends())
+        ['aur', 'homebrew', 'macports']
+    """
+    global _backends  # pylint: disable=global-statement
+    with _backends_lock:
+        if _backends is None or refresh:
+            path = manifest_path()
+            fingerprint = _fingerprint()
+            found = (
+                None if refresh or path is None else _read_manifest(path, fingerprint)
+            )
+            if found is None:
+                found, sources = _discover()
+                if path is not None:
+                    _write_manifest(path, fingerprint, found, sources)
+            _backends = found
+        return _backends
+
+
+def backend(name: str) -> Backend:
+    """The backend of a repository.
+
+    Args:
+        name: The name of the repository, e.g. homebrew.
+
+    Returns:
+        The repository's backend.
+
+    Raises:
+        ModuleNotFoundError: If there isn't a backend for the repository.
+    """
+    found = backends().get(name)
+    if found is None:
+        log.error(f"{name} is not a supported repository")
+        raise ModuleNotFoundError(f"{name} is not a supported repository")
+    return found
+
+
+def manifest_path() -> Optional[str]:
+    """Where the manifest of backends is stored.
+
+    Returns:
+        The path to the manifest in the cache directory, or None if DEPYTHEL_NO_CACHE
+        is set.
+    """
+    if os.environ.get("DEPYTHEL_NO_CACHE"):
+        return None
+    return os.path.join(cache_directory(), "backends.json")
+
+
+def _discover() -> Tuple[DictType[str, Backend], ListType[str]]:
+    """Imports every built-in and registered backend to find its capabilities.
+
+    Returns:
+        The backends, along with the files they were found from. The manifest is out
+        of date once any of these files change.
+    """
+    modules = {
+        name: f"depythel.repository.{name}"
+        for _, name, _ in pkgutil.iter_modules([_BUILT_IN])
+    }
+    sources: ListType[str] = []
+    for entry_point in _entry_points():
+        if entry_point.name in modules:
+            log.warning(
+                f"Ignoring {entry_point.value}, since {entry_point.name} is built in"
+            )
+            continue
+        modules[entry_point.name] = entry_point.value.split(":")[0]
+        # Only available from Python 3.10. Before then, installing or removing a
+        # package still changes the modification time of its sys.path entry.
+        distribution: Any = getattr(entry_point, "dist", None)
+        if distribution is not None:
+            sources.extend(
+                str(distribution.locate_file(file))
+                for file in distribution.files or ()
+                if file.name == "entry_points.txt"
+            )
+
+    found = {}
+    for name, path in sorted(modules.items()):
+        try:
+            module = importlib.import_module(path)
+        except ImportError:
+            log.warning(
+                f"Unable to import the {name} backend from {path}", exc_info=True
+            )
+            continue
+        capabilities = tuple(
+            capability
+            for capability, function in CAPABILITIES.items()
+            if callable(getattr(module, function, None))
+        )
+        categories = tuple(getattr(module, "CATEGORIES", ()))
+        found[name] = Backend(name, path, capabilities, categories)
+        source = getattr(module, "__file__", None)
+        if source is not None:
+            sources.append(source)
+    log.debug(f"Found backends: {', '.join(found)}")
+    return found, sources
+
+
+def _entry_points() -> ListType[Any]:
+    """The backends registered by other packages."""
+    if sys.version_info < (3, 8):  # pragma: no cover
+        # importlib.metadata isn't available, so only the built-in backends are used
+        return []
+    from importlib import metadata  # pylint: disable=import-outside-toplevel
+
+    if sys.version_info >= (3, 10):  # pragma: no cover
+        return list(metadata.entry_points(group=ENTRY_POINT_GROUP))
+    return list(metadata.entry_points().get(ENTRY_POINT_GROUP, []))  # pragma: no cover
+
+
+def _fingerprint() -> ListType[Any]:
+    """Changes when depythel, the installed packages or the built-in backends change."""
+    # Relative entries (like "" for the working directory) are skipped, since they
+    # change whenever a file is added to the directory depythel is run from.
+    paths = [entry for entry in sys.path if os.path.isabs(entry)]
+    modified: ListType[Optional[float]] = []
+    for entry in paths:
+        try:
+            modified.append(os.stat(entry).st_mtime)
+        except OSError:
+            modified.append(None)
+    try:
+        built_in = sorted(
+            [entry.name, *_stat(entry.path)]
+            for entry in os.scandir(_BUILT_IN)
+            if entry.name.endswith(".py")
+        )
+    except OSError:
+        built_in = []
+    return [_MANIFEST_VERSION, __version__, paths, modified, built_in]
+
+
+def _stat(path: str) -> ListType[Optional[int]]:
+    """The modification time and size of a file, which change when it's edited."""
+    try:
+        status = os.stat(path)
+    except OSError:
+        return [None, None]
+    return [status.st_mtime_ns, status.st_size]
+
+
+def _read_manifest(
+    path: str, fingerprint: ListType[Any]
+) -> Optional[DictType[str, Backend]]:
+    """Reads the manifest, if it exists and is up to date."""
+    try:
+        with open(path, encoding="utf-8") as manifest_file:
+            manifest = json.load(manifest_file)
+        if manifest["fingerprint"] != fingerprint or any(
+            _stat(source) != status for source, status in manifest["sources"].items()
+        ):
+            log.debug("The manifest of backends is out of date")
+            return None
+        return {
+            entry["name"]: Backend(
+                entry["name"],
+                entry["module"],
+                tuple(entry["capabilities"]),
+                tuple(entry["categories"]),
+            )
+            for entry in manifest["backends"]
+        }
+    except (OSError, ValueError, KeyError, TypeError):
+        log.debug(f"Unable to read the manifest of backends at {path}")
+        return None
+
+
+def _write_manifest(
+    path: str,
+    fingerprint: ListType[Any],
+    found: DictType[str, Backend],
+    sources: ListType[str],
+) -> None:
+    """Stores the backends that were found, so they don't need to be found again."""
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temporary file first, so other processes never see half of it
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, "w", encoding="utf-8") as manifest_file:
+            json.dump(
+                {
+                    "fingerprint": fingerprint,
+                    "sources": {source: _stat(source) for source in sources},
+                    "backends": [entry._asdict() for entry in found.values()],
+                },
+                manifest_file,
+            )
+        os.replace(temporary, path)
+    except OSError:
+        log.warning(
+            f"Unable to store the manifest of backends at {path}", exc_info=True
+        )
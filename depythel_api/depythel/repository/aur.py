@@ -31,14 +31,30 @@
 """Retrieves dependencies from the AUR, the Arch Linux User Repository."""
 
 import json
+from email.message import Message
+from typing import Any, Iterable
 from urllib.error import HTTPError
-from urllib.request import urlopen
+from urllib.parse import quote
 
-from depythel._utility_imports import CacheType, DictType
+from depythel._http import cache_get, cache_set, fetch_json, fetch_json_async, get_json
+from depythel._utility_imports import CacheType, DictType, GeneratorType, ListType
+from depythel.cache import default_cache
 
 # TODO: sort out errors where packages don't exist
 # e.g. expat should be expat-git
 
+RPC_URL = "https://aur.archlinux.org/rpc/?v=5&type=info"
+"""str: The AUR RPC endpoint, to which an arg[] parameter is added per package."""
+
+MAX_URL_LENGTH = 4443
+"""int: The AUR rejects requests with a URI longer than this."""
+
+BATCH_SIZE = 100
+"""int: How many packages the tree generator asks online_many for at once."""
+
+CATEGORIES = ("Depends", "MakeDepends", "OptDepends", "CheckDepends")
+"""Tuple[str, ...]: The categories that dependencies are grouped into."""
+
 
 # pylint doesn't like the dicttype return type.
 # TODO: might be nice to have the dictionary quotations be double quotes
@@ -72,20 +88,111 @@ def online(
         >>> online("anaconda")
         {}
     """
-    url = f"https://aur.archlinux.org/rpc/?v=5&type=info&arg[]={name}"
-    with urlopen(url) as api_response:
-        json_response = json.load(api_response)
+    url = f"{RPC_URL}&arg[]={quote(name)}"
+    return _found(url, fetch_json("aur", name, url))
+
+
+async def online_async(
+    name: str,
+) -> DictType[str, str]:  # pylint: disable=unsubscriptable-object
+    """Retrieves dependencies for NAME from the AUR RPC interface, without blocking.
+
+    This is the same as online(), but for use from an asyncio event loop.
+
+    Args:
+       name: The name of the project to retrieve the dependencies for.
+
+    Returns: A dictionary of build/run/etc. dependencies.
+
+    Examples:
+        >>> import asyncio
+        >>> from depythel.repository.aur import online_async
+        >>> asyncio.run(online_async("rget"))
+        {'rustup': 'MakeDepends'}
+    """
+    url = f"{RPC_URL}&arg[]={quote(name)}"
+    return _found(url, await fetch_json_async("aur", name, url))
+
 
+def online_many(
+    names: Iterable[str],
+) -> DictType[str, DictType[str, str]]:  # pylint: disable=unsubscriptable-object
+    """Retrieves dependencies for several projects using as few requests as possible.
+
+    The AUR RPC interface accepts multiple arg[] parameters, so the names are split
+    into chunks that each fit into a single request. The response for each package is
+    stored in the persistent cache, such that online() can reuse it.
+
+    Args:
+       names: The names of the projects to retrieve the dependencies for.
+
+    Returns: A dictionary mapping each project to its dependencies. Projects that
+        don't exist in the AUR are left out.
+
+    Examples:
+        >>> from depythel.repository.aur import online_many
+        >>> online_many(["rget", "gmp-hg"])
+        {'rget': {'rustup': 'MakeDepends'}, \
+'gmp-hg': {'gcc-libs': 'Depends', 'sh': 'Depends', 'mercurial': 'MakeDepends'}}
+    """
+    cache = default_cache()
+    unique = list(dict.fromkeys(names))  # Remove duplicates, keeping the order
+    results: DictType[str, DictType[str, str]] = {}
+    missing: ListType[str] = []
+
+    for name in unique:
+        entry = cache_get(cache, "aur", name)
+        if entry is not None and entry.fresh:
+            json_response = json.loads(entry.body)
+            if json_response["resultcount"] > 0:
+                results[name] = _dependencies(json_response["results"][0])
+        else:
+            missing.append(name)
+
+    for chunk in _chunks(missing):
+        json_response = get_json(
+            RPC_URL + "".join(f"&arg[]={quote(name)}" for name in chunk)
+        )
+        for package in json_response["results"]:
+            results[package["Name"]] = _dependencies(package)
+            # Stored in the same form as the response for a single package
+            cache_set(
+                cache,
+                "aur",
+                package["Name"],
+                json.dumps(
+                    {"resultcount": 1, "type": "multiinfo", "results": [package]}
+                ).encode(),
+            )
+
+    return {name: results[name] for name in unique if name in results}
+
+
+def _found(url: str, json_response: Any) -> DictType[str, str]:
+    """Retrieves the dependencies from a response for a single package."""
     if json_response["resultcount"] == 0:
-        raise HTTPError(url, 404, "Not Found", api_response.info(), None)
+        raise HTTPError(url, 404, "Not Found", Message(), None)
+
+    return _dependencies(json_response["results"][0])
 
+
+def _chunks(names: ListType[str]) -> GeneratorType[ListType[str], None, None]:
+    """Splits names into groups that each fit into a single request URL."""
+    chunk: ListType[str] = []
+    length = len(RPC_URL)
+    for name in names:
+        parameter = len(f"&arg[]={quote(name)}")
+        if chunk and length + parameter > MAX_URL_LENGTH:
+            yield chunk
+            chunk, length = [], len(RPC_URL)
+        chunk.append(name)
+        length += parameter
+    if chunk:
+        yield chunk
+
+
+def _dependencies(package: Any) -> DictType[str, str]:
+    """Groups the dependencies of a package from the RPC interface by category."""
     return {
-        dep: category
-        for category in (
-            "Depends",
-            "MakeDepends",
-            "OptDepends",
-            "CheckDepends",
-        )
-        for dep in json_response["results"][0].get(category, [])
+        dep: category for category in CATEGORIES for dep in package.get(category, [])
     }
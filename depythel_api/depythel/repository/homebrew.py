@@ -30,10 +30,19 @@
 
 """Retrieves dependencies from Homebrew, a macOS package manager."""
 
-import json
-from urllib.request import urlopen
+from typing import IO, Any, Tuple
 
-from depythel._utility_imports import CacheType, DictType
+from depythel._http import fetch_json, fetch_json_async
+from depythel._streaming import iter_array
+from depythel._utility_imports import CacheType, DictType, GeneratorType
+
+CATEGORIES = (
+    "dependencies",
+    "recommended_dependencies",
+    "optional_dependencies",
+    "build_dependencies",
+)
+"""Tuple[str, ...]: The categories that dependencies are grouped into."""
 
 
 # pylint doesn't like the dicttype return type.
@@ -68,16 +77,63 @@ def online(
         >>> online("pkg-config")
         {}
     """
-    with urlopen(f"https://formulae.brew.sh/api/formula/{name}.json") as api_response:
-        json_response = json.load(api_response)
-
-    return {
-        dep: category
-        for category in (
-            "dependencies",
-            "recommended_dependencies",
-            "optional_dependencies",
-            "build_dependencies",
-        )
-        for dep in json_response[category]
-    }
+    json_response = fetch_json(
+        "homebrew", name, f"https://formulae.brew.sh/api/formula/{name}.json"
+    )
+
+    return _dependencies(json_response)
+
+
+async def online_async(
+    name: str,
+) -> DictType[str, str]:  # pylint: disable=unsubscriptable-object
+    """Retrieves dependencies for NAME from the Homebrew API, without blocking.
+
+    This is the same as online(), but for use from an asyncio event loop.
+
+    Args:
+       name: The name of the formula to retrieve the dependencies for.
+
+    Returns: A dictionary of build/run/etc. dependencies.
+
+    Examples:
+        >>> import asyncio
+        >>> from depythel.repository.homebrew import online_async
+        >>> asyncio.run(online_async("gping"))
+        {'rust': 'build_dependencies'}
+    """
+    json_response = await fetch_json_async(
+        "homebrew", name, f"https://formulae.brew.sh/api/formula/{name}.json"
+    )
+
+    return _dependencies(json_response)
+
+
+def parse_index(
+    index_file: IO[bytes],
+) -> GeneratorType[Tuple[str, DictType[str, str]], None, None]:
+    """Reads the dependencies of every formula from Homebrew's full index.
+
+    The index can be downloaded from https://formulae.brew.sh/api/formula.json,
+    and contains a list of formulae in the same form as online() retrieves them.
+    Since it's tens of megabytes, formulae are parsed one at a time as it's read.
+
+    Args:
+        index_file: The index file, opened in binary mode.
+
+    Returns:
+        A generator for each formula's name and a dictionary of its dependencies.
+
+    Examples:
+        >>> from depythel.repository.homebrew import parse_index
+        >>> with open("formula.json", "rb") as index_file:
+        ...     dict(parse_index(index_file))["gping"]
+        {'rust': 'build_dependencies'}
+    """
+    for formula in iter_array(index_file):
+        yield formula["name"], _dependencies(formula)
+
+
+def _dependencies(formula: Any) -> DictType[str, str]:
+    """Groups the dependencies of a formula from the Homebrew API by category."""
+    return {dep: category for category in CATEGORIES for dep in formula[category]}
@@ -33,10 +33,13 @@
 # TODO: How to speed up fetch request?
 # DOCS: Argument names were chosen to be consistent across different repos
 
-import json
-from urllib.request import urlopen
+from typing import IO, Any, Tuple
 
-from depythel._utility_imports import CacheType, DictType
+from depythel._http import fetch_json, fetch_json_async
+from depythel._utility_imports import CacheType, DictType, GeneratorType, ListType
+
+CATEGORIES = ("fetch", "extract", "patch", "build", "lib", "run", "test")
+"""Tuple[str, ...]: The categories that dependencies are grouped into."""
 
 
 # pylint doesn't like the dicttype return type.
@@ -74,17 +77,120 @@ def online(
     # response = requests.get(f"https://ports.macports.org/api/v1/ports/{portname}/")
 
     # TODO: Maybe deal with HTTPError more nicely
-    with urlopen(f"https://ports.macports.org/api/v1/ports/{name}/") as api_response:
-        # Convert the HTTP request into standard JSON
-        json_response = json.load(api_response)
+    json_response = fetch_json(
+        "macports", name, f"https://ports.macports.org/api/v1/ports/{name}/"
+    )
+
+    return _dependencies(json_response)
+
+
+async def online_async(
+    name: str,
+) -> DictType[str, str]:  # pylint: disable=unsubscriptable-object
+    """Retrieve the dependencies of NAME from the MacPorts API, without blocking.
 
+    This is the same as online(), but for use from an asyncio event loop.
+
+    Args:
+       name: The name of the port to retrieve the dependencies for.
+
+    Returns: A dictionary of build/run/etc. dependencies.
+
+    Examples:
+        >>> import asyncio
+        >>> from depythel.repository.macports import online_async
+        >>> asyncio.run(online_async('gping'))
+        {'cargo': 'build', 'clang-12': 'build'}
+    """
+    json_response = await fetch_json_async(
+        "macports", name, f"https://ports.macports.org/api/v1/ports/{name}/"
+    )
+    return _dependencies(json_response)
+
+
+def _dependencies(port: Any) -> DictType[str, str]:
+    """Groups the dependencies of a port from the MacPorts API by category."""
     # return {item["type"]: item["ports"] for item in response.json()["dependencies"]}
     # "is not None" check since in rare occasions the result is null
     # e.g. https://ports.macports.org/port/libgcc11/details/ for runtime dep
     # TODO: What happens if a project has no dependencies?
     return {
         dep: item["type"]
-        for item in json_response["dependencies"]
+        for item in port["dependencies"]
         for dep in item["ports"]
         if dep is not None
     }
+
+
+def parse_index(
+    index_file: IO[bytes],
+) -> GeneratorType[Tuple[str, DictType[str, str]], None, None]:
+    """Reads the dependencies of every port from a MacPorts PortIndex.
+
+    A PortIndex can be found in a ports tree (e.g. rsync://rsync.macports.org/macports/
+    release/tarballs/PortIndex_darwin_21_arm64/PortIndex). Each port takes up two
+    lines, the first with its name and the second with a Tcl list of its information.
+
+    Args:
+        index_file: The PortIndex, opened in binary mode.
+
+    Returns:
+        A generator for each port's name and a dictionary of its dependencies.
+
+    Examples:
+        >>> from depythel.repository.macports import parse_index
+        >>> with open("PortIndex", "rb") as index_file:
+        ...     dict(parse_index(index_file))["gping"]
+        {'cargo': 'build', 'clang-12': 'build'}
+    """
+    for header in index_file:
+        if not header.strip():
+            continue
+        # The header also contains the length of the next line, which isn't needed.
+        name = header.split()[0].decode()
+        fields = _tcl_list(index_file.readline().decode(errors="replace"))
+        info = dict(zip(fields[::2], fields[1::2]))
+        yield name, {
+            # e.g. port:cargo, bin:git:git and path:lib/libssl.dylib:openssl3
+            dependency.rsplit(":", 1)[-1]: dependency_type
+            for dependency_type in CATEGORIES
+            for dependency in _tcl_list(info.get(f"depends_{dependency_type}", ""))
+        }
+
+
+def _tcl_list(text: str) -> ListType[str]:
+    """Splits a Tcl list into its elements, removing any braces or quotes around them."""
+    elements: ListType[str] = []
+    position, length = 0, len(text)
+    while position < length:
+        if text[position].isspace():
+            position += 1
+            continue
+        if text[position] == "{":
+            # Braces can be nested, and their contents are taken literally.
+            depth, start = 1, position + 1
+            position += 1
+            while position < length and depth:
+                if text[position] == "\\":
+                    position += 1
+                elif text[position] == "{":
+                    depth += 1
+                elif text[position] == "}":
+                    depth -= 1
+                position += 1
+            elements.append(text[start : position - 1])
+            continue
+        element = []
+        quoted = text[position] == '"'
+        if quoted:
+            position += 1
+        while position < length and (
+            text[position] != '"' if quoted else not text[position].isspace()
+        ):
+            if text[position] == "\\" and position + 1 < length:
+                position += 1
+            element.append(text[position])
+            position += 1
+        position += 1  # Skip the closing quote or whitespace
+        elements.append("".join(element))
+    return elements
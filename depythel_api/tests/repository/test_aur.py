@@ -30,20 +30,23 @@
 
 """Tests retrieving dependencies from the AUR"""
 
+import asyncio
+import pathlib
+import sqlite3
 from urllib.error import HTTPError
 
 import pytest
 from pytest_mock import MockFixture
 
-from depythel.repository.aur import online
+from depythel.cache import MetadataCache
+from depythel.repository.aur import online, online_async, online_many
 
 
 def test_standard_response(session_mocker: MockFixture) -> None:
     """Standard Expected 200 response."""
 
-    session_mocker.patch("depythel.repository.aur.urlopen")
     session_mocker.patch(
-        "depythel.repository.aur.json.load",
+        "depythel.repository.aur.fetch_json",
         return_value={
             "version": 5,
             "type": "multiinfo",
@@ -104,7 +107,7 @@ def test_standard_response(session_mocker: MockFixture) -> None:
 def test_invalid_response(session_mocker: MockFixture) -> None:
     """If the user's input isn't a valid project in the AUR."""
     session_mocker.patch(
-        "depythel.repository.aur.json.load",
+        "depythel.repository.aur.fetch_json",
         return_value={
             "version": 5,
             "type": "multiinfo",
@@ -114,3 +117,104 @@ def test_invalid_response(session_mocker: MockFixture) -> None:
     )
     with pytest.raises(HTTPError):
         online("idontexist")
+
+
+def test_quoted(session_mocker: MockFixture) -> None:
+    """Names are quoted in the URL, so that characters like + aren't lost."""
+    response = {"resultcount": 1, "results": [{"Name": "gtk+"}]}
+    fetch_json = session_mocker.patch(
+        "depythel.repository.aur.fetch_json", return_value=response
+    )
+    fetch_json_async = session_mocker.patch(
+        "depythel.repository.aur.fetch_json_async", return_value=response
+    )
+    assert online("gtk+") == {}
+    assert asyncio.run(online_async("gtk+")) == {}
+    url = "https://aur.archlinux.org/rpc/?v=5&type=info&arg[]=gtk%2B"
+    fetch_json.assert_called_once_with("aur", "gtk+", url)
+    fetch_json_async.assert_called_once_with("aur", "gtk+", url)
+
+
+class TestOnlineMany:
+    def test_batch(self, session_mocker: MockFixture) -> None:
+        """Several packages are retrieved in a single request."""
+        session_mocker.patch("depythel.repository.aur.default_cache", return_value=None)
+        get_json = session_mocker.patch(
+            "depythel.repository.aur.get_json",
+            return_value={
+                "version": 5,
+                "type": "multiinfo",
+                "resultcount": 2,
+                "results": [
+                    {"Name": "gmp-hg", "Depends": ["gcc-libs", "sh"]},
+                    {"Name": "rget", "MakeDepends": ["rustup"]},
+                ],
+            },
+        )
+        assert online_many(["rget", "gmp-hg", "idontexist", "rget"]) == {
+            "rget": {"rustup": "MakeDepends"},
+            "gmp-hg": {"gcc-libs": "Depends", "sh": "Depends"},
+        }
+        get_json.assert_called_once_with(
+            "https://aur.archlinux.org/rpc/?v=5&type=info"
+            "&arg[]=rget&arg[]=gmp-hg&arg[]=idontexist"
+        )
+
+    def test_chunks(self, session_mocker: MockFixture) -> None:
+        """Requests are split up to keep the URL short enough."""
+        session_mocker.patch("depythel.repository.aur.default_cache", return_value=None)
+        session_mocker.patch("depythel.repository.aur.MAX_URL_LENGTH", 80)
+        get_json = session_mocker.patch(
+            "depythel.repository.aur.get_json",
+            return_value={"resultcount": 0, "results": []},
+        )
+        assert online_many(["aaaaaaaa", "bbbbbbbb", "cccccccc", "dddddddd"]) == {}
+        assert [len(call.args[0]) <= 80 for call in get_json.call_args_list] == [
+            True,
+            True,
+        ]
+
+    def test_cache(self, tmp_path: pathlib.Path, session_mocker: MockFixture) -> None:
+        """Packages are cached individually, so they can be reused."""
+        cache = MetadataCache(str(tmp_path / "cache.sqlite3"))
+        session_mocker.patch(
+            "depythel.repository.aur.default_cache", return_value=cache
+        )
+        session_mocker.patch("depythel._http.default_cache", return_value=cache)
+        get_json = session_mocker.patch(
+            "depythel.repository.aur.get_json",
+            return_value={
+                "resultcount": 1,
+                "results": [{"Name": "rget-cached", "MakeDepends": ["rustup"]}],
+            },
+        )
+        online_many(["rget-cached"])
+        assert online_many(["rget-cached"]) == {
+            "rget-cached": {"rustup": "MakeDepends"}
+        }
+        get_json.assert_called_once()
+        # The single package lookup also uses the cached response
+        session_mocker.stopall()
+        session_mocker.patch("depythel._http.default_cache", return_value=cache)
+        assert online("rget-cached") == {"rustup": "MakeDepends"}
+
+    def test_cache_error(
+        self, tmp_path: pathlib.Path, session_mocker: MockFixture
+    ) -> None:
+        """Packages are still retrieved if the cache can't be used."""
+        session_mocker.stopall()
+        cache = MetadataCache(str(tmp_path / "cache.sqlite3"))
+        locked = sqlite3.OperationalError("database is locked")
+        session_mocker.patch.object(cache, "get", side_effect=locked)
+        session_mocker.patch.object(cache, "set", side_effect=locked)
+        session_mocker.patch(
+            "depythel.repository.aur.default_cache", return_value=cache
+        )
+        session_mocker.patch(
+            "depythel.repository.aur.get_json",
+            return_value={
+                "resultcount": 1,
+                "results": [{"Name": "rget", "MakeDepends": ["rustup"]}],
+            },
+        )
+        assert online_many(["rget"]) == {"rget": {"rustup": "MakeDepends"}}
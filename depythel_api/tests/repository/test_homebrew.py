@@ -30,17 +30,19 @@
 
 """Tests retrieving dependencies from the Homebrew repository"""
 
+import json
+from pathlib import Path
+
 from pytest_mock import MockFixture
 
-from depythel.repository.homebrew import online
+from depythel.repository.homebrew import online, parse_index
 
 
 def test_standard_response(session_mocker: MockFixture) -> None:
     """Standard Expected 200 response."""
 
-    session_mocker.patch("depythel.repository.homebrew.urlopen")
     session_mocker.patch(
-        "depythel.repository.homebrew.json.load",
+        "depythel.repository.homebrew.fetch_json",
         return_value={
             "name": "gping",
             "full_name": "gping",
@@ -146,3 +148,30 @@ def test_standard_response(session_mocker: MockFixture) -> None:
         },
     )
     assert online("gping") == {"rust": "build_dependencies"}
+
+
+def test_parse_index(tmp_path: Path) -> None:
+    """Every formula in the full index is read."""
+    index_path = tmp_path / "formula.json"
+    index_path.write_text(
+        json.dumps(
+            [
+                {
+                    "name": name,
+                    "dependencies": dependencies,
+                    "recommended_dependencies": [],
+                    "optional_dependencies": [],
+                    "build_dependencies": build_dependencies,
+                }
+                for name, dependencies, build_dependencies in (
+                    ("gping", [], ["rust"]),
+                    ("rust", ["openssl@1.1"], ["cmake"]),
+                )
+            ]
+        )
+    )
+    with index_path.open("rb") as index_file:
+        assert list(parse_index(index_file)) == [
+            ("gping", {"rust": "build_dependencies"}),
+            ("rust", {"openssl@1.1": "dependencies", "cmake": "build_dependencies"}),
+        ]
@@ -30,17 +30,18 @@
 
 """Tests retrieving dependencies from the MacPorts repository"""
 
+from pathlib import Path
+
 from pytest_mock import MockFixture
 
-from depythel.repository.macports import online
+from depythel.repository.macports import _tcl_list, online, parse_index
 
 
 def test_standard_response(session_mocker: MockFixture) -> None:
     """Standard Expected 200 response."""
 
-    session_mocker.patch("depythel.repository.macports.urlopen")
     session_mocker.patch(
-        "depythel.repository.macports.json.load",
+        "depythel.repository.macports.fetch_json",
         return_value={
             "name": "gping",
             "portdir": "net/gping",
@@ -61,3 +62,25 @@ def test_standard_response(session_mocker: MockFixture) -> None:
         },
     )
     assert online("gping") == {"cargo": "build", "clang-12": "build"}
+
+
+def test_parse_index(tmp_path: Path) -> None:
+    """Every port in a PortIndex is read, regardless of how it's depended on."""
+    index_path = tmp_path / "PortIndex"
+    index_path.write_bytes(
+        b"gping 120\n"
+        b"name gping portdir net/gping depends_build {port:cargo port:clang-12}\n"
+        b"openssh 200\n"
+        b"variants {gsskex kerberos5} depends_lib "
+        b"{path:lib/libssl.dylib:openssl port:zlib} depends_run bin:git:git\n"
+    )
+    with index_path.open("rb") as index_file:
+        assert list(parse_index(index_file)) == [
+            ("gping", {"cargo": "build", "clang-12": "build"}),
+            ("openssh", {"openssl": "lib", "zlib": "lib", "git": "run"}),
+        ]
+
+
+def test_tcl_list() -> None:
+    """Braces are nested and taken literally, whereas quotes allow escapes."""
+    assert _tcl_list('a {b {c d}} "e \\"f" {}') == ["a", "b {c d}", 'e "f', ""]
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2021-2022, Haren Samarasinghe
+#
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+#     * Redistributions of source code must retain the above copyright notice,
+#       this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright notice,
+#       this list of conditions and the following disclaimer in the documentation
+#       and/or other materials provided with the distribution.
+#     * Neither the name of seaport nor the names of its contributors
+#       may be used to endorse or promote products derived from this software
+#       without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Tests the persistent on-disk metadata cache."""
+
+import pathlib
+import sqlite3
+
+import pytest
+
+from depythel.cache import MetadataCache, cache_directory
+
+
+class TestMetadataCache:
+    def test_round_trip(self, tmp_path: pathlib.Path) -> None:
+        """Entries persist between separate instances of the cache."""
+        path = str(tmp_path / "cache.sqlite3")
+        MetadataCache(path).set("macports", "gping", b"{}", '"etag"', "yesterday")
+        entry = MetadataCache(path).get("macports", "gping")
+        assert entry is not None
+        assert entry.body == b"{}"
+        assert entry.etag == '"etag"'
+        assert entry.last_modified == "yesterday"
+        assert entry.fresh
+
+    def test_missing(self, tmp_path: pathlib.Path) -> None:
+        """Projects are keyed by both their repository and name."""
+        cache = MetadataCache(str(tmp_path / "cache.sqlite3"))
+        cache.set("macports", "gping", b"{}")
+        assert cache.get("homebrew", "gping") is None
+        assert cache.get("macports", "rust") is None
+
+    def test_stale(self, tmp_path: pathlib.Path) -> None:
+        """Entries older than the TTL need revalidating, until they are refreshed."""
+        cache = MetadataCache(str(tmp_path / "cache.sqlite3"), ttl=0)
+        cache.set("aur", "rget", b"{}")
+        entry = cache.get("aur", "rget")
+        assert entry is not None and not entry.fresh
+        cache.ttl = 60
+        cache.refresh("aur", "rget")
+        entry = cache.get("aur", "rget")
+        assert entry is not None and entry.fresh
+
+    def test_lru_eviction(self, tmp_path: pathlib.Path) -> None:
+        """The least recently used entries are removed once the cache is full."""
+        cache = MetadataCache(str(tmp_path / "cache.sqlite3"))
+        cache.set("homebrew", "a", b"a" * 100)
+        cache.set("homebrew", "b", b"b" * 100)
+        cache.get("homebrew", "a")  # b is now the least recently used
+        cache.max_size = cache.size()
+        cache.set("homebrew", "c", b"c" * 100)
+        assert cache.get("homebrew", "a") is not None
+        assert cache.get("homebrew", "b") is None
+        assert cache.get("homebrew", "c") is not None
+        assert cache.size() <= cache.max_size
+
+    def test_clear(self, tmp_path: pathlib.Path) -> None:
+        """Clearing the cache removes everything."""
+        cache = MetadataCache(str(tmp_path / "cache.sqlite3"))
+        cache.set("homebrew", "a", b"{}")
+        cache.clear()
+        assert cache.get("homebrew", "a") is None
+        assert cache.size() == 0
+
+    def test_locked(self, tmp_path: pathlib.Path) -> None:
+        """Entries can be read while another process is writing to the database."""
+        path = str(tmp_path / "cache.sqlite3")
+        cache = MetadataCache(path)
+        cache.set("macports", "gping", b"{}")
+        other = sqlite3.connect(path, isolation_level=None)
+        other.execute("BEGIN IMMEDIATE")
+        try:
+            entry = cache.get("macports", "gping")
+            assert entry is not None and entry.fresh
+        finally:
+            other.execute("ROLLBACK")
+            other.close()
+
+
+def test_cache_directory(monkeypatch: pytest.MonkeyPatch) -> None:
+    """The cache directory follows the XDG specification unless overridden."""
+    monkeypatch.delenv("DEPYTHEL_CACHE_DIR", raising=False)
+    monkeypatch.setenv("XDG_CACHE_HOME", "/xdg")
+    assert cache_directory() == "/xdg/depythel"
+    monkeypatch.setenv("DEPYTHEL_CACHE_DIR", "/elsewhere")
+    assert cache_directory() == "/elsewhere"
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2021-2022, Haren Samarasinghe
+#
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+#     * Redistributions of source code must retain the above copyright notice,
+#       this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright notice,
+#       this list of conditions and the following disclaimer in the documentation
+#       and/or other materials provided with the distribution.
+#     * Neither the name of seaport nor the names of its contributors
+#       may be used to endorse or promote products derived from this software
+#       without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Tests the compact representation of dependency trees."""
+
+import pathlib
+import tracemalloc
+from collections import deque
+
+import pytest
+
+from depythel.compact import CompactTree
+from depythel.main import CycleError, LocalTree
+
+
+class TestCompactTree:
+    def test_descriptive(self) -> None:
+        """Behaves like the descriptive tree it was built from."""
+        tree = {"a": {"b": "lib", "c": "build"}, "b": {"c": "build"}, "c": {}}
+        compact = CompactTree(tree)
+        assert compact == tree
+        assert compact.to_dict() == tree
+        assert list(compact) == ["a", "b", "c"]
+        assert len(compact) == 3
+        assert compact.successors("a") == ["b", "c"]
+        assert compact.successors("missing") == []
+        assert compact.categories == ["lib", "build"]
+        assert "c" in compact and "missing" not in compact
+        with pytest.raises(KeyError):
+            compact["missing"]  # pylint: disable=pointless-statement
+
+    def test_standard(self) -> None:
+        """Behaves like the standard tree it was built from."""
+        tree = {"a": "b", "b": "c"}
+        compact = CompactTree(tree)
+        assert not compact.descriptive
+        assert compact["a"] == "b"
+        assert compact.to_dict() == tree
+        # c is a project, even though it doesn't have an entry
+        assert compact.names == ["a", "b", "c"]
+        assert "c" not in compact
+
+    def test_many_categories(self) -> None:
+        """Category codes are widened if there are lots of categories."""
+        tree = {"a": {str(i): str(i) for i in range(300)}}
+        assert CompactTree(tree) == tree
+
+    def test_memory(self) -> None:
+        """Uses a fraction of the memory of the original tree."""
+        tracemalloc.start()
+        try:
+            tree = {
+                f"project-{i}": {
+                    f"project-{(i * 7 + j) % 5000}": ("build", "lib", "run")[j % 3]
+                    for j in range(5)
+                }
+                for i in range(5000)
+            }
+            tree_size = tracemalloc.get_traced_memory()[0]
+            compact = CompactTree(tree)
+            compact_size = tracemalloc.get_traced_memory()[0] - tree_size
+        finally:
+            tracemalloc.stop()
+        assert compact == tree
+        assert compact_size < tree_size / 2
+
+
+class TestLocalTree:
+    def test_algorithms(self) -> None:
+        """All the algorithms give the same result for a compact tree."""
+        tree = {"a": {"b": "lib", "c": "build"}, "b": {"c": "build", "d": "lib"}}
+        standard = LocalTree(tree)
+        compact = standard.compact()
+        assert isinstance(compact.tree, CompactTree)
+        assert compact.root == "a"
+        assert compact.all_items() == standard.all_items() == {"a", "b", "c", "d"}
+        assert compact.topological_sort("lexicographic") == deque(["c", "d", "b", "a"])
+        assert list(compact.depends_on("c")) == ["a", "b"]
+        assert compact.all_dependencies("a") == {"b", "c", "d"}
+        assert not compact.cycle_check()
+
+    def test_cycle(self) -> None:
+        """Cycles are found in compact trees."""
+        compact = LocalTree(CompactTree({"a": "b", "b": "a"}))
+        assert compact.cycle_check()
+        assert list(compact.cycles()) == [["b", "a"]]
+        with pytest.raises(CycleError):
+            compact.topological_sort()
+
+
+class TestBinaryFormat:
+    def test_round_trip(self, tmp_path: pathlib.Path) -> None:
+        """Trees are unchanged after being saved and loaded."""
+        for tree in (
+            {"a": {"b": "lib", "c": "build"}, "b": {"c": "build"}, "c": {}},
+            {"a": "b", "b": "c"},
+            {f"p{index}": {"q": f"category{index}"} for index in range(300)},
+        ):
+            compact = CompactTree(tree)
+            assert CompactTree.from_bytes(compact.to_bytes()).to_dict() == tree
+            path = str(tmp_path / "tree.dpt")
+            compact.save(path)
+            for memory_map in (True, False):
+                loaded = CompactTree.load(path, memory_map)
+                assert loaded.to_dict() == tree
+                assert loaded.names == compact.names
+
+    def test_local_tree(self, tmp_path: pathlib.Path) -> None:
+        """LocalTree saves any tree and loads it with category filters."""
+        path = str(tmp_path / "tree.dpt")
+        LocalTree({"a": {"b": "lib"}, "b": {"a": "build"}}).save(path)
+        loaded = LocalTree.load(path, exclude=["build"])
+        assert isinstance(loaded.tree, CompactTree)
+        assert loaded.topological_sort() == deque(["b", "a"])
+        assert LocalTree.load(path).cycle_check()
+
+    def test_invalid(self, tmp_path: pathlib.Path) -> None:
+        """Files which aren't binary trees are rejected."""
+        data = CompactTree({"a": "b"}).to_bytes()
+        for invalid in (b"", b'{"a": "b"}', data[:-8], data[:8] + b"\x09" + data[9:]):
+            with pytest.raises(ValueError):
+                CompactTree.from_bytes(invalid)
+        path = tmp_path / "empty.dpt"
+        path.write_bytes(b"")
+        with pytest.raises(ValueError):
+            CompactTree.load(str(path))
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2021-2022, Haren Samarasinghe
+#
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+#     * Redistributions of source code must retain the above copyright notice,
+#       this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright notice,
+#       this list of conditions and the following disclaimer in the documentation
+#       and/or other materials provided with the distribution.
+#     * Neither the name of seaport nor the names of its contributors
+#       may be used to endorse or promote products derived from this software
+#       without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Tests exporting dependency trees for graph renderers."""
+
+import io
+import xml.etree.ElementTree as ElementTree
+
+from depythel.compact import CompactTree
+from depythel.export import (
+    DEPTH_COLOURS,
+    UNREACHABLE_COLOUR,
+    nodes,
+    pyvis_edges,
+    pyvis_nodes,
+    write_dot,
+    write_graphml,
+)
+from depythel.main import LocalTree
+
+TREE = {"a": {"b": "lib", "c": "build"}, "b": {"a": "lib"}, "d": {"e": "lib"}}
+
+
+class TestExport:
+    def test_nodes(self) -> None:
+        """Every project is listed once, coloured by its distance from the root."""
+        tree = LocalTree(TREE)
+        assert list(nodes(tree)) == [
+            ("a", 0),
+            ("b", 1),
+            ("c", 1),
+            ("d", None),
+            ("e", None),
+        ]
+        assert list(nodes(LocalTree({"a": "a"}))) == [("a", 0)]
+        # The root isn't necessarily the first node in the tree's edges
+        assert list(nodes(LocalTree(CompactTree({"x": "y"})))) == [("x", 0), ("y", 1)]
+
+    def test_pyvis(self) -> None:
+        """Nodes and edges use pyvis' options, following category filters."""
+        tree = LocalTree(TREE, exclude=["build"])
+        vis_nodes = list(pyvis_nodes(tree))
+        # c is only reached through a build dependency, but d is still in the tree
+        assert [node["id"] for node in vis_nodes] == ["a", "b", "d", "e"]
+        assert vis_nodes[0]["color"] == DEPTH_COLOURS[0]
+        assert vis_nodes[2]["color"] == UNREACHABLE_COLOUR
+        assert vis_nodes[0]["size"] > vis_nodes[1]["size"]
+        assert list(pyvis_edges(tree)) == [
+            {"from": "a", "to": "b", "arrows": "to", "title": "lib"},
+            {"from": "b", "to": "a", "arrows": "to", "title": "lib"},
+            {"from": "d", "to": "e", "arrows": "to", "title": "lib"},
+        ]
+
+    def test_dot(self) -> None:
+        """Names are quoted, so any project name can be used."""
+        output = io.StringIO()
+        write_dot(LocalTree({'a"b': "c\\d"}), output)
+        assert output.getvalue() == (
+            'digraph "a\\"b" {\n'
+            f'  "a\\"b" [style=filled, fillcolor="{DEPTH_COLOURS[0]}"];\n'
+            f'  "c\\\\d" [style=filled, fillcolor="{DEPTH_COLOURS[1]}"];\n'
+            '  "a\\"b" -> "c\\\\d";\n'
+            "}\n"
+        )
+
+    def test_graphml(self) -> None:
+        """The GraphML output is valid XML with depths, colours and categories."""
+        output = io.StringIO()
+        write_graphml(LocalTree(dict(TREE, **{"<&>": {}})), output)
+        namespace = {"g": "http://graphml.graphdrawing.org/xmlns"}
+        graph = ElementTree.fromstring(output.getvalue()).find("g:graph", namespace)
+        assert graph is not None
+        graph_nodes = graph.findall("g:node", namespace)
+        assert [node.get("id") for node in graph_nodes] == [*"abcde", "<&>"]
+        assert graph_nodes[3][0].text == UNREACHABLE_COLOUR
+        edges = graph.findall("g:edge", namespace)
+        assert [
+            (edge.get("source"), edge.get("target"), edge[0].text) for edge in edges
+        ][:2] == [("a", "b", "lib"), ("a", "c", "build")]
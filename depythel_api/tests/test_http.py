@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2021-2022, Haren Samarasinghe
+#
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+#     * Redistributions of source code must retain the above copyright notice,
+#       this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright notice,
+#       this list of conditions and the following disclaimer in the documentation
+#       and/or other materials provided with the distribution.
+#     * Neither the name of seaport nor the names of its contributors
+#       may be used to endorse or promote products derived from this software
+#       without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Tests fetching metadata over HTTP."""
+
+import asyncio
+import gzip
+import http.client
+import pathlib
+import sqlite3
+import threading
+from email.message import Message
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Iterator, List, Tuple
+from urllib.error import HTTPError, URLError
+
+import pytest
+from pytest_mock import MockFixture
+
+from depythel import _http
+from depythel._http import (
+    Response,
+    fetch_json,
+    fetch_json_async,
+    get_json,
+    request,
+    request_async,
+)
+from depythel.cache import MetadataCache
+
+
+def _response(body: bytes = b"", status: int = 200, **headers: str) -> Response:
+    """A response from the transport, with the given headers."""
+    message = http.client.HTTPMessage()
+    for header, value in headers.items():
+        message[header.replace("_", "-")] = value
+    return Response(status, message, body)
+
+
+@pytest.fixture
+def cache(tmp_path: pathlib.Path, mocker: MockFixture) -> MetadataCache:
+    """A temporary cache used in place of the default cache."""
+    temporary_cache = MetadataCache(str(tmp_path / "cache.sqlite3"))
+    mocker.patch("depythel._http.default_cache", return_value=temporary_cache)
+    return temporary_cache
+
+
+def test_no_cache(mocker: MockFixture) -> None:
+    """The document is fetched from the network if caching is turned off."""
+    mocker.patch("depythel._http.default_cache", return_value=None)
+    transport = mocker.patch(
+        "depythel._http.request", return_value=_response(b'{"a": 1}')
+    )
+    assert fetch_json("homebrew", "a", "https://example.com") == {"a": 1}
+    assert fetch_json("homebrew", "a", "https://example.com") == {"a": 1}
+    assert transport.call_count == 2
+
+
+def test_fresh(cache: MetadataCache, mocker: MockFixture) -> None:
+    """Fresh entries are returned without any network access."""
+    transport = mocker.patch("depythel._http.request")
+    cache.set("homebrew", "a", b'{"a": 1}')
+    assert fetch_json("homebrew", "a", "https://example.com") == {"a": 1}
+    transport.assert_not_called()
+
+
+def test_stored(cache: MetadataCache, mocker: MockFixture) -> None:
+    """Responses are stored along with their validators."""
+    mocker.patch(
+        "depythel._http.request", return_value=_response(b'{"a": 1}', ETag='"v1"')
+    )
+    assert fetch_json("aur", "a", "https://example.com") == {"a": 1}
+    entry = cache.get("aur", "a")
+    assert entry is not None
+    assert entry.body == b'{"a": 1}'
+    assert entry.etag == '"v1"'
+
+
+def test_revalidate(cache: MetadataCache, mocker: MockFixture) -> None:
+    """Stale entries are revalidated, and reused if they haven't been modified."""
+    cache.ttl = 0
+    cache.set("macports", "a", b'{"a": 1}', '"v1"', "Mon, 01 Aug 2022 00:00:00 GMT")
+    transport = mocker.patch(
+        "depythel._http.request", return_value=_response(status=304)
+    )
+    assert fetch_json("macports", "a", "https://example.com") == {"a": 1}
+    headers = transport.call_args[0][1]
+    assert headers["If-None-Match"] == '"v1"'
+    assert headers["If-Modified-Since"] == "Mon, 01 Aug 2022 00:00:00 GMT"
+
+
+def test_error(cache: MetadataCache, mocker: MockFixture) -> None:
+    """Other HTTP errors are passed on to the caller."""
+    mocker.patch(
+        "depythel._http.request",
+        side_effect=HTTPError("https://example.com", 404, "Not Found", None, None),  # type: ignore[arg-type]
+    )
+    with pytest.raises(HTTPError):
+        fetch_json("macports", "a", "https://example.com")
+
+
+def test_cache_error(cache: MetadataCache, mocker: MockFixture) -> None:
+    """Lookups fall back to the network if the cache can't be used."""
+    locked = sqlite3.OperationalError("database is locked")
+    mocker.patch.object(cache, "get", side_effect=locked)
+    mocker.patch.object(cache, "set", side_effect=locked)
+    transport = mocker.patch(
+        "depythel._http.request", return_value=_response(b'{"a": 1}')
+    )
+    assert fetch_json("homebrew", "a", "https://example.com") == {"a": 1}
+    transport.assert_called_once()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """Serves a scripted list of responses, recording each request."""
+
+    protocol_version = "HTTP/1.1"
+    # (status, headers, body) for each request in turn
+    scripted: List[Tuple[int, List[Tuple[str, str]], bytes]] = []
+    # (client port, path, headers) for each request received
+    received: List[Tuple[int, str, Message]] = []
+
+    def do_GET(self) -> None:  # pylint: disable=invalid-name
+        """Sends the next scripted response."""
+        self.received.append((self.client_address[1], self.path, self.headers))
+        status, headers, body = self.scripted.pop(0)
+        self.send_response(status)
+        for header, value in headers:
+            self.send_header(header, value)
+        if all(header != "Transfer-Encoding" for header, _ in headers):
+            self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args: object) -> None:
+        """Keeps the test output quiet."""
+
+
+@pytest.fixture
+def server(mocker: MockFixture) -> Iterator[str]:
+    """A local HTTP server, returning the URL it's hosted on."""
+    mocker.patch.object(_http, "BACKOFF", 0)
+    _Handler.scripted, _Handler.received = [], []
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    # Don't wait for connections that are being kept alive
+    httpd.daemon_threads = True
+    thread = threading.Thread(target=httpd.serve_forever, args=(0.01,), daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    # The server only handles one connection at a time, so close ours first
+    _http._discard("http", f"127.0.0.1:{httpd.server_address[1]}")
+    httpd.shutdown()
+    httpd.server_close()
+
+
+class TestTransport:
+    def test_keep_alive(self, server: str) -> None:
+        """Requests to the same host reuse a single connection."""
+        _Handler.scripted = [(200, [], b'{"a": 1}'), (200, [], b'{"b": 2}')]
+        assert get_json(f"{server}/a.json") == {"a": 1}
+        assert get_json(f"{server}/b.json?c=d") == {"b": 2}
+        ports = {port for port, _, _ in _Handler.received}
+        assert len(ports) == 1
+        assert [path for _, path, _ in _Handler.received] == ["/a.json", "/b.json?c=d"]
+
+    def test_gzip(self, server: str) -> None:
+        """Compressed responses are requested and decoded."""
+        _Handler.scripted = [
+            (200, [("Content-Encoding", "gzip")], gzip.compress(b'{"a": 1}'))
+        ]
+        assert get_json(server) == {"a": 1}
+        assert "gzip" in _Handler.received[0][2]["Accept-Encoding"]
+
+    def test_retry(self, server: str) -> None:
+        """Rate limits and server errors are retried."""
+        _Handler.scripted = [
+            (429, [("Retry-After", "0")], b""),
+            (503, [], b""),
+            (200, [], b"[]"),
+        ]
+        assert get_json(server) == []
+        assert len(_Handler.received) == 3
+
+    def test_give_up(self, server: str, mocker: MockFixture) -> None:
+        """Persistent server errors are eventually passed on."""
+        mocker.patch.object(_http, "RETRIES", 1)
+        _Handler.scripted = [(500, [], b""), (500, [], b"")]
+        with pytest.raises(HTTPError) as error:
+            request(server)
+        assert error.value.code == 500
+
+    def test_redirect(self, server: str) -> None:
+        """Redirects are followed over the same connection."""
+        _Handler.scripted = [(301, [("Location", "/moved")], b""), (200, [], b"1")]
+        assert get_json(server) == 1
+        assert _Handler.received[1][1] == "/moved"
+
+    def test_not_modified(self, server: str) -> None:
+        """304 responses are returned for the caller to revalidate."""
+        _Handler.scripted = [(304, [], b"")]
+        assert request(server, {"If-None-Match": '"v1"'}).status == 304
+        assert _Handler.received[0][2]["If-None-Match"] == '"v1"'
+
+    def test_unreachable(self, mocker: MockFixture) -> None:
+        """Connection failures are raised once the retries run out."""
+        mocker.patch.object(_http, "BACKOFF", 0)
+        mocker.patch.object(_http, "RETRIES", 1)
+        # Nothing should be listening on port 9 (discard)
+        with pytest.raises(URLError):
+            request("http://127.0.0.1:9/")
+
+
+class TestAsyncTransport:
+    def test_keep_alive(self, server: str) -> None:
+        """Requests from the same event loop reuse idle connections."""
+        _Handler.scripted = [(200, [], b'{"a": 1}'), (200, [], b'{"b": 2}')]
+
+        async def fetch_both() -> Tuple[Response, Response]:
+            first = await request_async(f"{server}/a.json")
+            return first, await request_async(f"{server}/b.json?c=d")
+
+        first, second = asyncio.run(fetch_both())
+        assert (first.body, second.body) == (b'{"a": 1}', b'{"b": 2}')
+        assert len({port for port, _, _ in _Handler.received}) == 1
+        assert [path for _, path, _ in _Handler.received] == ["/a.json", "/b.json?c=d"]
+
+    def test_chunked_gzip(self, server: str) -> None:
+        """Chunked and compressed responses are decoded."""
+        body = gzip.compress(b'{"a": 1}')
+        _Handler.scripted = [
+            (
+                200,
+                [("Transfer-Encoding", "chunked"), ("Content-Encoding", "gzip")],
+                b"%x\r\n%s\r\n0\r\n\r\n" % (len(body), body),
+            )
+        ]
+        assert asyncio.run(request_async(server)).body == b'{"a": 1}'
+
+    def test_retry(self, server: str) -> None:
+        """Rate limits and server errors are retried, and errors passed on."""
+        _Handler.scripted = [(503, [], b""), (200, [], b"[]"), (404, [], b"")]
+        assert asyncio.run(request_async(server)).body == b"[]"
+        with pytest.raises(HTTPError):
+            asyncio.run(request_async(server))
+
+    def test_fetch_json(self, server: str, cache: MetadataCache) -> None:
+        """The async version shares the persistent cache."""
+        _Handler.scripted = [(200, [("ETag", '"v1"')], b'{"a": 1}')]
+        assert asyncio.run(fetch_json_async("aur", "a", server)) == {"a": 1}
+        assert fetch_json("aur", "a", server) == {"a": 1}
+        assert len(_Handler.received) == 1
+
+    def test_cache_off_loop(
+        self, server: str, cache: MetadataCache, mocker: MockFixture
+    ) -> None:
+        """The cache is used from another thread, so the event loop isn't blocked."""
+        _Handler.scripted = [(200, [], b'{"a": 1}')]
+        threads: List[int] = []
+        mocker.patch.object(
+            _http,
+            "cache_get",
+            side_effect=lambda *_: threads.append(threading.get_ident()),
+        )
+        mocker.patch.object(
+            _http,
+            "cache_set",
+            side_effect=lambda *_: threads.append(threading.get_ident()),
+        )
+        assert asyncio.run(fetch_json_async("aur", "a", server)) == {"a": 1}
+        assert len(threads) == 2
+        assert threading.get_ident() not in threads
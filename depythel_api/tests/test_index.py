@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2021-2022, Haren Samarasinghe
+#
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+#     * Redistributions of source code must retain the above copyright notice,
+#       this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright notice,
+#       this list of conditions and the following disclaimer in the documentation
+#       and/or other materials provided with the distribution.
+#     * Neither the name of seaport nor the names of its contributors
+#       may be used to endorse or promote products derived from this software
+#       without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Tests looking up dependencies from an offline repository index."""
+
+import json
+import pathlib
+
+import pytest
+from pytest_mock import MockFixture
+
+from depythel.index import OfflineIndex
+from depythel.main import Tree
+
+
+class TestOfflineIndex:
+    def test_round_trip(self, tmp_path: pathlib.Path) -> None:
+        """Ingested projects persist between separate instances of the index."""
+        path = str(tmp_path / "index.sqlite3")
+        assert (
+            OfflineIndex(path).ingest("macports", [("gping", {"cargo": "build"})]) == 1
+        )
+        index = OfflineIndex(path)
+        assert index.lookup("macports", "gping") == {"cargo": "build"}
+        assert len(index) == 1
+
+    def test_missing(self, tmp_path: pathlib.Path) -> None:
+        """Projects are keyed by both their repository and name."""
+        index = OfflineIndex(str(tmp_path / "index.sqlite3"))
+        index.ingest("macports", [("gping", {})])
+        with pytest.raises(KeyError):
+            index.lookup("homebrew", "gping")
+
+    def test_replace(self, tmp_path: pathlib.Path) -> None:
+        """Ingesting a repository again replaces all of its old projects."""
+        index = OfflineIndex(str(tmp_path / "index.sqlite3"))
+        index.ingest("homebrew", [("a", {}), ("b", {})])
+        index.ingest("macports", [("a", {})])
+        index.ingest("homebrew", [("c", {})])
+        assert len(index) == 2
+        with pytest.raises(KeyError):
+            index.lookup("homebrew", "a")
+
+    def test_unsupported(self, tmp_path: pathlib.Path) -> None:
+        """Repositories without a full index can't be ingested."""
+        index = OfflineIndex(str(tmp_path / "index.sqlite3"))
+        with pytest.raises(AttributeError):
+            index.ingest_file("aur", str(tmp_path / "missing"))
+
+    def test_tree(self, tmp_path: pathlib.Path, session_mocker: MockFixture) -> None:
+        """Trees generated from an index don't make any requests."""
+        session_mocker.stopall()
+        online = session_mocker.patch("depythel.repository.homebrew.online")
+        index_path = tmp_path / "formula.json"
+        index_path.write_text(
+            json.dumps(
+                [
+                    {
+                        "name": name,
+                        "dependencies": dependencies,
+                        "recommended_dependencies": [],
+                        "optional_dependencies": [],
+                        "build_dependencies": [],
+                    }
+                    for name, dependencies in (("a", ["b"]), ("b", ["c"]), ("c", []))
+                ]
+            )
+        )
+        index = OfflineIndex(str(tmp_path / "index.sqlite3"))
+        assert index.ingest_file("homebrew", str(index_path)) == 3
+        tree = Tree("a", "homebrew", 3, index=index)
+        assert tree.tree == {
+            "a": {"b": "dependencies"},
+            "b": {"c": "dependencies"},
+            "c": {},
+        }
+        online.assert_not_called()
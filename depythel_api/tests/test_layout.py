@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2021-2022, Haren Samarasinghe
+#
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+#     * Redistributions of source code must retain the above copyright notice,
+#       this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright notice,
+#       this list of conditions and the following disclaimer in the documentation
+#       and/or other materials provided with the distribution.
+#     * Neither the name of seaport nor the names of its contributors
+#       may be used to endorse or promote products derived from this software
+#       without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Tests laying out large dependency graphs."""
+
+import json
+
+from depythel.main import LocalTree
+
+TREE = {
+    "a": {"b": "lib", "c": "lib"},
+    "b": {"d": "lib"},
+    "c": {"d": "build"},
+    "d": {"e": "lib"},
+    "e": {"d": "lib"},
+}
+
+
+class TestLayout:
+    def test_layers(self) -> None:
+        """Projects are placed in layers by their distance from the root."""
+        layout = LocalTree(TREE).layout(collapse_cycles=False)
+        positions = {
+            cluster.label: (cluster.depth, cluster.x, cluster.y)
+            for cluster in layout.clusters
+        }
+        assert positions["a"] == (0, 0, 0)
+        assert positions["e"][0] == 3
+        assert {positions["b"][0], positions["c"][0]} == {1}
+        assert positions["b"][1] != positions["c"][1]
+        assert len(layout.edges) == 6
+        for source, target in layout.edges:
+            assert 0 <= source < len(layout.clusters) > target >= 0
+
+    def test_collapse(self) -> None:
+        """Cycles and deep subtrees are shown as single nodes."""
+        layout = LocalTree(TREE).layout()
+        assert sorted(cluster.projects for cluster in layout.clusters) == [
+            ("a",),
+            ("b",),
+            ("c",),
+            ("e", "d"),
+        ]
+        layout = LocalTree(TREE).layout(max_depth=1)
+        assert sorted(cluster.projects for cluster in layout.clusters) == [
+            ("a",),
+            ("b", "e", "d"),
+            ("c",),
+        ]
+        assert len(layout.edges) == 3
+        assert LocalTree(TREE).layout(max_depth=0).clusters[0].label == "a (+4 more)"
+
+    def test_unreachable(self) -> None:
+        """Projects that the root doesn't depend on are still laid out."""
+        layout = LocalTree({"a": "b", "c": "b"}).layout()
+        assert {cluster.label: cluster.depth for cluster in layout.clusters} == {
+            "a": 0,
+            "b": 1,
+            "c": 0,
+        }
+
+    def test_html(self) -> None:
+        """The layout is embedded in the page as flat arrays."""
+        page = LocalTree({"a": "</script>", "</script>": "a"}).layout().to_html("<a>")
+        assert "<title>&lt;a&gt;</title>" in page
+        embedded = page.split("const data = ", 1)[1].split(";\n", 1)[0]
+        assert "</script>" not in embedded
+        data = json.loads(embedded)
+        assert data["labels"] == ["</script> (+1 more)"]
+        assert data["edges"] == []
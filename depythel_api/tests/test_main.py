@@ -30,13 +30,17 @@
 
 """Tests functions related to generating the dependency tree."""
 
+import asyncio
+import gc
+import time
 from collections import deque
-from typing import Any, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Tuple
 
 import pytest
 from pytest_mock import MockFixture
 
-from depythel.main import LocalTree, Tree, _retrieve_from_stack
+from depythel.main import AsyncTree, CycleError, Forest, LocalTree, Tree
 
 
 class TestSetSize:
@@ -110,6 +114,72 @@ class TestTreeGenerator:
         assert pkg_config_tree.generator() == {"pkg-config": {}}
         assert pkg_config_tree.generator() == {"pkg-config": {}}
 
+    def test_concurrent(self, session_mocker: MockFixture) -> None:
+        """Fetching with several workers gives the same tree as fetching serially."""
+        dependencies = {
+            "a": {"b": "build", "c": "lib"},
+            "b": {"d": "lib", "c": "build"},
+            "c": {"e": "run"},
+            "d": {},
+            "e": {"a": "lib"},
+        }
+        session_mocker.patch(
+            "depythel.repository.macports.online",
+            side_effect=lambda name: dependencies[name],
+        )
+        serial_tree = Tree("a", "macports", 5)
+        concurrent_tree = Tree("a", "macports", 5, workers=3)
+        assert concurrent_tree.tree == serial_tree.tree == dependencies
+        assert tuple(concurrent_tree.tree) == tuple(serial_tree.tree)
+
+    def test_concurrent_shutdown(self, session_mocker: MockFixture) -> None:
+        """The workers are shut down after an error, or if the tree is discarded."""
+        session_mocker.stopall()
+        dependencies = {"a": {"b": "lib", "c": "lib"}, "b": {}}
+        session_mocker.patch(
+            "depythel.repository.macports.online",
+            side_effect=lambda name: dependencies[name],
+        )
+        shutdown = session_mocker.spy(ThreadPoolExecutor, "shutdown")
+        with pytest.raises(KeyError):
+            Tree("a", "macports", 3, workers=2)
+        assert shutdown.call_count == 1
+
+        example = Tree("a", "macports", 2, workers=2)
+        assert shutdown.call_count == 1
+        del example
+        gc.collect()
+        assert shutdown.call_count == 2
+
+    def test_batch(self, session_mocker: MockFixture) -> None:
+        """Repositories that support it look up the queue in batches."""
+        session_mocker.stopall()
+        dependencies = {
+            "a": {"b": "Depends", "c": "MakeDepends"},
+            "b": {"d": "Depends"},
+            "c": {},
+            "d": {},
+        }
+        online_many = session_mocker.patch(
+            "depythel.repository.aur.online_many",
+            side_effect=lambda names: {name: dependencies[name] for name in names},
+        )
+        assert Tree("a", "aur", 4).tree == dependencies
+        # a, then b and c together, then d
+        assert online_many.call_count == 3
+
+    def test_batch_missing(self, session_mocker: MockFixture) -> None:
+        """Projects missing from a batch are looked up individually."""
+        session_mocker.patch("depythel.repository.aur.online_many", return_value={})
+        online = session_mocker.patch("depythel.repository.aur.online", return_value={})
+        assert Tree("a", "aur").tree == {"a": {}}
+        online.assert_called_once_with("a")
+
+    def test_invalid_workers(self, session_mocker: MockFixture) -> None:
+        """There must be at least one worker to fetch dependencies."""
+        with pytest.raises(AttributeError):
+            Tree("gping", "macports", workers=0)
+
     def test_no_online_support(self, session_mocker: MockFixture) -> None:
         """If, for whatever reason, online support isn't available."""
         # TODO: Test if the return value is none if the online module doesn't exist.
@@ -119,22 +189,6 @@ class TestTreeGenerator:
             gping_tree = Tree("gping", "macports")
 
 
-def test_retrieve_from_stack() -> None:
-    """Test retrieving the contents of variables from the stack."""
-    # Test Program
-    a = 2
-
-    def demo() -> Optional[Any]:
-        a = 1
-        return _retrieve_from_stack("a")
-
-    #
-
-    assert demo() == 1
-    assert _retrieve_from_stack("a") == 2
-    assert _retrieve_from_stack("doesnt-exist") is None
-
-
 class TestCycleCheck:
     def test_standard_cycle(self) -> None:
         """Simple cycle a --> b and b --> a"""
@@ -151,6 +205,102 @@ class TestCycleCheck:
         no_cycles = LocalTree({"a": "b", "b": "c"})
         assert not no_cycles.cycle_check()
 
+    def test_self_dependency(self) -> None:
+        """A project that depends on itself is a cycle."""
+        assert LocalTree({"a": {"a": "lib", "b": "lib"}}).cycle_check(False)
+
+    def test_deep_chain(self) -> None:
+        """Long chains of dependencies don't hit the recursion limit."""
+        chain = {str(i): str(i + 1) for i in range(100_000)}
+        assert not LocalTree(chain).cycle_check(False)
+        chain["100000"] = "0"
+        assert LocalTree(chain).cycle_check()
+
+
+class TestStronglyConnected:
+    def test_components(self) -> None:
+        """Components are generated with their dependencies first."""
+        test_tree = LocalTree(
+            {"a": {"b": "lib"}, "b": {"c": "lib", "d": "lib"}, "c": {"b": "lib"}}
+        )
+        assert [
+            sorted(component) for component in test_tree.strongly_connected_components()
+        ] == [["d"], ["b", "c"], ["a"]]
+
+    def test_cycles(self) -> None:
+        """Every elementary cycle is found exactly once."""
+        test_tree = LocalTree(
+            {
+                "a": {"b": "lib", "c": "lib"},
+                "b": {"a": "lib", "c": "lib"},
+                "c": {"a": "lib", "c": "build"},
+            }
+        )
+        # Rotate each cycle to start from its smallest item for comparison.
+        found = {
+            tuple(cycle[cycle.index(min(cycle)) :] + cycle[: cycle.index(min(cycle))])
+            for cycle in test_tree.cycles()
+        }
+        assert found == {("c",), ("a", "b"), ("a", "c"), ("a", "b", "c")}
+
+    def test_no_cycles(self) -> None:
+        """Acyclic trees don't have any cycles."""
+        assert list(LocalTree({"a": "b", "b": "c"}).cycles()) == []
+
+    def test_lazy(self) -> None:
+        """Cycles are generated as they are requested."""
+        # A complete graph has a huge number of cycles
+        complete = {
+            str(i): {str(j): "lib" for j in range(12) if i != j} for i in range(12)
+        }
+        cycles = LocalTree(complete).cycles()
+        assert len(next(cycles)) >= 2
+
+
+class TestDependents:
+    def test_depends_on(self) -> None:
+        """Direct dependents of a project."""
+        test_tree = LocalTree({"a": {"b": "lib", "c": "lib"}, "b": {"c": "build"}})
+        assert list(test_tree.depends_on("c")) == ["a", "b"]
+        assert list(test_tree.depends_on("a")) == []
+        assert list(test_tree.depends_on("missing")) == []
+
+    def test_exact_names(self) -> None:
+        """Standard trees match whole names, not substrings."""
+        test_tree = LocalTree({"python39": "python3", "python3": "python"})
+        assert list(test_tree.depends_on("python")) == ["python3"]
+
+    def test_transitive(self) -> None:
+        """Projects that directly or indirectly depend on each other."""
+        test_tree = LocalTree(
+            {"a": {"b": "lib"}, "b": {"c": "lib", "d": "lib"}, "e": {"d": "lib"}}
+        )
+        assert test_tree.all_dependents("d") == {"a", "b", "e"}
+        assert test_tree.all_dependents("a") == set()
+        assert test_tree.all_dependencies("a") == {"b", "c", "d"}
+        assert test_tree.all_dependencies("d") == set()
+
+    def test_cycle(self) -> None:
+        """Projects in a cycle depend on themselves."""
+        test_tree = LocalTree({"a": "b", "b": "a"})
+        assert test_tree.all_dependents("a") == {"a", "b"}
+        assert test_tree.all_dependencies("b") == {"a", "b"}
+
+    def test_resize(self, session_mocker: MockFixture) -> None:
+        """The index is rebuilt once the tree changes size."""
+        # Undo the getattr mock from TestTreeGenerator
+        session_mocker.stopall()
+        session_mocker.patch(
+            "depythel.repository.homebrew.online",
+            side_effect=lambda name: {"a": {"b": "dependencies"}, "b": {}}[name],
+        )
+        test_tree = Tree("a", "homebrew")
+        assert test_tree.all_dependencies("a") == {"b"}
+        assert list(test_tree.depends_on("b")) == ["a"]
+        test_tree.set_size(2)
+        assert test_tree.all_dependents("b") == {"a"}
+        assert list(test_tree.topological_sort()) == ["b", "a"]
+
 
 # N.B. Topological sorting isn't necessarily reproducible.
 # This is since there can be many valid solutions.
@@ -170,5 +320,500 @@ class TestTopologicalSort:
     def test_cycle(self) -> None:
         """Tree that contains cycle => Topological sorting not possible."""
         test_tree = LocalTree({"a": "b", "b": "a"})
-        with pytest.raises(StopIteration):
+        with pytest.raises(CycleError):
+            test_tree.topological_sort()
+
+    def test_cycle_projects(self) -> None:
+        """Only the projects in or between cycles are reported."""
+        # x depends on the a <-> b cycle, which depends on c
+        test_tree = LocalTree(
+            {"x": {"a": "lib"}, "a": {"b": "lib"}, "b": {"a": "lib", "c": "lib"}}
+        )
+        with pytest.raises(CycleError) as error:
             test_tree.topological_sort()
+        assert error.value.projects == ["a", "b"]
+
+    def test_self_dependency(self) -> None:
+        """A project that depends on itself can't be ordered."""
+        test_tree = LocalTree({"a": {"a": "build"}})
+        with pytest.raises(CycleError):
+            test_tree.topological_sort()
+
+    def test_long_names(self) -> None:
+        """Each dependency in a standard tree counts once, however long its name."""
+        test_tree = LocalTree({"gping": "cargo", "cargo": "rust"})
+        assert test_tree.topological_sort() == deque(["rust", "cargo", "gping"])
+
+    def test_tie_break(self) -> None:
+        """Ties between projects that are ready at the same time can be broken."""
+        test_tree = LocalTree({"a": {"d": "lib", "c": "lib", "b": "lib"}})
+        assert test_tree.topological_sort("insertion") == deque(["d", "c", "b", "a"])
+        assert test_tree.topological_sort("lexicographic") == deque(
+            ["b", "c", "d", "a"]
+        )
+        with pytest.raises(ValueError):
+            test_tree.topological_sort("random")
+
+
+class TestIncrementalSize:
+    def test_regrow(self, session_mocker: MockFixture) -> None:
+        """Projects removed by shrinking are added back without fetching them again."""
+        session_mocker.stopall()
+        online = session_mocker.patch(
+            "depythel.repository.macports.online",
+            side_effect=lambda name: {"a": {"b": "lib", "c": "lib"}}.get(name, {}),
+        )
+        example = Tree("a", "macports", 3)
+        assert tuple(example.tree) == ("a", "b", "c")
+        example.set_size(1)
+        example.set_size(3)
+        assert tuple(example.tree) == ("a", "b", "c")
+        assert online.call_count == 3
+
+    def test_exhausted(self, session_mocker: MockFixture) -> None:
+        """The generator signals once every project has been fetched."""
+        session_mocker.stopall()
+        session_mocker.patch(
+            "depythel.repository.macports.online",
+            side_effect=lambda name: {"b": "lib"} if name == "a" else {},
+        )
+        example = Tree("a", "macports", 2)
+        assert not example.exhausted
+        example.set_size(10)
+        assert example.exhausted
+        assert example.tree == {"a": {"b": "lib"}, "b": {}}
+
+    def test_large(self, session_mocker: MockFixture) -> None:
+        """Resizing doesn't copy the whole tree each step."""
+        session_mocker.stopall()
+        session_mocker.patch(
+            "depythel.repository.macports.online",
+            side_effect=lambda name: {str(int(name) + 1): "lib"},
+        )
+        example = Tree("0", "macports", 10000)
+        assert len(example.tree) == 10000
+        example.set_size(1)
+        assert example.tree == {"0": {"1": "lib"}}
+
+
+class TestTraversal:
+    @pytest.mark.parametrize(
+        "traversal,order",
+        (
+            ("bfs", ("a", "c", "b", "e", "d")),
+            ("dfs", ("a", "c", "e", "b", "d")),
+            ("depth", ("a", "b", "c", "d", "e")),
+        ),
+    )
+    def test_order(
+        self, traversal: str, order: Tuple[str, ...], session_mocker: MockFixture
+    ) -> None:
+        """Projects are fetched in the chosen order."""
+        session_mocker.stopall()
+        dependencies = {
+            "a": {"c": "lib", "b": "lib"},
+            "b": {"d": "lib"},
+            "c": {"e": "lib"},
+            "d": {},
+            "e": {"a": "lib"},
+        }
+        session_mocker.patch(
+            "depythel.repository.macports.online",
+            side_effect=lambda name: dependencies[name],
+        )
+        assert tuple(Tree("a", "macports", 5, traversal=traversal).tree) == order
+        concurrent = Tree("a", "macports", 5, workers=2, traversal=traversal)
+        assert tuple(concurrent.tree) == order
+
+    def test_invalid(self) -> None:
+        """Unsupported traversals are rejected."""
+        with pytest.raises(ValueError):
+            Tree("a", "macports", traversal="random")
+
+
+class TestAsyncTree:
+    DEPENDENCIES: Dict[str, Dict[str, str]] = {
+        "a": {"b": "lib", "c": "lib", "d": "lib"},
+        "b": {"e": "lib"},
+        "c": {},
+        "d": {"a": "lib"},
+        "e": {},
+    }
+
+    def test_generate(self, session_mocker: MockFixture) -> None:
+        """The tree matches the one fetched synchronously, with bounded concurrency."""
+        session_mocker.stopall()
+        in_flight, most_in_flight = 0, 0
+
+        async def online_async(name: str) -> Dict[str, str]:
+            nonlocal in_flight, most_in_flight
+            in_flight += 1
+            most_in_flight = max(most_in_flight, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            return self.DEPENDENCIES[name]
+
+        session_mocker.patch(
+            "depythel.repository.macports.online_async", new=online_async
+        )
+        session_mocker.patch(
+            "depythel.repository.macports.online",
+            side_effect=lambda name: self.DEPENDENCIES[name],
+        )
+        example = AsyncTree("a", "macports", concurrency=2)
+        asyncio.run(example.set_size(10))
+        assert example.tree == Tree("a", "macports", 10).tree
+        assert tuple(example.tree) == ("a", "b", "c", "d", "e")
+        assert example.exhausted
+        assert most_in_flight == 2
+
+        asyncio.run(example.set_size(2))
+        assert tuple(example.tree) == ("a", "b")
+        asyncio.run(example.set_size(3))
+        assert tuple(example.tree) == ("a", "b", "c")
+
+    def test_shared_semaphore(self, session_mocker: MockFixture) -> None:
+        """Several trees can share a limit on the requests in flight."""
+        session_mocker.stopall()
+        in_flight, most_in_flight = 0, 0
+
+        async def online_async(name: str) -> Dict[str, str]:
+            nonlocal in_flight, most_in_flight
+            in_flight += 1
+            most_in_flight = max(most_in_flight, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            return self.DEPENDENCIES[name]
+
+        session_mocker.patch("depythel.repository.aur.online_async", new=online_async)
+
+        async def generate_both() -> None:
+            semaphore = asyncio.Semaphore(3)
+            trees = [
+                AsyncTree(root, "aur", concurrency=4, semaphore=semaphore)
+                for root in ("a", "b")
+            ]
+            await asyncio.gather(*(tree.set_size(5) for tree in trees))
+
+        asyncio.run(generate_both())
+        assert most_in_flight == 3
+
+    def test_error(self, session_mocker: MockFixture) -> None:
+        """Errors from the repository are raised, cancelling other requests."""
+        session_mocker.stopall()
+
+        async def online_async(name: str) -> Dict[str, str]:
+            if name == "b":
+                raise KeyError(name)
+            return self.DEPENDENCIES[name]
+
+        session_mocker.patch(
+            "depythel.repository.homebrew.online_async", new=online_async
+        )
+        example = AsyncTree("a", "homebrew")
+        with pytest.raises(KeyError):
+            asyncio.run(example.set_size(5))
+
+    def test_retry(self, session_mocker: MockFixture) -> None:
+        """Projects that fail to be fetched are retried, rather than skipped."""
+        session_mocker.stopall()
+        failures = {"b"}
+
+        async def online_async(name: str) -> Dict[str, str]:
+            if name in failures:
+                failures.remove(name)
+                raise KeyError(name)
+            return self.DEPENDENCIES[name]
+
+        session_mocker.patch(
+            "depythel.repository.homebrew.online_async", new=online_async
+        )
+        example = AsyncTree("a", "homebrew")
+        with pytest.raises(KeyError):
+            asyncio.run(example.set_size(5))
+        assert not example.exhausted
+        asyncio.run(example.set_size(5))
+        assert tuple(example.tree) == ("a", "b", "c", "d", "e")
+        assert example.exhausted
+
+    def test_invalid(self) -> None:
+        """Invalid arguments are rejected before anything is fetched."""
+        with pytest.raises(AttributeError):
+            AsyncTree("a", "macports", concurrency=0)
+        with pytest.raises(ModuleNotFoundError):
+            AsyncTree("a", "I_dont_exist")
+        with pytest.raises(ValueError):
+            AsyncTree("a", "macports", traversal="random")
+
+
+class TestForest:
+    DEPENDENCIES: Dict[str, Dict[str, str]] = {
+        "a": {"c": "lib"},
+        "b": {"c": "lib", "d": "build"},
+        "c": {"e": "lib"},
+        "d": {},
+        "e": {},
+    }
+
+    def test_shared(self, session_mocker: MockFixture) -> None:
+        """Projects shared between roots are only fetched once."""
+        session_mocker.stopall()
+        online = session_mocker.patch(
+            "depythel.repository.macports.online",
+            side_effect=lambda name: self.DEPENDENCIES[name],
+        )
+        example = Forest(["a", "b", "a"], "macports")
+        assert example.roots == ["a", "b"]
+        assert tuple(example.tree) == ("a", "b", "c", "d", "e")
+        assert example.size == 5
+        assert sorted(call.args[0] for call in online.call_args_list) == list("abcde")
+
+        subtree = example.subtree("b")
+        assert subtree.root == "b"
+        assert subtree.tree == {
+            "b": {"c": "lib", "d": "build"},
+            "c": {"e": "lib"},
+            "d": {},
+            "e": {},
+        }
+        # Dependencies are shared rather than copied
+        assert subtree.tree["c"] is example.tree["c"]
+        assert example.subtree("a").topological_sort() == deque(["e", "c", "a"])
+
+    def test_size(self, session_mocker: MockFixture) -> None:
+        """The size limits the combined tree, leaving unfetched children."""
+        session_mocker.stopall()
+        session_mocker.patch(
+            "depythel.repository.macports.online",
+            side_effect=lambda name: self.DEPENDENCIES[name],
+        )
+        example = Forest(["a", "b"], "macports", 3)
+        assert tuple(example.tree) == ("a", "b", "c")
+        assert example.subtree("a").tree == {"a": {"c": "lib"}, "c": {"e": "lib"}}
+        with pytest.raises(KeyError):
+            example.subtree("d")
+
+    def test_view(self, session_mocker: MockFixture) -> None:
+        """Subtrees are views of the combined tree, so they see later fetches."""
+        session_mocker.stopall()
+        session_mocker.patch(
+            "depythel.repository.macports.online",
+            side_effect=lambda name: self.DEPENDENCIES[name],
+        )
+        example = Forest(["a", "b"], "macports", 3)
+        subtree = example.subtree("b").tree
+        assert not isinstance(subtree, dict)
+        assert list(subtree) == ["b", "c"]
+        assert "a" not in subtree
+        with pytest.raises(KeyError):
+            subtree["a"]  # pylint: disable=pointless-statement
+        example.set_size(5)
+        assert list(subtree) == ["b", "c", "d", "e"]
+        assert len(subtree) == 4
+        assert subtree["e"] is example.tree["e"]
+
+    def test_no_roots(self) -> None:
+        """At least one root is needed."""
+        with pytest.raises(AttributeError):
+            Forest([], "macports")
+
+
+class TestBudgets:
+    DEPENDENCIES: Dict[str, Dict[str, str]] = {
+        "a": {"b": "lib", "c": "build"},
+        "b": {"d": "lib"},
+        "c": {"e": "lib"},
+        "d": {"f": "lib"},
+        "e": {},
+        "f": {},
+    }
+
+    def test_max_depth(self, session_mocker: MockFixture) -> None:
+        """Projects deeper than the maximum depth aren't fetched."""
+        session_mocker.stopall()
+        online = session_mocker.patch(
+            "depythel.repository.macports.online",
+            side_effect=lambda name: self.DEPENDENCIES[name],
+        )
+        for traversal in ("bfs", "dfs", "depth"):
+            example = Tree("a", "macports", 10, traversal=traversal, max_depth=1)
+            assert set(example.tree) == {"a", "b", "c"}
+            assert example.exhausted
+        assert online.call_count == 9
+        assert set(Tree("a", "macports", 10, max_depth=0).tree) == {"a"}
+
+    def test_exclude(self, session_mocker: MockFixture) -> None:
+        """Excluded categories are left out, along with everything under them."""
+        session_mocker.stopall()
+        online = session_mocker.patch(
+            "depythel.repository.macports.online",
+            side_effect=lambda name: self.DEPENDENCIES[name],
+        )
+        example = Tree("a", "macports", 10, exclude=["build"])
+        assert example.tree == {
+            "a": {"b": "lib"},
+            "b": {"d": "lib"},
+            "d": {"f": "lib"},
+            "f": {},
+        }
+        assert online.call_count == 4
+
+    def test_max_requests(self, session_mocker: MockFixture) -> None:
+        """No more requests are made once the budget is used up."""
+        session_mocker.stopall()
+        online = session_mocker.patch(
+            "depythel.repository.macports.online",
+            side_effect=lambda name: self.DEPENDENCIES[name],
+        )
+        for workers in (1, 3):
+            example = Tree("a", "macports", 10, workers=workers, max_requests=2)
+            assert tuple(example.tree) == ("a", "b")
+            assert example.exhausted
+            assert example.requests == 2
+        assert online.call_count == 4
+
+    def test_max_requests_batch(self, session_mocker: MockFixture) -> None:
+        """Each batch only counts as a single request."""
+        session_mocker.stopall()
+        session_mocker.patch(
+            "depythel.repository.aur.online_many",
+            side_effect=lambda names: {name: self.DEPENDENCIES[name] for name in names},
+        )
+        example = Tree("a", "aur", 10, max_requests=2)
+        assert tuple(example.tree) == ("a", "b", "c")
+        assert example.requests == 2
+
+    def test_timeout(self, session_mocker: MockFixture) -> None:
+        """Nothing is fetched once the time is up."""
+        session_mocker.stopall()
+
+        def slow_online(name: str) -> Dict[str, str]:
+            time.sleep(0.05)
+            return self.DEPENDENCIES[name]
+
+        session_mocker.patch(
+            "depythel.repository.macports.online", side_effect=slow_online
+        )
+        example = Tree("a", "macports", 10, timeout=0.08)
+        assert 1 <= len(example.tree) < 6
+        assert example.exhausted
+        concurrent = Tree("a", "macports", 10, workers=2, timeout=0.02)
+        assert len(concurrent.tree) < 6
+        assert concurrent.exhausted
+
+    def test_invalid(self) -> None:
+        """Budgets that can't fetch anything are rejected."""
+        with pytest.raises(AttributeError):
+            Tree("a", "macports", max_depth=-1)
+        with pytest.raises(AttributeError):
+            Tree("a", "macports", max_requests=0)
+
+
+class TestCategoryFilters:
+    TREE = {
+        "a": {"b": "lib", "cmake": "build"},
+        "b": {"a": "build", "c": "run"},
+        "c": {},
+        "cmake": {"c": "lib"},
+    }
+
+    @pytest.mark.parametrize("compact", (False, True))
+    def test_exclude(self, compact: bool) -> None:
+        """Excluded edges are ignored by every algorithm."""
+        example = LocalTree(self.TREE, exclude=["build"])
+        if compact:
+            example = example.compact()
+        # Only dependencies are removed, so cmake is still a project
+        assert example.all_items() == {"a", "b", "c", "cmake"}
+        assert example.cycle_check() is False
+        assert example.topological_sort() == deque(["c", "b", "cmake", "a"])
+        assert example.all_dependencies("a") == {"b", "c"}
+        assert example.all_dependents("c") == {"a", "b", "cmake"}
+        assert LocalTree(self.TREE).cycle_check() is True
+
+    @pytest.mark.parametrize("compact", (False, True))
+    def test_include(self, compact: bool) -> None:
+        """Only included edges are followed."""
+        example = LocalTree(self.TREE, include=["lib", "run"], exclude=["run"])
+        if compact:
+            example = example.compact()
+        assert example.all_dependencies("a") == {"b"}
+        assert list(example.strongly_connected_components()) == [
+            ["b"],
+            ["a"],
+            ["c"],
+            ["cmake"],
+        ]
+
+    def test_disconnected(self) -> None:
+        """Filters don't drop projects that the root doesn't depend on."""
+        tree = {"A": {"B": "lib"}, "X": {"Y": "lib"}, "Y": {"X": "lib"}}
+        assert LocalTree(tree, exclude=["build"]).cycle_check() is True
+        example = LocalTree({"A": {"B": "lib"}, "X": {"Y": "lib"}, "Y": {}}, ["lib"])
+        assert example.topological_sort() == LocalTree(example.tree).topological_sort()
+
+    def test_tree(self, session_mocker: MockFixture) -> None:
+        """Projects only reachable through filtered edges aren't fetched."""
+        session_mocker.stopall()
+        online = session_mocker.patch(
+            "depythel.repository.macports.online",
+            side_effect=lambda name: self.TREE[name],
+        )
+        example = Tree("a", "macports", 10, include=["lib", "run"])
+        assert example.tree == {"a": {"b": "lib"}, "b": {"c": "run"}, "c": {}}
+        assert online.call_count == 3
+
+    def test_forest(self, session_mocker: MockFixture) -> None:
+        """Every root of a filtered forest is kept."""
+        session_mocker.stopall()
+        dependencies = {"A": {"C": "lib"}, "B": {"D": "build"}, "C": {}, "D": {}}
+        session_mocker.patch(
+            "depythel.repository.macports.online",
+            side_effect=lambda name: dependencies[name],
+        )
+        example = Forest(["A", "B"], "macports", exclude=["build"])
+        assert example.tree == {"A": {"C": "lib"}, "B": {}, "C": {}}
+        assert list(example.topological_sort()) == ["C", "B", "A"]
+        assert example.depths() == {"A": 0, "B": 0, "C": 1}
+
+
+class TestGrow:
+    def test_grow(self, session_mocker: MockFixture) -> None:
+        """Projects are added one at a time until the tree is complete."""
+        session_mocker.stopall()
+        dependencies = {"a": {"b": "lib"}, "b": {"c": "lib"}, "c": {}}
+        session_mocker.patch(
+            "depythel.repository.macports.online",
+            side_effect=lambda name: dependencies[name],
+        )
+        tree = Tree("a", "macports")
+        assert tree.grow() == "b"
+        assert tree.size == 2
+        tree.set_size(1)
+        # Shrunk projects are added back without fetching them again
+        assert tree.grow() == "b"
+        assert tree.grow() == "c"
+        assert tree.grow() is None
+        assert tree.tree == dependencies
+
+    def test_iterate(self, session_mocker: MockFixture) -> None:
+        """Iterating fetches projects one at a time, and stops when told to."""
+        session_mocker.stopall()
+        dependencies = {"a": {"b": "lib", "c": "lib"}, "b": {}, "c": {"d": "lib"}}
+        online = session_mocker.patch(
+            "depythel.repository.macports.online",
+            side_effect=lambda name: dependencies.get(name, {}),
+        )
+        tree = Tree("a", "macports")
+        for project, children in tree:
+            if project == "b":
+                assert children == {}
+                break
+        assert online.call_count == 2
+        assert list(tree) == [
+            ("a", {"b": "lib", "c": "lib"}),
+            ("b", {}),
+            ("c", {"d": "lib"}),
+            ("d", {}),
+        ]
+        assert tree.exhausted and tree.size == 4
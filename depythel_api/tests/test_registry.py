@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2021-2022, Haren Samarasinghe
+#
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+#     * Redistributions of source code must retain the above copyright notice,
+#       this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright notice,
+#       this list of conditions and the following disclaimer in the documentation
+#       and/or other materials provided with the distribution.
+#     * Neither the name of seaport nor the names of its contributors
+#       may be used to endorse or promote products derived from this software
+#       without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Tests finding the backends of each repository."""
+
+import json
+import os
+import pathlib
+import subprocess
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+from depythel import registry
+from depythel.registry import Backend, backend, backends, manifest_path
+
+
+@pytest.fixture(autouse=True)
+def fresh_registry(
+    tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+) -> pathlib.Path:
+    """Uses an empty cache directory, and forgets any backends already found."""
+    monkeypatch.setenv("DEPYTHEL_CACHE_DIR", str(tmp_path))
+    monkeypatch.delenv("DEPYTHEL_NO_CACHE", raising=False)
+    monkeypatch.setattr(registry, "_backends", None)
+    return tmp_path / "backends.json"
+
+
+class TestRegistry:
+    def test_builtin(self) -> None:
+        """The built-in backends are found, along with their capabilities."""
+        assert sorted(backends()) == ["aur", "homebrew", "macports"]
+        aur = backend("aur")
+        assert aur.module == "depythel.repository.aur"
+        assert aur.supports("batch") and aur.supports("async")
+        assert not aur.supports("index")
+        assert backend("macports").supports("index")
+        assert "build" in backend("macports").categories
+        with pytest.raises(ModuleNotFoundError):
+            backend("I_dont_exist")
+
+    def test_manifest(
+        self, fresh_registry: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        """Backends are read from the manifest, without finding them again."""
+        found = backends()
+        assert json.loads(fresh_registry.read_text())["backends"][0]["name"] == "aur"
+        monkeypatch.setattr(registry, "_backends", None)
+
+        def fail() -> None:
+            raise AssertionError("The backends were found again")
+
+        monkeypatch.setattr(registry, "_discover", fail)
+        assert backends() == found
+
+    def test_outdated_manifest(
+        self, fresh_registry: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        """The manifest is rebuilt once packages are installed or removed."""
+        backends()
+        manifest = json.loads(fresh_registry.read_text())
+        manifest["fingerprint"][1] = "0.0.0"
+        manifest["backends"] = []
+        fresh_registry.write_text(json.dumps(manifest))
+        monkeypatch.setattr(registry, "_backends", None)
+        assert "aur" in backends()
+        fresh_registry.write_text("not json")
+        assert "aur" in backends(refresh=True)
+
+    def test_entry_points(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        """Other packages can register backends, but not replace the built-in ones."""
+        monkeypatch.setattr(
+            registry,
+            "_entry_points",
+            lambda: [
+                SimpleNamespace(name="ports", value="depythel.repository.macports"),
+                SimpleNamespace(name="aur", value="elsewhere.aur"),
+                SimpleNamespace(name="broken", value="depythel.I_dont_exist:online"),
+            ],
+        )
+        found = backends(refresh=True)
+        assert found["ports"] == Backend(
+            "ports",
+            "depythel.repository.macports",
+            found["macports"].capabilities,
+            found["macports"].categories,
+        )
+        assert found["aur"].module == "depythel.repository.aur"
+        assert "broken" not in found
+
+    def test_no_cache(
+        self, fresh_registry: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        """DEPYTHEL_NO_CACHE stops the manifest being stored."""
+        monkeypatch.setenv("DEPYTHEL_NO_CACHE", "1")
+        assert manifest_path() is None
+        assert "aur" in backends()
+        assert not fresh_registry.exists()
+
+    def test_built_in_changed(
+        self, tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        """Adding or editing a built-in backend outdates the manifest."""
+        built_in = tmp_path / "repository"
+        built_in.mkdir()
+        (built_in / "aur.py").write_text("def online(name): pass\n")
+        monkeypatch.setattr(registry, "_BUILT_IN", str(built_in))
+        fingerprint = registry._fingerprint()
+        (built_in / "nixpkgs.py").write_text("def online(name): pass\n")
+        assert registry._fingerprint() != fingerprint
+        fingerprint = registry._fingerprint()
+        (built_in / "aur.py").write_text("def online_renamed(name): pass\n")
+        assert registry._fingerprint() != fingerprint
+
+    def test_working_directory(
+        self, tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        """Adding files to the working directory doesn't outdate the manifest."""
+        working = tmp_path / "working"
+        working.mkdir()
+        monkeypatch.chdir(working)
+        monkeypatch.setattr(sys, "path", ["", "relative", *sys.path])
+        fingerprint = registry._fingerprint()
+        (working / "notes.txt").write_text("")
+        os.utime(working, (0, 0))
+        assert registry._fingerprint() == fingerprint
+
+    def test_source_changed(
+        self, tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        """Editing the module a backend was found from outdates the manifest."""
+        source = tmp_path / "backend.py"
+        source.write_text("def online(name): pass\n")
+        old = Backend("nixpkgs", "backend", ("online",), ())
+        monkeypatch.setattr(
+            registry, "_discover", lambda: ({"nixpkgs": old}, [str(source)])
+        )
+        assert backends()["nixpkgs"] == old
+
+        new = old._replace(capabilities=("online", "batch"))
+        monkeypatch.setattr(
+            registry, "_discover", lambda: ({"nixpkgs": new}, [str(source)])
+        )
+        monkeypatch.setattr(registry, "_backends", None)
+        assert backends()["nixpkgs"] == old
+        source.write_text("def online(name): pass\ndef online_many(names): pass\n")
+        monkeypatch.setattr(registry, "_backends", None)
+        assert backends()["nixpkgs"] == new
+
+    def test_no_sqlite(self) -> None:
+        """Reading the manifest doesn't import sqlite3, which slows down completion."""
+        script = (
+            "import sys, depythel.registry as r; r.backends(); "
+            "print('sqlite3' in sys.modules)"
+        )
+        # The first run writes the manifest, and the second reads it
+        outputs = [
+            subprocess.run(
+                [sys.executable, "-c", script],
+                capture_output=True,
+                text=True,
+                check=True,
+            ).stdout.strip()
+            for _ in range(2)
+        ]
+        assert outputs == ["True", "False"]
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2021-2022, Haren Samarasinghe
+#
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+#     * Redistributions of source code must retain the above copyright notice,
+#       this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright notice,
+#       this list of conditions and the following disclaimer in the documentation
+#       and/or other materials provided with the distribution.
+#     * Neither the name of seaport nor the names of its contributors
+#       may be used to endorse or promote products derived from this software
+#       without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Tests parsing large JSON documents incrementally."""
+
+import io
+import json
+import pathlib
+import tracemalloc
+
+import pytest
+
+from depythel._streaming import CHUNK_SIZE, iter_array, iter_object
+
+EXAMPLE = [
+    {"name": f"formula{i}", "desc": "é" * i, "deps": [1.5, None]} for i in range(50)
+]
+
+
+@pytest.mark.parametrize("chunk_size", (1, 3, 64, 65536))
+def test_chunk_boundaries(chunk_size: int) -> None:
+    """Items, numbers and multibyte characters can be split across chunks."""
+    document = json.dumps(EXAMPLE, ensure_ascii=False).encode()
+    assert list(iter_array(io.BytesIO(document), chunk_size)) == EXAMPLE
+    assert list(iter_array(io.BytesIO(b"[12345, 678]"), chunk_size)) == [12345, 678]
+    assert list(iter_array(io.BytesIO(b" [ ] "), chunk_size)) == []
+
+
+@pytest.mark.parametrize("document", (b"{}", b"[1, 2", b"[1 2]", b"[1,]", b""))
+def test_invalid(document: bytes) -> None:
+    """Anything other than a complete JSON array is rejected."""
+    with pytest.raises(json.JSONDecodeError):
+        list(iter_array(io.BytesIO(document), 2))
+
+
+def test_bounded_memory(tmp_path: pathlib.Path) -> None:
+    """The whole document is never held in memory at once."""
+    path = tmp_path / "formula.json"
+    with path.open("w") as index_file:
+        index_file.write("[")
+        index_file.write(
+            ",".join(
+                json.dumps({"name": str(i), "desc": "x" * 500}) for i in range(20000)
+            )
+        )
+        index_file.write("]")
+
+    tracemalloc.start()
+    with path.open("rb") as index_file:
+        count = sum(1 for _ in iter_array(index_file))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    assert count == 20000
+    # The document itself is over 10MB
+    assert peak < path.stat().st_size / 10
+
+
+@pytest.mark.parametrize("chunk_size", (1, 3, 65536))
+def test_object(chunk_size: int) -> None:
+    """Keys and values of objects are yielded in pairs."""
+    tree = {f"project{i}": {"é" * i: "build", "b": "lib"} for i in range(20)}
+    document = json.dumps(tree, ensure_ascii=False).encode()
+    assert dict(iter_object(io.BytesIO(document), chunk_size)) == tree
+    assert list(iter_object(io.BytesIO(b" { } "), chunk_size)) == []
+
+
+@pytest.mark.parametrize(
+    "document", (b"[]", b'{"a" 1}', b'{"a": 1 "b": 2}', b"{1: 2}", b'{"a"}', b'{"a": 1')
+)
+def test_invalid_object(document: bytes) -> None:
+    """Anything other than a complete JSON object is rejected."""
+    with pytest.raises(json.JSONDecodeError):
+        list(iter_object(io.BytesIO(document), 2))
+
+
+@pytest.mark.parametrize("number", ("1.5", "-2.25e+10", "1E5", "120"))
+def test_number_boundary(number: str) -> None:
+    """Numbers split across two chunks are read in full."""
+    for split in range(1, len(number)):
+        # The first chunk ends part way through the number
+        padding = "a" * (CHUNK_SIZE - split - len('["", '))
+        document = f'["{padding}", {number}]'.encode()
+        assert list(iter_array(io.BytesIO(document))) == [padding, json.loads(number)]
@@ -31,40 +31,240 @@
 """General helper functions for managing the Click CLT."""
 
 import ast
+import io
+import json
 import logging
 import os.path
-import pkgutil
-from typing import Any, Optional
+import sys
+from typing import IO, Any, Callable, Optional, TypeVar, Union
 
 import click
 from beartype import beartype
 from click import Argument, Context
 
-from depythel import repository
-from depythel._utility_imports import ListType
+from depythel._streaming import CHUNK_SIZE, iter_object
+from depythel._utility_imports import AnyTree, DictType, ListType
+from depythel.compact import MAGIC, CompactTree
+from depythel.registry import backends
 
 log = logging.getLogger(__name__)
 
 
+def _rich_main(
+    main: Callable[..., Any], standalone_mode: bool, *args: Any, **kwargs: Any
+) -> Any:
+    """Runs a command, formatting any errors with rich-click."""
+    try:
+        return main(*args, standalone_mode=False, **kwargs)
+    except click.ClickException as error:
+        if not standalone_mode:
+            raise
+        from rich_click.rich_click import (  # pylint: disable=import-outside-toplevel
+            rich_format_error,
+        )
+
+        rich_format_error(error)
+        sys.exit(error.exit_code)
+    except click.exceptions.Abort:
+        if not standalone_mode:
+            raise
+        from rich_click.rich_click import (  # pylint: disable=import-outside-toplevel
+            rich_abort_error,
+        )
+
+        rich_abort_error()
+        sys.exit(1)
+
+
+def _rich_format_help(
+    command: click.Command, ctx: Context, formatter: click.HelpFormatter
+) -> None:
+    """Formats help text with rich-click."""
+    from rich_click.rich_click import (  # pylint: disable=import-outside-toplevel
+        rich_format_help,
+    )
+
+    rich_format_help(command, ctx, formatter)
+
+
+# rich-click (and rich) take a while to import, and are only needed for help and
+# errors. These behave like rich_click.RichCommand and rich_click.RichGroup, but
+# only import rich-click once they're needed.
+class RichCommand(click.Command):
+    """A command whose help and errors are formatted by rich-click."""
+
+    def main(self, *args: Any, standalone_mode: bool = True, **kwargs: Any) -> Any:
+        """Runs the command, formatting any errors with rich-click."""
+        return _rich_main(super().main, standalone_mode, *args, **kwargs)
+
+    def format_help(self, ctx: Context, formatter: click.HelpFormatter) -> None:
+        """Formats help text with rich-click."""
+        _rich_format_help(self, ctx, formatter)
+
+
+class RichGroup(click.Group):
+    """A group of commands whose help and errors are formatted by rich-click."""
+
+    command_class = RichCommand
+
+    def main(self, *args: Any, standalone_mode: bool = True, **kwargs: Any) -> Any:
+        """Runs the group, formatting any errors with rich-click."""
+        return _rich_main(super().main, standalone_mode, *args, **kwargs)
+
+    def format_help(self, ctx: Context, formatter: click.HelpFormatter) -> None:
+        """Formats help text with rich-click."""
+        _rich_format_help(self, ctx, formatter)
+
+
 @beartype
 def repository_complete(
     _ctx: Context, _args: Argument, incomplete: str
 ) -> ListType[str]:
     """Provides autocomplete for supported repositories."""
-    # Based on https://stackoverflow.com/a/1310912
-    pkgpath = os.path.dirname(
-        repository.__file__
-    )  # Path to __init__.py of depythel.repository
-    all_options = (name for _, name, _ in pkgutil.iter_modules([pkgpath]))
-    return [option for option in all_options if incomplete in option]
+    # Uses the manifest of backends, so nothing needs to be imported or scanned
+    return [option for option in backends() if incomplete in option]
+
+
+@beartype
+def validate_repository(
+    _ctx: Optional[Context], _param: Optional[click.core.Parameter], value: str
+) -> str:
+    """Checks that a repository is supported, before anything is fetched."""
+    if value not in backends():
+        raise click.BadParameter(
+            f"{value} isn't supported. Choose from {', '.join(backends())}."
+        )
+    return value
+
+
+class _RawStream(io.RawIOBase):
+    """Adapts any binary stream (e.g. stdin under click's test runner) for buffering."""
+
+    def __init__(self, stream: IO[bytes]) -> None:
+        """Wraps a binary stream, so io.BufferedReader can peek at it."""
+        super().__init__()
+        self._stream = stream
+        # Everything read so far, so that the stream can be parsed again.
+        self.recording: Optional[bytearray] = bytearray()
+
+    def replay(self) -> bytes:
+        """Everything in the stream, including what has already been read."""
+        return bytes(self.recording or b"") + self._stream.read()
+
+    def readable(self) -> bool:
+        """The stream can always be read from."""
+        return True
+
+    def readinto(self, buffer: Any) -> int:
+        """Reads up to the size of the buffer into it."""
+        data = self._stream.read(len(buffer))
+        buffer[: len(data)] = data
+        if self.recording is not None:
+            self.recording += data
+        return len(data)
+
+
+def read_tree(stream: IO[bytes]) -> Union[AnyTree, CompactTree]:
+    """Reads a tree, detecting the format it's in.
+
+    The supported formats are:
+
+    - Binary trees from depythel generate --format binary, used without parsing.
+    - JSON objects, e.g. {"a": "b"}, which are parsed incrementally.
+    - NDJSON edge lists, with one ["project", "dependency", "category"] edge per
+      line. The category is left out in standard trees, and projects without
+      dependencies are listed on their own, e.g. ["project"]. Lines can also be
+      records of a project and all of its dependencies, e.g. ["a", {"b": "lib"}].
+    - Python dictionaries, e.g. {'a': 'b'}, as accepted by previous versions. Objects
+      that aren't valid JSON (e.g. {"a": 'b'}) are parsed again as a dictionary,
+      so the stream is kept in memory while a JSON object is being parsed.
+
+    Args:
+        stream: The tree, opened in binary mode.
+
+    Returns:
+        The tree that was read.
+
+    Raises:
+        ValueError: The tree isn't in any of the supported formats.
+    """
+    raw = _RawStream(stream)
+    reader = io.BufferedReader(raw, CHUNK_SIZE)
+    while True:
+        head = reader.peek(len(MAGIC))
+        stripped = head.lstrip()
+        if stripped or not head:
+            break
+        reader.read(len(head))
+    reader.read(len(head) - len(stripped))
+    head = reader.peek(len(MAGIC))
+
+    # Only JSON objects might need to be parsed again
+    if not head.startswith(b"{") or head[1:].lstrip().startswith(b"'"):
+        raw.recording = None
+    if head.startswith(MAGIC):
+        return CompactTree.from_bytes(reader.read())
+    if head.startswith(b"["):
+        return _read_edges(reader)
+    if raw.recording is not None:
+        try:
+            tree = dict(iter_object(reader))
+        except json.JSONDecodeError:
+            # e.g. a Python dictionary with a double quoted first key
+            text = raw.replay()
+        else:
+            raw.recording = None
+            return tree
+    else:
+        text = reader.read()
+    try:
+        return ast.literal_eval(text.decode().strip())  # type: ignore[no-any-return]
+    except SyntaxError as error:
+        raise ValueError(str(error)) from error
+
+
+def _read_edges(lines: IO[bytes]) -> AnyTree:
+    """Builds a tree from an NDJSON edge list."""
+    standard: DictType[str, str] = {}
+    descriptive: DictType[str, DictType[str, str]] = {}
+    for number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        edge = json.loads(line)
+        if (
+            isinstance(edge, list)
+            and len(edge) == 2
+            and isinstance(edge[0], str)
+            and isinstance(edge[1], dict)
+        ):
+            # A record of a project and all of its dependencies
+            descriptive.setdefault(edge[0], {}).update(edge[1])
+            continue
+        if (
+            not isinstance(edge, list)
+            or not 1 <= len(edge) <= 3
+            or not all(isinstance(name, str) for name in edge)
+        ):
+            raise ValueError(f"Line {number} isn't a valid edge.")
+        if len(edge) == 2:
+            standard[edge[0]] = edge[1]
+            continue
+        dependencies = descriptive.setdefault(edge[0], {})
+        if len(edge) == 3:
+            dependencies[edge[1]] = edge[2]
+    if standard and descriptive:
+        raise ValueError("Edges must all have a category, or none of them.")
+    return standard or descriptive
 
 
-# TODO: Allow passing in a json file containing the tree
 class TreeType(click.ParamType):
     """Parses the user's tree from the command line.
 
     e.g. Turns an input of '{"a": "b", "b": "a"}' into {"a": "b", "b": "a"}
 
+    A path to a file containing a tree can also be given, in any format supported by
+    read_tree. Binary tree files are memory mapped rather than read.
+
     Based on https://click.palletsprojects.com/en/8.0.x/parameters/#implementing-custom-types
     """
 
@@ -80,18 +280,72 @@ class TreeType(click.ParamType):
     ) -> Any:
         """Parses the user's string into a dictionary, and errors out if it's not possible."""
         try:
-            return ast.literal_eval(value)
-        # TODO: Check if other errors can be raised
-        except (SyntaxError, ValueError):
-            self.fail(
-                f"{value} is an invalid tree.",
-                param,
-                ctx,
-            )
+            if not os.path.isfile(value):
+                return read_tree(io.BytesIO(value.encode()))
+            with open(value, "rb") as file:
+                if file.read(len(MAGIC)) != MAGIC:
+                    file.seek(0)
+                    return read_tree(file)
+            return CompactTree.load(value)
+        except ValueError as error:
+            self.fail(f"{value} is an invalid tree: {error}", param, ctx)
 
 
 TREE_TYPE = TreeType()
 
+OUTPUT_FORMATS = ("pretty", "json", "ndjson", "records", "binary")
+
+
+class TreeWriter:
+    """Outputs a tree one project at a time, as soon as each project is fetched."""
+
+    def __init__(self, output_format: str) -> None:
+        """Outputs a tree one project at a time, as soon as each project is fetched.
+
+        The json and ndjson formats are written incrementally. The pretty (highlighted
+        JSON) and binary formats need the whole tree, so are written on close.
+
+        Args:
+            output_format: One of OUTPUT_FORMATS. The ndjson (one line per edge)
+                and records (one line per project) formats are accepted by read_tree.
+        """
+        self.output_format = output_format
+        """str: The format the tree is written in."""
+
+        self._tree: DictType[str, Any] = {}
+        self._started = False
+
+    def write(self, project: str, dependencies: Union[str, DictType[str, str]]) -> None:
+        """Outputs a project and its dependencies."""
+        if self.output_format == "json":
+            separator = "," if self._started else "{"
+            value = json.dumps(dependencies, separators=(",", ":"))
+            click.echo(f"{separator}{json.dumps(project)}:{value}", nl=False)
+        elif self.output_format == "ndjson":
+            if isinstance(dependencies, str):
+                edges = [[project, dependencies]]
+            else:
+                edges = [[project, *edge] for edge in dependencies.items()]
+            # Projects without dependencies are still listed
+            click.echo("\n".join(json.dumps(edge) for edge in edges or [[project]]))
+        elif self.output_format == "records":
+            click.echo(json.dumps([project, dependencies]))
+        else:
+            self._tree[project] = dependencies
+        self._started = True
+
+    def close(self) -> None:
+        """Finishes outputting the tree."""
+        if self.output_format == "json":
+            click.echo("}" if self._started else "{}")
+        elif self.output_format == "pretty":
+            import rich  # pylint: disable=import-outside-toplevel
+
+            # Unlike API, output in a visual format
+            rich.print_json(data=self._tree)
+        elif self.output_format == "binary":
+            click.get_binary_stream("stdout").write(CompactTree(self._tree).to_bytes())
+
 
 @beartype
 def support_pipe(
@@ -103,10 +357,35 @@ def support_pipe(
     # Based on https://github.com/pallets/click/issues/1370#issuecomment-522549260
     if not value and not click.get_text_stream("stdin").isatty():
         # Piped input (and maybe stdin input)
-        user_input = click.get_text_stream("stdin").read().strip()
+        stdin = click.get_binary_stream("stdin")
         if param is not None and param.human_readable_name == "TREE":
-            return TREE_TYPE.convert(user_input, None, None)
-        return user_input
+            # Parse the tree as it arrives, rather than reading it all first
+            try:
+                return read_tree(stdin)
+            except ValueError as error:
+                raise click.BadParameter(
+                    f"The piped input is an invalid tree: {error}", param=param
+                ) from error
+        return stdin.read().decode().strip()
     # No input provided
     # TODO: Are there other ways to reach this?
     return value
+
+
+_Command = TypeVar("_Command", bound=Callable[..., Any])
+
+
+def category_options(command: _Command) -> _Command:
+    """Adds --include and --exclude options for filtering dependency categories."""
+    command = click.option(
+        "--exclude",
+        multiple=True,
+        metavar="CATEGORY",
+        help="Ignore dependencies in this category (e.g. build). Can be repeated.",
+    )(command)
+    return click.option(
+        "--include",
+        multiple=True,
+        metavar="CATEGORY",
+        help="Only follow dependencies in this category (e.g. run). Can be repeated.",
+    )(command)
@@ -30,31 +30,50 @@
 
 """The main functionality behind the depythel CLT."""
 
-# N.B. could instead be "from networkx import DiGraph"
-# networkx.classes used to make mypy happy
-
 import logging
+import os
+import sys
+from typing import Optional, TextIO, Union
 
-import rich
-import rich_click as click
+import click
 from beartype import beartype
-from networkx.classes.digraph import DiGraph
-from pyvis.network import Network
+from beartype.typing import Tuple
 
 from depythel import __version__
 from depythel._utility_imports import AnyTree
-from depythel.main import LocalTree, Tree
-from depythel_clt._click_modules import TREE_TYPE, repository_complete, support_pipe
+from depythel.compact import CompactTree
+from depythel.export import pyvis_edges, pyvis_nodes, write_dot, write_graphml
+from depythel.main import TRAVERSALS, CycleError, Forest, LocalTree, Tree
+from depythel_clt._click_modules import (
+    OUTPUT_FORMATS,
+    TREE_TYPE,
+    RichGroup,
+    TreeWriter,
+    category_options,
+    repository_complete,
+    support_pipe,
+    validate_repository,
+)
 
 log = logging.getLogger(__name__)
 
+# Binary trees are loaded as a CompactTree rather than a dictionary
+InputTree = Union[AnyTree, CompactTree]
 
-@click.group()
+
+@click.group(cls=RichGroup)
 @click.version_option(__version__)
 def depythel() -> None:
     """Interdependency Visualiser and Dependency Hell scrutiniser."""
 
 
+# Graphs with more projects than this are laid out ahead of time by default
+LARGE_GRAPH = 1000
+
+# The output formats of visualise, by file extension
+GRAPH_FORMATS = {".dot": "dot", ".gv": "dot", ".graphml": "graphml"}
+
+
 # TODO: Improve optional dependency management
 # TODO: Set size of graph to the whole window
 @click.argument("tree", callback=support_pipe, required=False, type=TREE_TYPE)
@@ -62,43 +81,107 @@ def depythel() -> None:
     "path",
     type=click.Path(dir_okay=False, writable=True),
 )
+@click.option(
+    "--layout",
+    "layout_mode",
+    default="auto",
+    show_default=True,
+    type=click.Choice(["auto", "physics", "layered"]),
+    help="physics simulates the graph in the browser, while layered positions "
+    "projects in advance, which stays responsive for large graphs. auto uses "
+    f"layered for graphs with more than {LARGE_GRAPH} projects.",
+)
+@click.option(
+    "--format",
+    "output_format",
+    type=click.Choice(["html", "dot", "graphml"]),
+    help="Write an html page, or a graph for other tools in the DOT language (e.g. "
+    "Graphviz) or GraphML (e.g. Gephi). Defaults to the extension of PATH, or html.",
+)
+@click.option(
+    "--collapse-depth",
+    type=click.IntRange(min=0),
+    help="In the layered layout, collapse projects deeper than this into a single "
+    "node with their ancestor.",
+)
+@click.option(
+    "--collapse-cycles/--keep-cycles",
+    default=True,
+    show_default=True,
+    help="In the layered layout, whether to show projects in a cycle as one node.",
+)
 @depythel.command()
 @beartype
-def visualise(path: str, tree: AnyTree) -> None:
+def visualise(
+    path: str,
+    tree: InputTree,
+    layout_mode: str,
+    output_format: Optional[str],
+    collapse_depth: Optional[int],
+    collapse_cycles: bool,
+) -> None:
     """Generates an html file visualising a dependency graph.
 
     TREE is the tree to visualise in the form of an adjacency list/dictionary.
 
     PATH shows the path to an html file to store the visualisation of the output.
     e.g. /Users/example/Downloads/tree.html
+
+    Projects are coloured by how far they are from the root of TREE.
     """
-    # Use digraph instead of tree in case of cycles
-    graph = DiGraph(tree)
+    tree_object = LocalTree(tree)
+    if output_format is None:
+        output_format = GRAPH_FORMATS.get(os.path.splitext(path)[1].lower(), "html")
+    if output_format != "html":
+        writer = write_dot if output_format == "dot" else write_graphml
+        with open(path, "w", encoding="utf-8") as graph_file:
+            writer(tree_object, graph_file)
+        return
 
-    network = Network(directed=True)
-    network.from_nx(graph)
+    if layout_mode == "auto":
+        large = len(tree_object.all_items()) > LARGE_GRAPH
+        layout_mode = "layered" if large else "physics"
+
+    if layout_mode == "layered":
+        layout = tree_object.layout(collapse_depth, collapse_cycles)
+        with open(path, "w", encoding="utf-8") as html_file:
+            html_file.write(layout.to_html(f"{tree_object.root} - depythel"))
+        click.launch(path, locate=True)
+        return
 
-    # Changes to root node
-    network.nodes[0]["size"] = 20
-    network.nodes[0]["color"] = "#00ff1e"
-    # TODO: Different colour depending on how far away from root node
-    # example in docs https://pyvis.readthedocs.io/en/latest/tutorial.html
+    # pyvis (via IPython) takes a while to import, so only import it when it's used
+    from pyvis.network import Network  # pylint: disable=import-outside-toplevel
+
+    # Set the nodes and edges directly, since adding them one at a time checks
+    # for duplicates in a list, which takes quadratic time
+    network = Network(directed=True)
+    network.nodes = list(pyvis_nodes(tree_object))
+    network.node_ids = [node["id"] for node in network.nodes]
+    network.node_map = {node["id"]: node for node in network.nodes}
+    network.edges = list(pyvis_edges(tree_object))
 
     network.show(path)
     click.launch(path, locate=True)
 
 
 @click.argument("tree", callback=support_pipe, required=False, type=TREE_TYPE)
+@category_options
 @depythel.command()
 @beartype
-def topological(tree: AnyTree) -> None:
+def topological(
+    tree: InputTree, include: Tuple[str, ...], exclude: Tuple[str, ...]
+) -> None:
     """Determines an order in which dependencies can be installed.
 
     TREE is a directed acyclic graph representing a dependency tree.
 
     """
-    tree_object = LocalTree(tree)
-    for item in tree_object.topological_sort():
+    tree_object = LocalTree(tree, include or None, exclude)
+    try:
+        ordering = tree_object.topological_sort()
+    except CycleError as error:
+        raise click.ClickException(str(error)) from error
+    for item in ordering:
         click.echo(item)
 
 
@@ -107,31 +190,211 @@ def topological(tree: AnyTree) -> None:
 @click.option(
     "--first/--all",
     default=True,
-    help="--first halts after the first cycle is found (default). --all generates all cycles.",
+    help="--first halts after the first cycle is found (default). --all lists every "
+    "cycle, one per line, before the result.",
 )
+@category_options
 @depythel.command()
 @beartype
-def cycle(tree: AnyTree, first: bool) -> None:
-    """Perform a level-order traversal of TREE looking for any cycles."""
-    tree_object = LocalTree(tree)
-    click.echo(tree_object.cycle_check(first))
+def cycle(
+    tree: InputTree, first: bool, include: Tuple[str, ...], exclude: Tuple[str, ...]
+) -> None:
+    """Checks TREE for any cycles.
+
+    With --all, each cycle is listed as it's found, e.g. a -> b -> a.
+
+    """
+    tree_object = LocalTree(tree, include or None, exclude)
+    if first:
+        click.echo(tree_object.cycle_check())
+        return
+    found = False
+    # Listed lazily, since large graphs can have a lot of cycles
+    for cycle_projects in tree_object.cycles():
+        found = True
+        click.echo(" -> ".join([*cycle_projects, cycle_projects[0]]))
+    click.echo(found)
 
 
 # TODO: Figure out how to deal with invalid project name.
 # Might be better to deal with at the API level first.
 # click.secho("👀 Cannot find project", fg="red", err=True)
-@click.argument("number", type=int)
-@click.argument("repository", shell_complete=repository_complete)
-@click.argument("name")
+@click.argument("number", type=click.IntRange(min=1))
+@click.argument(
+    "repository", callback=validate_repository, shell_complete=repository_complete
+)
+@click.argument("names", metavar="NAME...", nargs=-1)
+@click.option(
+    "--roots-file",
+    type=click.File(),
+    help="Also generate trees for the projects listed in a file (one per line).",
+)
+@click.option(
+    "--workers",
+    default=1,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help="How many projects to fetch from REPOSITORY at the same time.",
+)
+@click.option(
+    "--index",
+    "index_path",
+    type=click.Path(exists=True, dir_okay=False),
+    help="Look up projects in an offline index created by depythel index.",
+)
+@click.option(
+    "--traversal",
+    default="bfs",
+    show_default=True,
+    type=click.Choice(TRAVERSALS),
+    help="The order to fetch projects in: level by level (bfs), as deep as possible "
+    "first (dfs) or level by level alphabetically (depth).",
+)
+@click.option(
+    "--max-depth",
+    type=click.IntRange(min=0),
+    help="Only fetch projects up to this many levels below NAME.",
+)
+@click.option(
+    "--max-requests",
+    type=click.IntRange(min=1),
+    help="Stop after making this many requests to REPOSITORY.",
+)
+@click.option(
+    "--timeout",
+    type=click.FloatRange(min=0),
+    help="Stop fetching projects after this many seconds.",
+)
+@click.option(
+    "--format",
+    "output_format",
+    type=click.Choice(OUTPUT_FORMATS),
+    help="How to output the tree: highlighted JSON (pretty), compact JSON, NDJSON "
+    "edges, NDJSON records of each project, or a binary format which the other "
+    "commands read much faster. Defaults to pretty in a terminal, otherwise json. "
+    "json, ndjson and records are written as each project is fetched.",
+)
+@click.option(
+    "--stream",
+    is_flag=True,
+    help="Output an NDJSON record for each project as soon as it's fetched (the same "
+    "as --format records). Generation stops early if the output is closed.",
+)
+@category_options
 @depythel.command()
 @beartype
-def generate(name: str, repository: str, number: int) -> None:
+def generate(
+    names: Tuple[str, ...],
+    repository: str,
+    number: int,
+    roots_file: Optional[TextIO],
+    workers: int,
+    index_path: Optional[str],
+    traversal: str,
+    max_depth: Optional[int],
+    max_requests: Optional[int],
+    timeout: Optional[float],
+    include: Tuple[str, ...],
+    exclude: Tuple[str, ...],
+    output_format: Optional[str],
+    stream: bool,
+) -> None:
     """Outputs a dependency tree in JSON format.
 
     A tree is generated for NAME from REPOSITORY. It generates NUMBER amounts of children.
 
+    If several projects are given, their trees are generated together as one graph,
+    such that shared dependencies are only fetched once. NUMBER is then the size of the
+    combined graph.
+    """
+    roots = list(names)
+    if roots_file is not None:
+        # Blank lines and comments are skipped
+        roots.extend(
+            line.strip()
+            for line in roots_file
+            if line.strip() and not line.lstrip().startswith("#")
+        )
+    if not roots:
+        raise click.UsageError("Missing argument 'NAME...' or option '--roots-file'.")
+
+    if stream:
+        if output_format not in (None, "records"):
+            raise click.UsageError("--stream can't be used with --format.")
+        output_format = "records"
+    elif output_format is None:
+        output_format = "pretty" if click.get_text_stream("stdout").isatty() else "json"
+
+    index = None
+    if index_path is not None:
+        from depythel.index import (  # pylint: disable=import-outside-toplevel
+            OfflineIndex,
+        )
+
+        index = OfflineIndex(index_path)
+    tree_object: Tree
+    # Start with just the root, so each project can be output once it's fetched
+    if len(roots) == 1:
+        tree_object = Tree(
+            roots[0],
+            repository,
+            1,
+            workers,
+            index,
+            traversal,
+            max_depth=max_depth,
+            max_requests=max_requests,
+            timeout=timeout,
+            include=include or None,
+            exclude=exclude,
+        )
+    else:
+        tree_object = Forest(
+            roots,
+            repository,
+            1,
+            workers,
+            index,
+            traversal,
+            max_depth=max_depth,
+            max_requests=max_requests,
+            timeout=timeout,
+            include=include or None,
+            exclude=exclude,
+        )
+    writer = TreeWriter(output_format)
+    # TODO: Would be nice to get a progress bar.
+    try:
+        for count, (project, dependencies) in enumerate(tree_object, start=1):
+            writer.write(project, dependencies)
+            if count == number:
+                break
+        writer.close()
+    except BrokenPipeError:
+        # The reader stopped early (e.g. head), so there's no need to fetch any more.
+        # Point stdout somewhere harmless so it doesn't fail again when flushed.
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, sys.stdout.fileno())
+
+
+@click.argument("database", type=click.Path(dir_okay=False, writable=True))
+@click.argument("source", type=click.Path(exists=True, dir_okay=False))
+@click.argument(
+    "repository", callback=validate_repository, shell_complete=repository_complete
+)
+@depythel.command()
+@beartype
+def index(repository: str, source: str, database: str) -> None:
+    """Stores a full index of REPOSITORY for offline use.
+
+    SOURCE is a copy of the index (e.g. formula.json from Homebrew or a PortIndex from
+    MacPorts), which is stored in the DATABASE file. Use this with depythel generate
+    --index DATABASE.
     """
-    tree_object = Tree(name, repository, number)
-    tree_object.set_size(number)  # TODO: Would be nice to get a progress bar.
-    # Unlike API, output in a visual format
-    rich.print_json(data=tree_object.tree)
+    from depythel.index import OfflineIndex  # pylint: disable=import-outside-toplevel
+
+    try:
+        count = OfflineIndex(database).ingest_file(repository, source)
+    except (AttributeError, ModuleNotFoundError) as error:
+        raise click.ClickException(str(error)) from error
+    click.echo(f"Stored {count} projects from {repository}")
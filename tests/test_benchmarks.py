@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2021-2022, Haren Samarasinghe
+#
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+#     * Redistributions of source code must retain the above copyright notice,
+#       this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright notice,
+#       this list of conditions and the following disclaimer in the documentation
+#       and/or other materials provided with the distribution.
+#     * Neither the name of seaport nor the names of its contributors
+#       may be used to endorse or promote products derived from this software
+#       without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Tests the benchmark suite, on trees small enough to run quickly."""
+
+import json
+import pathlib
+
+import pytest
+
+from benchmarks.__main__ import main
+from benchmarks.backend import BATCH, SERIAL, serving
+from benchmarks.graphs import GENERATORS
+from benchmarks.suite import BENCHMARKS, compare, load, run
+from depythel.main import LocalTree, Tree
+
+
+@pytest.mark.parametrize("name", GENERATORS)
+def test_graphs(name: str) -> None:
+    """Each tree has the requested size, and is the same every time."""
+    graph = GENERATORS[name](200)
+    assert len(graph.tree) == 200
+    assert graph == GENERATORS[name](200)
+    # Every dependency is in the tree, so nothing is left unfinished.
+    assert LocalTree(graph.tree).all_items() <= set(graph.tree)
+    assert graph.target in graph.tree
+    assert LocalTree(graph.tree).cycle_check() == (name == "cycles")
+
+
+def test_backend() -> None:
+    """The synthetic repositories serve the tree, and are removed afterwards."""
+    tree = GENERATORS["dense_dag"](50).tree
+    with serving(tree):
+        assert Tree("p0", SERIAL, 50).tree == tree
+        batched = Tree("p0", BATCH, 50)
+        assert batched.tree == tree
+        assert batched.requests < 50
+    with pytest.raises(ModuleNotFoundError):
+        Tree("p0", SERIAL)
+
+
+def test_run() -> None:
+    """Every benchmark runs, apart from sorting trees with cycles."""
+    results = list(run([20], repeat=2, latency=0))
+    keys = {result.key for result in results}
+    assert len(keys) == len(BENCHMARKS) * len(GENERATORS) - 1
+    assert "topological_sort/cycles/20" not in keys
+    assert all(len(result.seconds) == 2 for result in results)
+    with pytest.raises(ValueError):
+        next(run([20], ["I_dont_exist"]))
+
+
+def test_main(tmp_path: pathlib.Path, capsys: pytest.CaptureFixture[str]) -> None:
+    """Results are stored as JSON, and regressions are reported."""
+    baseline = tmp_path / "baseline.json"
+    arguments = ["--size", "20", "--graph", "chain", "--repeat", "1"]
+    assert main([*arguments, "--latency", "0", "--output", str(baseline)]) == 0
+    latency, results = load(str(baseline))
+    assert latency == 0
+    assert "set_size[serial]/chain/20" in results
+    assert json.loads(baseline.read_text())["results"].keys() == results.keys()
+
+    # Requests that take longer are a regression in set_size.
+    assert main([*arguments, "--latency", "0.01", "--compare", str(baseline)]) == 1
+    output = capsys.readouterr().out
+    assert "used a latency of 0" in output
+    assert "set_size[serial]/chain/20" in output.split("regressions")[1]
+    assert compare({"a": 1.0}, {"a": 2.0})[0].ratio == 2
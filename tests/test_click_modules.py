@@ -28,10 +28,15 @@
 # NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
 # SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
+import io
+import json
+import pathlib
+
 import pytest
 from click import Argument, Command, Context, exceptions
 
-from depythel_clt._click_modules import TREE_TYPE, repository_complete
+from depythel.compact import CompactTree
+from depythel_clt._click_modules import TREE_TYPE, read_tree, repository_complete
 
 
 # N.B. The results of these tests could change if more modules are added.
@@ -60,3 +65,38 @@ def test_tree_conversion() -> None:
     assert TREE_TYPE.convert("{'a': 'b', 'b': 'a'}", None, None) == {"a": "b", "b": "a"}
     with pytest.raises(exceptions.BadParameter):
         TREE_TYPE.convert("not a valid tree", None, None)
+
+
+class TestReadTree:
+    def test_formats(self) -> None:
+        """JSON, NDJSON edges, binary and Python trees are all detected."""
+        tree = {"a": {"b": "lib", "c": "build"}, "b": {}, "c": {}}
+        edges = b'["a", "b", "lib"]\n["a", "c", "build"]\n\n["b"]\n["c"]\n'
+        for data in (
+            json.dumps(tree).encode(),
+            b"\n  " + json.dumps(tree, indent=4).encode(),
+            edges,
+            CompactTree(tree).to_bytes(),
+            repr(tree).encode(),
+        ):
+            assert read_tree(io.BytesIO(data)) == tree
+        assert read_tree(io.BytesIO(b'["a", "b"]\n["b", "c"]')) == {"a": "b", "b": "c"}
+
+    def test_invalid(self) -> None:
+        """Malformed trees raise ValueError."""
+        for data in (b"", b'{"a": ', b'["a", "b"]\n["b", "c", "lib"]', b"[1, 2]"):
+            with pytest.raises(ValueError):
+                read_tree(io.BytesIO(data))
+
+    def test_large(self) -> None:
+        """Trees spanning many chunks are read completely."""
+        tree = {f"project{i}": {f"project{i + 1}": "lib"} for i in range(20000)}
+        assert read_tree(io.BytesIO(json.dumps(tree).encode())) == tree
+
+    def test_file(self, tmp_path: pathlib.Path) -> None:
+        """Paths to files are read, and binary files are memory mapped."""
+        path = tmp_path / "tree.json"
+        path.write_text('{"a": "b"}')
+        assert TREE_TYPE.convert(str(path), None, None) == {"a": "b"}
+        path.write_bytes(CompactTree({"a": "b"}).to_bytes())
+        assert isinstance(TREE_TYPE.convert(str(path), None, None), CompactTree)
@@ -28,8 +28,11 @@
 # NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
 # SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
+import json
 import os
 import pathlib
+import subprocess
+import sys
 
 from click.testing import CliRunner
 from pytest_mock import MockFixture
@@ -100,6 +103,15 @@ class TestCycleCheck:
         result = runner.invoke(depythel, ["cycle", "{'a': 'b', 'b': 'a'}"])
         assert result.output.strip() == "True"
 
+    def test_all(self) -> None:
+        """--all lists every cycle before the result."""
+        runner = CliRunner()
+        tree = "{'a': {'b': 'lib'}, 'b': {'a': 'lib', 'c': 'lib'}, 'c': {'b': 'lib'}}"
+        result = runner.invoke(depythel, ["cycle", tree, "--all"])
+        assert result.output.splitlines() == ["c -> b -> c", "a -> b -> a", "True"]
+        result = runner.invoke(depythel, ["cycle", "{'a': 'b'}", "--all"])
+        assert result.output.splitlines() == ["False"]
+
 
 def test_generator(session_mocker: MockFixture) -> None:
     # Had issues with "doesn't support retrieving deps from online" from another mock
@@ -122,3 +134,260 @@ def test_generator(session_mocker: MockFixture) -> None:
         "".join(result.output.split())
         == '{"gping":{"rust":"build_dependencies"},"rust":{"libssh2":"dependencies","openssl@1.1":"dependencies"}}'
     )
+
+
+def test_index(tmp_path: pathlib.Path) -> None:
+    """Projects are ingested from an index file, then used to generate trees."""
+    index_path = tmp_path / "formula.json"
+    index_path.write_text(
+        '[{"name": "gping", "dependencies": [], "recommended_dependencies": [],'
+        ' "optional_dependencies": [], "build_dependencies": ["rust"]}]'
+    )
+    database = str(tmp_path / "index.sqlite3")
+    runner = CliRunner()
+    result = runner.invoke(depythel, ["index", "homebrew", str(index_path), database])
+    assert result.exit_code == 0
+    assert result.output.strip() == "Stored 1 projects from homebrew"
+    result = runner.invoke(
+        depythel, ["generate", "gping", "homebrew", "1", "--index", database]
+    )
+    assert result.exit_code == 0
+    assert "".join(result.output.split()) == '{"gping":{"rust":"build_dependencies"}}'
+
+
+def test_generator_traversal(session_mocker: MockFixture) -> None:
+    """Projects can be fetched depth first."""
+    session_mocker.stopall()
+    dependencies = {"a": {"b": "lib", "c": "lib"}, "b": {"d": "lib"}, "c": {}, "d": {}}
+    session_mocker.patch(
+        "depythel.repository.macports.online",
+        side_effect=lambda name: dependencies[name],
+    )
+    runner = CliRunner()
+    result = runner.invoke(
+        depythel, ["generate", "a", "macports", "3", "--traversal", "dfs"]
+    )
+    assert result.exit_code == 0
+    assert list(json.loads(result.output)) == ["a", "b", "d"]
+
+
+def test_generator_roots_file(
+    tmp_path: pathlib.Path, session_mocker: MockFixture
+) -> None:
+    """Several roots are generated as one graph, fetching shared projects once."""
+    session_mocker.stopall()
+    dependencies = {"a": {"c": "lib"}, "b": {"c": "lib"}, "c": {}, "d": {}}
+    online = session_mocker.patch(
+        "depythel.repository.macports.online",
+        side_effect=lambda name: dependencies[name],
+    )
+    roots_file = tmp_path / "roots.txt"
+    roots_file.write_text("# Nightly audit\nb\n\nd\n")
+    runner = CliRunner()
+    result = runner.invoke(
+        depythel,
+        ["generate", "a", "macports", "10", "--roots-file", str(roots_file)],
+    )
+    assert result.exit_code == 0
+    assert json.loads(result.output) == {
+        "a": {"c": "lib"},
+        "b": {"c": "lib"},
+        "d": {},
+        "c": {},
+    }
+    assert online.call_count == 4
+
+    result = runner.invoke(depythel, ["generate", "macports", "10"])
+    assert result.exit_code != 0
+
+
+def test_generator_budget(session_mocker: MockFixture) -> None:
+    """Generation stops at the maximum depth."""
+    session_mocker.stopall()
+    dependencies = {"a": {"b": "lib"}, "b": {"c": "lib"}, "c": {}}
+    session_mocker.patch(
+        "depythel.repository.macports.online",
+        side_effect=lambda name: dependencies[name],
+    )
+    runner = CliRunner()
+    result = runner.invoke(
+        depythel, ["generate", "a", "macports", "10", "--max-depth", "1"]
+    )
+    assert result.exit_code == 0
+    assert json.loads(result.output) == {"a": {"b": "lib"}, "b": {"c": "lib"}}
+
+
+def test_topological_exclude() -> None:
+    """Cycles through excluded categories don't prevent an ordering."""
+    runner = CliRunner()
+    tree = "{'a': {'b': 'lib'}, 'b': {'a': 'build'}}"
+    assert runner.invoke(depythel, ["topological", tree]).exit_code != 0
+    result = runner.invoke(depythel, ["topological", tree, "--exclude", "build"])
+    assert result.exit_code == 0
+    assert result.output.split() == ["b", "a"]
+    result = runner.invoke(depythel, ["cycle", tree, "--include", "lib"])
+    assert result.output.strip() == "False"
+
+
+def test_binary_pipeline(tmp_path: pathlib.Path, session_mocker: MockFixture) -> None:
+    """Binary trees from depythel generate are read by the other commands."""
+    session_mocker.stopall()
+    dependencies = {"a": {"b": "lib"}, "b": {"a": "build"}}
+    session_mocker.patch(
+        "depythel.repository.macports.online",
+        side_effect=lambda name: dependencies[name],
+    )
+    runner = CliRunner()
+    result = runner.invoke(
+        depythel, ["generate", "a", "macports", "2", "--format", "binary"]
+    )
+    assert result.exit_code == 0
+    binary = result.stdout_bytes
+    result = runner.invoke(depythel, ["cycle"], input=binary)
+    assert result.output.strip() == "True"
+    result = runner.invoke(
+        depythel, ["topological", "--exclude", "build"], input=binary
+    )
+    assert result.output.split() == ["b", "a"]
+    path = tmp_path / "tree.dpt"
+    path.write_bytes(binary)
+    result = runner.invoke(depythel, ["cycle", str(path), "--include", "lib"])
+    assert result.output.strip() == "False"
+
+
+def test_ndjson_pipe() -> None:
+    """NDJSON edge lists can be piped into commands."""
+    runner = CliRunner()
+    edges = '["a", "b", "lib"]\n["b", "c", "lib"]\n["c"]\n'
+    result = runner.invoke(depythel, ["topological"], input=edges)
+    assert result.exit_code == 0
+    assert result.output.split() == ["c", "b", "a"]
+    result = runner.invoke(depythel, ["cycle"], input='["a", "b"]\n["b", "a"]')
+    assert result.output.strip() == "True"
+    result = runner.invoke(depythel, ["cycle"], input='["a", 1]')
+    assert result.exit_code != 0
+
+
+def test_generator_formats(session_mocker: MockFixture) -> None:
+    """Trees are output as compact JSON when piped, or in the chosen format."""
+    session_mocker.stopall()
+    dependencies = {"a": {"b": "lib", "c": "build"}, "b": {}, "c": {}}
+    session_mocker.patch(
+        "depythel.repository.macports.online",
+        side_effect=lambda name: dependencies[name],
+    )
+    runner = CliRunner()
+    result = runner.invoke(depythel, ["generate", "a", "macports", "3"])
+    assert result.output == json.dumps(dependencies, separators=(",", ":")) + "\n"
+    result = runner.invoke(
+        depythel, ["generate", "a", "macports", "3", "--format", "ndjson"]
+    )
+    assert [json.loads(line) for line in result.output.splitlines()] == [
+        ["a", "b", "lib"],
+        ["a", "c", "build"],
+        ["b"],
+        ["c"],
+    ]
+    # The edges can be read back in
+    result = runner.invoke(depythel, ["topological"], input=result.output)
+    assert result.output.split() == ["b", "c", "a"]
+    result = runner.invoke(
+        depythel, ["generate", "a", "macports", "3", "--format", "pretty"]
+    )
+    assert json.loads(result.output) == dependencies
+
+
+def test_generator_stream(session_mocker: MockFixture) -> None:
+    """--stream outputs a record for each project, which can be read back in."""
+    session_mocker.stopall()
+    dependencies = {"a": {"b": "lib"}, "b": {"a": "build"}}
+    session_mocker.patch(
+        "depythel.repository.macports.online",
+        side_effect=lambda name: dependencies[name],
+    )
+    runner = CliRunner()
+    result = runner.invoke(depythel, ["generate", "a", "macports", "5", "--stream"])
+    assert result.output.splitlines() == [
+        '["a", {"b": "lib"}]',
+        '["b", {"a": "build"}]',
+    ]
+    cycle = runner.invoke(
+        depythel, ["cycle", "--exclude", "build"], input=result.output
+    )
+    assert cycle.output.strip() == "False"
+    result = runner.invoke(
+        depythel, ["generate", "a", "macports", "5", "--stream", "--format", "json"]
+    )
+    assert result.exit_code != 0
+
+
+def test_visualise_layered(tmp_path: pathlib.Path, session_mocker: MockFixture) -> None:
+    """Large graphs are laid out ahead of time, with cycles collapsed."""
+    session_mocker.stopall()
+    session_mocker.patch("depythel_clt.main.click.launch", return_value=None)
+    runner = CliRunner()
+    path = tmp_path / "tree.html"
+    tree = json.dumps({f"p{i}": f"p{(i + 1) % 2000}" for i in range(2000)})
+    result = runner.invoke(depythel, ["visualise", str(path)], input=tree)
+    assert result.exit_code == 0
+    # Every project is in one cycle
+    assert '"labels":["p1999 (+1999 more)"]' in path.read_text()
+    result = runner.invoke(
+        depythel,
+        ["visualise", str(path), "{'a': 'b'}", "--layout", "layered", "--keep-cycles"],
+    )
+    assert result.exit_code == 0
+    assert '"labels":["a","b"]' in path.read_text()
+
+
+def test_visualise_formats(tmp_path: pathlib.Path) -> None:
+    """Graphs are written in the DOT language or GraphML, chosen by extension."""
+    runner = CliRunner()
+    tree = "{'a': {'b': 'lib'}, 'b': {}}"
+    result = runner.invoke(depythel, ["visualise", str(tmp_path / "tree.gv"), tree])
+    assert result.exit_code == 0
+    assert '"a" -> "b" [label="lib"];' in (tmp_path / "tree.gv").read_text()
+    path = tmp_path / "tree.xml"
+    result = runner.invoke(
+        depythel, ["visualise", str(path), tree, "--format", "graphml"]
+    )
+    assert result.exit_code == 0
+    assert "<graphml" in path.read_text()
+
+
+def test_unsupported_repository() -> None:
+    """Unsupported repositories are rejected before anything is fetched."""
+    runner = CliRunner()
+    result = runner.invoke(depythel, ["generate", "a", "I_dont_exist", "2"])
+    assert result.exit_code == 2
+    assert "I_dont_exist isn't supported" in result.output
+
+
+def test_no_warnings() -> None:
+    """The CLT runs without any warnings, e.g. from beartype's type hints."""
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-W",
+            "error",
+            "-c",
+            "from depythel_clt.main import depythel; "
+            "depythel(['topological', \"{'a': 'b'}\"])",
+        ],
+        capture_output=True,
+        text=True,
+    )
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.split() == ["b", "a"]
+    assert result.stderr == ""
+
+
+def test_mixed_quotes() -> None:
+    """Dictionaries with double quoted keys aren't mistaken for invalid JSON."""
+    runner = CliRunner()
+    tree = "{\"a\": 'b', 'b': \"c\"}"
+    result = runner.invoke(depythel, ["topological", tree])
+    assert result.exit_code == 0
+    assert result.output.split() == ["c", "b", "a"]
+    result = runner.invoke(depythel, ["topological"], input=tree)
+    assert result.output.split() == ["c", "b", "a"]
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2021-2022, Haren Samarasinghe
+#
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+#     * Redistributions of source code must retain the above copyright notice,
+#       this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright notice,
+#       this list of conditions and the following disclaimer in the documentation
+#       and/or other materials provided with the distribution.
+#     * Neither the name of seaport nor the names of its contributors
+#       may be used to endorse or promote products derived from this software
+#       without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Checks that the CLT starts quickly, since it's imported for every command."""
+
+import subprocess
+import sys
+from typing import Tuple
+
+from depythel._utility_imports import SetType
+
+# The most time (in seconds) importing the CLT can take, as reported by -X importtime.
+# It takes less than 0.1s, but is generous to allow for slow machines.
+STARTUP_BUDGET = 0.5
+
+# Modules which are slow to import, and should only be imported by the commands
+# that use them.
+HEAVY_MODULES = (
+    "asyncio",
+    "IPython",
+    "networkx",
+    "pyvis",
+    "rich",
+    "rich_click",
+    "sqlite3",
+    "urllib.request",
+)
+
+
+def _import_cli() -> Tuple[float, SetType[str]]:
+    """Imports the CLT in a new interpreter, returning the time and modules used."""
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-X",
+            "importtime",
+            "-c",
+            "import sys, depythel_clt.main; print(' '.join(sys.modules))",
+        ],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    # e.g. import time:      7353 |      85342 | depythel_clt.main
+    timing = next(
+        line
+        for line in reversed(result.stderr.splitlines())
+        if line.endswith("| depythel_clt.main")
+    )
+    microseconds = int(timing.split("|")[1])
+    return microseconds / 1_000_000, set(result.stdout.split())
+
+
+def test_lazy_imports() -> None:
+    """Heavy dependencies aren't imported until a command needs them."""
+    _, modules = _import_cli()
+    assert modules.isdisjoint(HEAVY_MODULES)
+
+
+def test_startup_budget() -> None:
+    """Importing the CLT stays within the startup budget."""
+    # The fastest of a few runs, to reduce noise from other processes
+    assert min(_import_cli()[0] for _ in range(3)) < STARTUP_BUDGET